@@ -1,7 +1,7 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin
 
-from .models import Account, Bookmark, Profile
+from .models import Account, Bookmark, OutgoingEmail, Profile
 
 
 class ProfileInline(admin.TabularInline):
@@ -43,3 +43,9 @@ class AccountAdmin(UserAdmin):
 @admin.register(Bookmark)
 class BookmarkAdmin(admin.ModelAdmin):
     list_display = ("user", "post", "saved_at")
+
+
+@admin.register(OutgoingEmail)
+class OutgoingEmailAdmin(admin.ModelAdmin):
+    list_display = ("subject", "to", "status", "attempts", "next_attempt_at")
+    list_filter = ("status",)
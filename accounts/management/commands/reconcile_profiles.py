@@ -0,0 +1,56 @@
+from django.core.management.base import BaseCommand
+from django.db.models import OuterRef
+
+from accounts.models import Like, Profile, UserFollowing
+from blog.models import Post
+from common import utils
+
+
+def actual_counts():
+    """Correlated subqueries computing each profile counter from scratch."""
+    user = OuterRef("user")
+    return {
+        "followers_count": utils.count_subquery(
+            UserFollowing.objects.filter(user_following=user), "user_following"
+        ),
+        "following_count": utils.count_subquery(
+            UserFollowing.objects.filter(user=user), "user"
+        ),
+        "posts_count": utils.count_subquery(
+            Post.objects.filter(author=user, status=1), "author"
+        ),
+        "likes_received": utils.count_subquery(
+            Like.objects.filter(post__author=user), "post__author"
+        ),
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        "Repair drift in the follower, following, post and like counters of profiles."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Number of profiles checked per batch.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report drifted profiles without fixing them.",
+        )
+
+    def handle(self, *args, **options):
+        checked, drifted = utils.reconcile(
+            Profile.objects.all(),
+            actual_counts(),
+            options["chunk_size"],
+            options["dry_run"],
+        )
+        verb = "Found" if options["dry_run"] else "Repaired"
+        self.stdout.write(
+            self.style.SUCCESS(f"{verb} {drifted} drifted of {checked} profiles.")
+        )
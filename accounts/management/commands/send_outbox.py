@@ -0,0 +1,32 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from accounts import outbox
+
+
+class Command(BaseCommand):
+    help = "Deliver the emails queued in the outbox, in batches."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=outbox.BATCH_SIZE,
+            help="Emails sent over one connection.",
+        )
+        parser.add_argument(
+            "--watch",
+            action="store_true",
+            help="Keep running, checking the outbox every --interval seconds.",
+        )
+        parser.add_argument("--interval", type=float, default=5)
+
+    def handle(self, *args, **options):
+        while True:
+            sent, failed = outbox.drain(options["batch_size"])
+            if sent or failed or not options["watch"]:
+                self.stdout.write(f"Sent {sent} emails, {failed} failed.")
+            if not options["watch"]:
+                return
+            time.sleep(options["interval"])
@@ -0,0 +1,33 @@
+from django.db import migrations
+
+INDEXES = {
+    "accounts_account_first_name_trgm_idx": ("accounts_account", "first_name"),
+    "accounts_account_last_name_trgm_idx": ("accounts_account", "last_name"),
+}
+
+
+def create_trigram_indexes(apps, schema_editor):
+    """GIN trigram indexes on PostgreSQL; SQLite uses an in-process index."""
+    if schema_editor.connection.vendor == "postgresql":
+        for name, (table, column) in INDEXES.items():
+            schema_editor.execute(
+                f"CREATE INDEX {name} ON {table} USING gin ({column} gin_trgm_ops)"
+            )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        for name in INDEXES:
+            schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("accounts", "0008_profile_followers_count_profile_following_count_and_more"),
+        # Creates the pg_trgm extension
+        ("blog", "0009_trigram_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
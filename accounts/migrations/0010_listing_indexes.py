@@ -0,0 +1,16 @@
+# Generated by Django 4.1.6 on 2026-10-18 20:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("accounts", "0009_trigram_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="bookmark",
+            index=models.Index(fields=["user", "-saved_at"], name="bookmark_saved_idx"),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 4.1.6 on 2026-10-18 20:22
+
+from django.db import migrations, models
+from django.utils.crypto import get_random_string
+
+
+def deduplicate_uids(apps, schema_editor):
+    """
+    Keep the uid of the oldest account sharing it, give the others (and the
+    accounts without one) a new random uid.
+    """
+    Account = apps.get_model("accounts", "Account")
+    shared = (
+        Account.objects.values("uid")
+        .annotate(count=models.Count("id"))
+        .filter(models.Q(count__gt=1) | models.Q(uid=""))
+        .values_list("uid", flat=True)
+    )
+    for uid in list(shared):
+        accounts = Account.objects.filter(uid=uid).order_by("id")
+        ids = list(accounts.values_list("id", flat=True))
+        for pk in ids if uid == "" else ids[1:]:
+            Account.objects.filter(pk=pk).update(uid=get_random_string(length=12))
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("accounts", "0010_listing_indexes"),
+    ]
+
+    operations = [
+        migrations.RunPython(deduplicate_uids, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.1.6 on 2026-10-18 20:22
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("accounts", "0011_deduplicate_uids"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="account",
+            name="uid",
+            field=models.CharField(max_length=12, unique=True, verbose_name="UID"),
+        ),
+    ]
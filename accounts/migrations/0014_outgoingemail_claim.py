@@ -0,0 +1,17 @@
+# Generated by Django 4.1.6 on 2026-10-18 21:12
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("accounts", "0013_outgoingemail"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="outgoingemail",
+            name="claim",
+            field=models.CharField(blank=True, max_length=32),
+        ),
+    ]
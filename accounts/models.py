@@ -1,9 +1,13 @@
 from django.conf import settings
 from django.contrib.auth.models import AbstractUser, BaseUserManager
-from django.db import models
-from django.db.models.signals import post_save
+from django.core.mail import EmailMultiAlternatives
+from django.db import models, transaction
+from django.db.models import Count, F, Max, Subquery
+from django.db.models.signals import post_delete, post_save
 from django.dispatch import receiver
+from django.utils import timezone
 
+from blog import timeline
 from blog.models import Post
 from common import utils
 
@@ -64,7 +68,7 @@ class Account(AbstractUser):
     )
     first_name = models.CharField("first name", max_length=150)
     last_name = models.CharField("last name", max_length=150)
-    uid = models.CharField("UID", max_length=12)
+    uid = models.CharField("UID", max_length=12, unique=True)
     is_admin = models.BooleanField(default=False)
 
     objects = AccountManager()
@@ -80,10 +84,16 @@ class Account(AbstractUser):
         return self.email
 
     def save(self, *args, **kwargs):
-        """Assign unique slug before saving the user."""
-        if not self.uid:
-            self.uid = utils.generate_uid(self.__class__)
-        return super().save(*args, **kwargs)
+        """Assign unique uid before saving the user."""
+        if self.uid:
+            return super().save(*args, **kwargs)
+        self.uid = utils.generate_uid()
+        utils.save_unique(
+            self,
+            "uid",
+            utils.generate_uid,
+            lambda: super(Account, self).save(*args, **kwargs),
+        )
 
 
 class Profile(models.Model):
@@ -92,10 +102,24 @@ class Profile(models.Model):
     user = models.OneToOneField(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     title = models.CharField(max_length=150, blank=True)
     about = models.TextField(blank=True)
+    # Denormalized counters kept current by the follow, publish and like
+    # write paths (see reconcile_profiles to repair drift)
+    followers_count = models.PositiveIntegerField(default=0, editable=False)
+    following_count = models.PositiveIntegerField(default=0, editable=False)
+    posts_count = models.PositiveIntegerField(default=0, editable=False)
+    likes_received = models.PositiveIntegerField(default=0, editable=False)
 
     def __str__(self):
         return f"{self.user.first_name}'s profile"
 
+    @classmethod
+    def update_counter(cls, user_id, counter, delta):
+        """Add delta to a counter of the user's profile without reading it."""
+        profiles = cls.objects.filter(user_id=user_id)
+        if delta < 0:
+            profiles = profiles.filter(**{f"{counter}__gte": -delta})
+        profiles.update(**{counter: F(counter) + delta})
+
     @property
     def following(self):
         """All users followed by this user (following wrt to the user)."""
@@ -112,6 +136,104 @@ class Profile(models.Model):
         return [like.post for like in self.user.likes.all()]
 
 
+class PostInteractionManager(models.Manager):
+    """
+    Manager for user-post relations (likes, bookmarks) that keeps the
+    matching counter on Post in sync within the same transaction.
+
+    add() and remove() are idempotent: they rely on the unique constraint
+    of the relation instead of reading it first, so the relation itself is
+    written with a single statement and counters only move when a row was
+    actually inserted or deleted.
+    """
+
+    def __init__(self, counter, author_counter=None):
+        super().__init__()
+        self.counter = counter
+        self.author_counter = author_counter
+
+    def _update_counter(self, post, delta):
+        posts = Post.objects.filter(pk=post.pk)
+        if delta < 0:
+            posts = posts.filter(**{f"{self.counter}__gt": 0})
+        posts.update(**{self.counter: F(self.counter) + delta})
+        if self.author_counter:
+            Profile.update_counter(post.author_id, self.author_counter, delta)
+
+    def add(self, user, post):
+        """Relate user and post. Return False if they were already related."""
+        with transaction.atomic(savepoint=False):
+            created = utils.insert_ignore(self.model(user=user, post=post))
+            if created:
+                self._update_counter(post, 1)
+        return created
+
+    def remove(self, user, post):
+        """Unrelate user and post. Return False if they weren't related."""
+        with transaction.atomic(savepoint=False):
+            deleted, _ = self.filter(user=user, post=post).delete()
+            if deleted:
+                self._update_counter(post, -1)
+        return bool(deleted)
+
+    def toggle(self, user, post):
+        """Add the relation, or remove it if it exists. Return the new state."""
+        if self.add(user, post):
+            return True
+        self.remove(user, post)
+        return False
+
+    def summary(self, user):
+        """
+        Return annotations summarizing the relations of user: their number
+        and latest id, which change whenever one is added or removed.
+        """
+        if not user.is_authenticated:
+            return {}
+        name = self.model._meta.model_name
+        rows = self.filter(user=user).order_by().values("user")
+        return {
+            f"{name}_total": Subquery(rows.annotate(value=Count("*")).values("value")),
+            f"{name}_latest": Subquery(rows.annotate(value=Max("id")).values("value")),
+        }
+
+
+class UserFollowingManager(models.Manager):
+    """
+    Manager keeping follower/following counters of profiles, and the
+    timelines of the following feeds (see blog.timeline), in sync.
+    """
+
+    def _update_counters(self, user, target, delta):
+        Profile.update_counter(user.pk, "following_count", delta)
+        Profile.update_counter(target.pk, "followers_count", delta)
+
+    def follow(self, user, target):
+        """Make user follow target. Return False if already following."""
+        with transaction.atomic(savepoint=False):
+            created = utils.insert_ignore(self.model(user=user, user_following=target))
+            if created:
+                self._update_counters(user, target, 1)
+                timeline.follow(user, target)
+        return created
+
+    def unfollow(self, user, target):
+        """Make user stop following target. Return False if not following."""
+        with transaction.atomic(savepoint=False):
+            deleted, _ = self.filter(user=user, user_following=target).delete()
+            if deleted:
+                self._update_counters(user, target, -1)
+                timeline.unfollow(user, target)
+        return bool(deleted)
+
+    def toggle(self, user, target):
+        """Follow target, or unfollow if already following. Return the new state."""
+        if self.follow(user, target):
+            return True
+        self.unfollow(user, target)
+        return False
+
+
 class UserFollowing(models.Model):
     """
     Follower and Following relationship between users.
@@ -127,6 +249,8 @@ class UserFollowing(models.Model):
         settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="followers"
     )
 
+    objects = UserFollowingManager()
+
     class Meta:
         constraints = [
             models.UniqueConstraint(
@@ -142,10 +266,15 @@ class Bookmark(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE)
     saved_at = models.DateTimeField(auto_now=True)
 
+    objects = PostInteractionManager(counter="bookmark_count")
+
     class Meta:
         constraints = [
             models.UniqueConstraint(fields=["user", "post"], name="unique_bookmarks")
         ]
+        indexes = [
+            models.Index(fields=["user", "-saved_at"], name="bookmark_saved_idx")
+        ]
 
 
 class Like(models.Model):
@@ -156,18 +285,118 @@ class Like(models.Model):
     )
     post = models.ForeignKey(Post, on_delete=models.CASCADE)
 
+    objects = PostInteractionManager(
+        counter="like_count", author_counter="likes_received"
+    )
+
     class Meta:
         constraints = [
             models.UniqueConstraint(fields=["user", "post"], name="unique_likes")
         ]
 
 
+class OutgoingEmail(models.Model):
+    """
+    An email waiting in the outbox (see accounts.outbox). Rows are deleted
+    once delivered; those that kept failing stay, marked failed.
+    """
+
+    PENDING = "pending"
+    FAILED = "failed"
+    STATUSES = [(PENDING, "Pending"), (FAILED, "Failed")]
+
+    subject = models.TextField()
+    body = models.TextField()
+    content_subtype = models.CharField(max_length=20, default="plain")
+    # HTML or other versions of the body, as [content, mimetype] pairs
+    alternatives = models.JSONField(default=list)
+    from_email = models.CharField(max_length=254)
+    to = models.JSONField(default=list)
+    cc = models.JSONField(default=list)
+    bcc = models.JSONField(default=list)
+    reply_to = models.JSONField(default=list)
+    headers = models.JSONField(default=dict)
+    status = models.CharField(max_length=10, choices=STATUSES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    # Token of the batch that claimed the email
+    claim = models.CharField(max_length=32, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # The worker reads the pending emails that are due
+            models.Index(
+                fields=["next_attempt_at"],
+                condition=models.Q(status="pending"),
+                name="outbox_due_idx",
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.subject} to {', '.join(self.to)}"
+
+    @classmethod
+    def from_message(cls, message):
+        if message.attachments:
+            raise ValueError("Emails with attachments cannot be queued.")
+        return cls(
+            subject=message.subject,
+            body=message.body,
+            content_subtype=message.content_subtype,
+            alternatives=[list(pair) for pair in getattr(message, "alternatives", [])],
+            from_email=message.from_email,
+            to=message.to,
+            cc=message.cc,
+            bcc=message.bcc,
+            reply_to=message.reply_to,
+            headers=message.extra_headers,
+        )
+
+    def to_message(self, connection=None):
+        message = EmailMultiAlternatives(
+            self.subject,
+            self.body,
+            self.from_email,
+            self.to,
+            self.bcc,
+            connection=connection,
+            alternatives=[tuple(pair) for pair in self.alternatives],
+            cc=self.cc,
+            reply_to=self.reply_to,
+            headers=self.headers,
+        )
+        message.content_subtype = self.content_subtype
+        return message
+
+
 @receiver(post_save, sender=settings.AUTH_USER_MODEL)
-def create_or_save_profile(sender, instance, created, **kwargs):
+def create_profile(sender, instance, created, **kwargs):
     """
-    Automatically create a user profile after sign up or
-    update it whenever user information is updated.
+    Automatically create a user profile after sign up. It is not saved
+    again with the user: a full save would write back stale counters.
     """
     if created:
         Profile.objects.create(user=instance)
-    instance.profile.save()
+
+
+@receiver(post_save, sender=Post)
+def update_posts_count(sender, instance, created, **kwargs):
+    """Count published posts of the author when a post is (un)published."""
+    was_published = getattr(instance, "_loaded_status", None) == 1
+    is_published = instance.status == 1
+    if was_published != is_published:
+        delta = 1 if is_published else -1
+        Profile.update_counter(instance.author_id, "posts_count", delta)
+
+
+@receiver(post_delete, sender=Post)
+def discount_deleted_post(sender, instance, **kwargs):
+    """Stop counting a deleted post and the likes it received."""
+    if getattr(instance, "_loaded_status", None) == 1:
+        Profile.update_counter(instance.author_id, "posts_count", -1)
+    if instance.like_count:
+        Profile.update_counter(
+            instance.author_id, "likes_received", -instance.like_count
+        )
@@ -0,0 +1,153 @@
+"""
+Out-of-band email delivery.
+
+EMAIL_BACKEND is OutboxBackend, so sending an email, from the signup view,
+the password reset form or mail_admins(), only inserts OutgoingEmail rows
+and queues a deliver task (see common.tasks), in the transaction of the
+request; the workers, or the send_outbox command, deliver them. Each
+batch of due emails is sent over a single connection of
+settings.OUTBOX_EMAIL_BACKEND (SMTP), so the handshake is paid once per
+batch rather than per email, and never by a request.
+
+A batch is claimed in one UPDATE taking only the emails still due, and
+pushing them LEASE into the future, before any is sent: concurrent
+workers never send the same email, even on SQLite which has no row
+locks, and no transaction stays open while the SMTP server answers. The
+emails of a worker that died are due again once the lease runs out.
+
+An email that fails is retried after RETRY_DELAY, doubling with every
+attempt up to MAX_RETRY_DELAY; after MAX_ATTEMPTS it is marked failed
+and left in the table for inspection.
+"""
+
+import logging
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import get_connection
+from django.core.mail.backends.base import BaseEmailBackend
+from django.db import transaction
+from django.db.models import Min, Subquery
+from django.utils import timezone
+
+from common.tasks import task
+
+from .models import OutgoingEmail
+
+# Emails sent over one connection
+BATCH_SIZE = 100
+# Delay before the first retry, doubled for each further one
+RETRY_DELAY = timedelta(minutes=1)
+MAX_RETRY_DELAY = timedelta(hours=1)
+MAX_ATTEMPTS = 8
+# A claimed email not sent after this long is claimed again
+LEASE = timedelta(minutes=10)
+
+DELIVERY_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
+
+logger = logging.getLogger(__name__)
+
+
+def retry_delay(attempts):
+    """Return how long to wait after the given number of failed attempts."""
+    return min(RETRY_DELAY * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+
+
+class OutboxBackend(BaseEmailBackend):
+    """Queue emails in the outbox instead of sending them."""
+
+    def send_messages(self, email_messages):
+        emails = [OutgoingEmail.from_message(message) for message in email_messages]
+        OutgoingEmail.objects.bulk_create(emails)
+        deliver.enqueue()
+        return len(emails)
+
+
+def claim(batch_size=BATCH_SIZE):
+    """
+    Claim up to batch_size due emails and return them. They are due again
+    after LEASE, should the worker die before sending them.
+    """
+    now, token = timezone.now(), uuid.uuid4().hex
+    due = OutgoingEmail.objects.filter(
+        status=OutgoingEmail.PENDING, next_attempt_at__lte=now
+    )
+    with transaction.atomic():
+        # The UPDATE only takes the rows still due, see common.tasks.claim
+        claimed = OutgoingEmail.objects.filter(
+            pk__in=Subquery(
+                due.select_for_update(skip_locked=True)
+                .order_by("next_attempt_at")
+                .values("pk")[:batch_size]
+            )
+        ).update(claim=token, next_attempt_at=now + LEASE)
+    if not claimed:
+        return []
+    return list(OutgoingEmail.objects.filter(claim=token).order_by("pk"))
+
+
+def send_batch(batch_size=BATCH_SIZE):
+    """Deliver a batch of due emails; return the (sent, failed) counts."""
+    # Claimed first, then sent outside of any transaction
+    emails = claim(batch_size)
+    if not emails:
+        return 0, 0
+
+    sent, errors = [], {}
+    backend = getattr(settings, "OUTBOX_EMAIL_BACKEND", DELIVERY_BACKEND)
+    connection = get_connection(backend)
+    try:
+        connection.open()
+    except Exception as error:
+        errors = {email: error for email in emails}
+    else:
+        try:
+            for email in emails:
+                # One by one on the open connection, so a rejected email
+                # does not fail the rest of the batch
+                try:
+                    connection.send_messages([email.to_message(connection)])
+                except Exception as error:
+                    errors[email] = error
+                else:
+                    sent.append(email.pk)
+        finally:
+            connection.close()
+
+    now = timezone.now()
+    OutgoingEmail.objects.filter(pk__in=sent).delete()
+    for email, error in errors.items():
+        email.attempts += 1
+        email.last_error = repr(error)
+        email.claim = ""
+        if email.attempts >= MAX_ATTEMPTS:
+            email.status = OutgoingEmail.FAILED
+            logger.error("Giving up on email %s: %r", email.pk, error)
+        else:
+            email.next_attempt_at = now + retry_delay(email.attempts)
+            logger.warning("Email %s will be retried: %r", email.pk, error)
+    OutgoingEmail.objects.bulk_update(
+        list(errors), ["attempts", "last_error", "claim", "status", "next_attempt_at"]
+    )
+    return len(sent), len(errors)
+
+
+def drain(batch_size=BATCH_SIZE):
+    """Deliver every due email; return the (sent, failed) counts."""
+    total_sent, total_failed = 0, 0
+    while True:
+        sent, failed = send_batch(batch_size)
+        if not sent and not failed:
+            return total_sent, total_failed
+        total_sent, total_failed = total_sent + sent, total_failed + failed
+
+
+@task(unique=True)
+def deliver(batch_size=BATCH_SIZE):
+    """Deliver every due email, then queue the next delivery of retries."""
+    drain(batch_size)
+    retries = OutgoingEmail.objects.filter(status=OutgoingEmail.PENDING)
+    next_attempt = retries.aggregate(next=Min("next_attempt_at"))["next"]
+    if next_attempt:
+        deliver.enqueue_at(next_attempt)
@@ -2,8 +2,16 @@ $(document).ready(function () {
     // CSRF protection used by django for POST requests
     var csrf_token = $("input[name=csrfmiddlewaretoken]").val()
 
+    // Pages served to visitors (possibly from the cache) carry no token
+    function requireLogin() {
+        if (csrf_token) return false;
+        window.location = "/ac/login/?next=" + encodeURIComponent(window.location.pathname);
+        return true;
+    }
+
     // AJAX request to save/unsave posts
     $(".bookmark").off("click").on("click", function () {
+        if (requireLogin()) return;
         const $this = $(this); // clicked button
         const post_id = $this.val();
 
@@ -12,6 +20,8 @@ $(document).ready(function () {
             url: "/ac/bookmark/",
             data: {
                 post_id: post_id,
+                // explicit action so repeated clicks can't flip the state back
+                action: $this.find("i").hasClass("fas") ? "unbookmark" : "bookmark",
                 csrfmiddlewaretoken: csrf_token,
             },
             statusCode: {
@@ -32,15 +42,16 @@ $(document).ready(function () {
 
     // AJAX request to follow/unfollow users
     $(".follow").off("click").on("click", function () {
+        if (requireLogin()) return;
         const $this = $(this);
         const user_id = $this.val();
-        console.log("TARGET USER ID", user_id);
 
         $.ajax({
             method: "POST",
             url: "/ac/follow/",
             data: {
                 user_id: user_id,
+                action: $this.text().trim() == "Following" ? "unfollow" : "follow",
                 csrfmiddlewaretoken: csrf_token,
             },
             statusCode: {
@@ -62,6 +73,7 @@ $(document).ready(function () {
 
     // AJAX request to like/unlike posts
     $(".upvote").off("click").on("click", function () {
+        if (requireLogin()) return;
         const $this = $(this); // clicked button
         const post_id = $this.val();
 
@@ -70,6 +82,7 @@ $(document).ready(function () {
             url: "/ac/like/",
             data: {
                 post_id: post_id,
+                action: $this.find("i").hasClass("fas") ? "unlike" : "like",
                 csrfmiddlewaretoken: csrf_token,
             },
             statusCode: {
@@ -77,6 +90,8 @@ $(document).ready(function () {
                     const likes = response["likes_count"]
                     if (response["is_liked"] == true) {
                         $this.html('<span class="text-muted"><i class="fas fa-heart text-primary me-2"></i>' + likes + '</span>');
+                    } else {
+                        $this.html('<span class="text-muted"><i class="far fa-heart text-primary me-2"></i>' + likes + '</span>');
                     }
                 },
                 401: function (response) {
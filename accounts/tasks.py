@@ -0,0 +1,13 @@
+"""Periodic maintenance of the accounts, run by the task workers."""
+
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+
+from common.tasks import task
+
+
+@task(every=timedelta(days=1))
+def reconcile_profiles():
+    call_command("reconcile_profiles", stdout=StringIO())
@@ -1,3 +1,440 @@
-from django.test import TestCase
+import smtplib
+import threading
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# write your tests here
+from django.core import mail
+from django.core.mail import EmailMultiAlternatives, get_connection, send_mail
+from django.core.mail.backends import locmem
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client, TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.encoding import force_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from blog.models import Category, Post
+from common import tasks
+from common.testing import QueryBudgetMixin
+
+from . import forms, outbox
+from .models import Account, Bookmark, Like, OutgoingEmail, Profile, UserFollowing
+from .tokens import email_confirmation_token
+
+
+def create_user(email, **kwargs):
+    return Account.objects.create_user(email, "First", "Last", "password", **kwargs)
+
+
+def create_post(author, **kwargs):
+    category, _ = Category.objects.get_or_create(name="Django", slug="django")
+    kwargs.setdefault("status", 1)
+    kwargs.setdefault("title", "A post")
+    return Post.objects.create(
+        author=author, category=category, content="<p>x</p>", **kwargs
+    )
+
+
+class ToggleTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user("author@example.com")
+        cls.reader = create_user("reader@example.com")
+        cls.post = create_post(cls.author)
+
+    def setUp(self):
+        self.client.force_login(self.reader)
+
+    def like(self, action=None):
+        data = {"post_id": self.post.pk}
+        if action:
+            data["action"] = action
+        return self.client.post(reverse("accounts:like"), data)
+
+    def test_repeated_like_is_idempotent(self):
+        for _ in range(3):
+            response = self.like("like")
+            self.assertEqual(response.json(), {"is_liked": True, "likes_count": 1})
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 1)
+        self.author.profile.refresh_from_db()
+        self.assertEqual(self.author.profile.likes_received, 1)
+
+    def test_repeated_unlike_is_idempotent(self):
+        self.like("like")
+        for _ in range(3):
+            response = self.like("unlike")
+            self.assertEqual(response.json(), {"is_liked": False, "likes_count": 0})
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.like_count, 0)
+        self.assertFalse(Like.objects.exists())
+
+    def test_like_without_action_toggles(self):
+        self.assertTrue(self.like().json()["is_liked"])
+        self.assertFalse(self.like().json()["is_liked"])
+
+    def test_add_relies_on_unique_constraint(self):
+        Like.objects.add(self.reader, self.post)
+        # Already liked: a single ignored INSERT and no counter update
+        with self.assertNumQueries(1):
+            self.assertFalse(Like.objects.add(self.reader, self.post))
+
+    def test_remove_is_a_single_delete(self):
+        with self.assertNumQueries(1):
+            self.assertFalse(Bookmark.objects.remove(self.reader, self.post))
+
+    def test_bookmark_and_follow_actions(self):
+        url = reverse("accounts:bookmark")
+        data = {"post_id": self.post.pk, "action": "bookmark"}
+        self.client.post(url, data)
+        self.client.post(url, data)
+        self.assertEqual(Bookmark.objects.count(), 1)
+
+        url = reverse("accounts:follow")
+        data = {"user_id": self.author.pk, "action": "follow"}
+        self.client.post(url, data)
+        response = self.client.post(url, data)
+        self.assertEqual(response.json(), {"is_following": True})
+        self.assertEqual(UserFollowing.objects.count(), 1)
+        self.author.profile.refresh_from_db()
+        self.assertEqual(self.author.profile.followers_count, 1)
+
+
+class UidTests(TestCase):
+    def test_concurrently_taken_uid_is_reallocated(self):
+        first = create_user("first@example.com")
+        uids = iter([first.uid, "fresh0000uid"])
+        with mock.patch("common.utils.generate_uid", lambda: next(uids)):
+            second = create_user("second@example.com")
+        self.assertEqual(second.uid, "fresh0000uid")
+        self.assertEqual(Account.objects.filter(uid=first.uid).count(), 1)
+
+
+class RecordingBackend(locmem.EmailBackend):
+    """Locmem backend counting its connections, refusing some recipients."""
+
+    opened = 0
+    refused = set()
+
+    def open(self):
+        RecordingBackend.opened += 1
+        return True
+
+    def send_messages(self, messages):
+        for message in messages:
+            if self.refused & set(message.to):
+                raise smtplib.SMTPRecipientsRefused(message.to)
+        return super().send_messages(messages)
+
+
+@override_settings(
+    EMAIL_BACKEND="accounts.outbox.OutboxBackend",
+    OUTBOX_EMAIL_BACKEND="accounts.tests.RecordingBackend",
+)
+class OutboxTests(TestCase):
+    def setUp(self):
+        RecordingBackend.opened = 0
+        RecordingBackend.refused = set()
+
+    def send_outbox(self):
+        output = StringIO()
+        call_command("send_outbox", stdout=output)
+        return output.getvalue()
+
+    def test_signup_queues_the_verification_email(self):
+        response = self.client.post(
+            reverse("accounts:signup"),
+            {
+                "first_name": "New",
+                "last_name": "User",
+                "email": "new@example.com",
+                "password1": "a-long-passphrase",
+                "password2": "a-long-passphrase",
+            },
+        )
+        self.assertRedirects(response, reverse("accounts:verify"))
+        self.assertEqual(mail.outbox, [])
+        email = OutgoingEmail.objects.get()
+        self.assertEqual(email.to, ["new@example.com"])
+
+        self.assertIn("Sent 1 emails, 0 failed", self.send_outbox())
+        self.assertEqual(mail.outbox[0].subject, "Verify your email address")
+        self.assertFalse(OutgoingEmail.objects.exists())
+
+    def test_password_reset_is_queued(self):
+        create_user("reader@example.com")
+        self.client.post(reverse("password_reset"), {"email": "reader@example.com"})
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(OutgoingEmail.objects.get().to, ["reader@example.com"])
+        # A deliver task was queued with the email
+        tasks.work(once=True)
+        self.assertEqual(mail.outbox[0].to, ["reader@example.com"])
+        self.assertFalse(OutgoingEmail.objects.exists())
+
+    def test_batch_is_sent_over_one_connection(self):
+        messages = [
+            EmailMultiAlternatives("Hi", "Text", to=[f"user{i}@example.com"])
+            for i in range(5)
+        ]
+        messages[0].attach_alternative("<p>Text</p>", "text/html")
+        get_connection().send_messages(messages)
+
+        self.assertIn("Sent 5 emails", self.send_outbox())
+        self.assertEqual(RecordingBackend.opened, 1)
+        self.assertEqual(len(mail.outbox), 5)
+        self.assertEqual(mail.outbox[0].alternatives, [("<p>Text</p>", "text/html")])
+
+    def test_claimed_emails_are_not_sent_twice(self):
+        send_mail("Hi", "Text", None, ["reader@example.com"])
+        concurrent = []
+
+        def send_messages(backend, messages):
+            # Another worker polls while this one is sending
+            concurrent.append(outbox.send_batch())
+            return len(messages)
+
+        with mock.patch.object(RecordingBackend, "send_messages", send_messages):
+            self.assertEqual(outbox.send_batch(), (1, 0))
+        self.assertEqual(concurrent, [(0, 0)])
+
+    def test_lost_claims_are_due_after_the_lease(self):
+        send_mail("Hi", "Text", None, ["reader@example.com"])
+        # A worker died after claiming the email
+        self.assertEqual(len(outbox.claim()), 1)
+        self.assertEqual(outbox.send_batch(), (0, 0))
+        OutgoingEmail.objects.update(
+            next_attempt_at=timezone.now() - timedelta(seconds=1)
+        )
+        self.assertEqual(outbox.send_batch(), (1, 0))
+        self.assertEqual(len(mail.outbox), 1)
+
+    def test_failed_email_is_retried_with_backoff(self):
+        RecordingBackend.refused = {"refused@example.com"}
+        send_mail("Hi", "Text", None, ["refused@example.com"])
+        send_mail("Hi", "Text", None, ["reader@example.com"])
+
+        with self.assertLogs("accounts.outbox", "WARNING"):
+            self.assertIn("Sent 1 emails, 1 failed", self.send_outbox())
+        email = OutgoingEmail.objects.get()
+        self.assertEqual(email.attempts, 1)
+        self.assertIn("SMTPRecipientsRefused", email.last_error)
+        delay = email.next_attempt_at - timezone.now()
+        self.assertAlmostEqual(
+            delay.total_seconds(), outbox.RETRY_DELAY.total_seconds(), delta=5
+        )
+        # Not due yet
+        self.assertIn("Sent 0 emails, 0 failed", self.send_outbox())
+
+        OutgoingEmail.objects.update(
+            attempts=outbox.MAX_ATTEMPTS - 1, next_attempt_at=timezone.now()
+        )
+        with self.assertLogs("accounts.outbox", "ERROR"):
+            self.send_outbox()
+        self.assertEqual(OutgoingEmail.objects.get().status, OutgoingEmail.FAILED)
+        self.assertIn("Sent 0 emails", self.send_outbox())
+
+
+class ProfileConditionalGetTests(TestCase):
+    def test_follow_invalidates_profile_etag(self):
+        author = create_user("author@example.com")
+        reader = create_user("reader@example.com")
+        create_post(author)
+        self.client.force_login(reader)
+        url = reverse("accounts:profile", args=[author.uid])
+        etag = self.client.get(url)["ETag"]
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.client.post(
+            reverse("accounts:follow"), {"user_id": author.pk, "action": "follow"}
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    urls_module = "accounts.urls"
+    query_budgets = {
+        "accounts:signup": 0,
+        "accounts:login": 0,
+        "accounts:logout": 4,
+        "accounts:verify": 0,
+        "accounts:follow": 9,
+        "accounts:like": 7,
+        "accounts:bookmark": 6,
+        "accounts:activate": 10,
+        "accounts:profile": 5,
+        "accounts:update-profile": 3,
+        "accounts:draft": 4,
+        "accounts:saved": 4,
+    }
+
+    def setUp(self):
+        self.author = create_user("author@example.com")
+        self.reader = create_user("reader@example.com")
+        for i in range(5):
+            post = create_post(self.author, title=f"Post {i}")
+            Bookmark.objects.add(self.reader, post)
+            create_post(self.author, title=f"Draft {i}", status=0)
+        self.post = post
+        super().setUp()
+
+    def request(self, name, *args, user=None, method="get", status=200, **data):
+        if user:
+            self.client.force_login(user)
+        else:
+            self.client.logout()
+        url = reverse(name, args=args)
+        send = getattr(self.client, method)
+        response = self.assertQueryBudget(name, lambda: send(url, data))
+        self.assertEqual(response.status_code, status, name)
+
+    def test_pages_stay_within_budget(self):
+        author, reader = self.author, self.reader
+        self.request("accounts:signup")
+        self.request("accounts:login")
+        self.request("accounts:logout", user=reader, status=302)
+        self.request("accounts:verify")
+        self.request("accounts:profile", author.uid, user=reader)
+        self.request("accounts:update-profile", reader.uid, user=reader)
+        self.request("accounts:draft", author.uid, user=author)
+        self.request("accounts:saved", reader.uid, user=reader)
+
+    def test_actions_stay_within_budget(self):
+        reader, post = self.reader, self.post
+        follow = {"user_id": self.author.pk}
+        self.request("accounts:follow", user=reader, method="post", **follow)
+        self.request("accounts:like", user=reader, method="post", post_id=post.pk)
+        self.request("accounts:bookmark", user=reader, method="post", post_id=post.pk)
+        inactive = create_user("inactive@example.com", is_active=False)
+        uidb64 = urlsafe_base64_encode(force_bytes(inactive.pk))
+        token = email_confirmation_token.make_token(inactive)
+        self.request("accounts:activate", uidb64, token, status=302)
+
+
+class ConcurrentToggleTests(TransactionTestCase):
+    """Simultaneous double-clicks must neither fail nor miscount."""
+
+    def setUp(self):
+        # Threads can't share a shared-cache in-memory SQLite database
+        # without "table is locked" errors (see TEST["NAME"] in settings_dev)
+        if connection.vendor == "sqlite" and connection.is_in_memory_db():
+            self.skipTest("needs a test database shared between connections")
+
+    def test_concurrent_likes(self):
+        author = create_user("author@example.com")
+        reader = create_user("reader@example.com")
+        post = create_post(author)
+        barrier = threading.Barrier(4)
+        errors = []
+
+        def click():
+            try:
+                barrier.wait()
+                Like.objects.add(reader, post)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=click) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        post.refresh_from_db()
+        self.assertEqual(post.like_count, 1)
+        self.assertEqual(Like.objects.count(), 1)
+
+    def test_concurrent_likes_report_their_own_count(self):
+        post = create_post(create_user("author@example.com"))
+        clients = []
+        for i in range(4):
+            client = Client()
+            client.force_login(create_user(f"reader{i}@example.com"))
+            clients.append(client)
+        barrier = threading.Barrier(len(clients))
+        counts, errors = [], []
+
+        def click(client):
+            try:
+                barrier.wait()
+                data = {"post_id": post.pk, "action": "like"}
+                response = client.post(reverse("accounts:like"), data)
+                counts.append(response.json()["likes_count"])
+            except Exception as error:
+                errors.append(error)
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=click, args=[c]) for c in clients]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(errors, [])
+        self.assertEqual(sorted(counts), [1, 2, 3, 4])
+
+
+class ReconcileProfilesTests(TestCase):
+    def test_repairs_drifted_profiles_only(self):
+        author, reader = create_user("author@example.com"), create_user(
+            "reader@example.com"
+        )
+        UserFollowing.objects.follow(reader, author)
+        Like.objects.add(reader, create_post(author))
+        Profile.objects.filter(user=author).update(followers_count=7, posts_count=0)
+        output = StringIO()
+        call_command("reconcile_profiles", "--dry-run", stdout=output)
+        self.assertIn("Found 1 drifted of 2 profiles", output.getvalue())
+
+        call_command("reconcile_profiles", stdout=output)
+        self.assertIn("Repaired 1 drifted of 2 profiles", output.getvalue())
+        counts = Profile.objects.values_list(
+            "user",
+            "followers_count",
+            "following_count",
+            "posts_count",
+            "likes_received",
+        )
+        self.assertEqual(
+            set(counts), {(author.pk, 1, 0, 1, 1), (reader.pk, 0, 1, 0, 0)}
+        )
+
+
+class ProfileCounterTests(TestCase):
+    def setUp(self):
+        self.user = create_user("author@example.com")
+        self.client.force_login(self.user)
+
+    def follow_meanwhile(self):
+        follower = create_user(f"f{Profile.objects.count()}@example.com")
+        UserFollowing.objects.follow(follower, self.user)
+
+    def test_saving_the_account_keeps_the_counters(self):
+        self.user.profile  # loaded before the follow
+        self.follow_meanwhile()
+        self.user.last_login = timezone.now()
+        self.user.save()
+        self.assertEqual(Profile.objects.get(user=self.user).followers_count, 1)
+
+    def test_profile_update_keeps_the_counters(self):
+        is_valid = forms.ProfileUpdateForm.is_valid
+
+        def valid_after_a_follow(form):
+            # The profile of the form is loaded, a follow lands meanwhile
+            self.follow_meanwhile()
+            return is_valid(form)
+
+        url = reverse("accounts:update-profile", args=[self.user.uid])
+        data = {"first_name": "New", "last_name": "Name", "title": "Writer"}
+        with mock.patch.object(
+            forms.ProfileUpdateForm, "is_valid", valid_after_a_follow
+        ):
+            self.client.post(url, {**data, "about": "Hi"})
+        profile = Profile.objects.get(user=self.user)
+        self.assertEqual((profile.title, profile.followers_count), ("Writer", 1))
@@ -4,6 +4,8 @@ from django.contrib.auth.decorators import login_required
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
 from django.contrib.sites.shortcuts import get_current_site
 from django.core.mail import EmailMessage
+from django.db import transaction
+from django.db.models import Exists, OuterRef, Subquery
 from django.http import HttpResponse, HttpResponseForbidden, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
 from django.template.loader import render_to_string
@@ -12,14 +14,18 @@ from django.utils.encoding import force_bytes, force_str
 from django.utils.http import urlsafe_base64_decode, urlsafe_base64_encode
 from django.views.generic import ListView, View
 
+from blog import caching
 from blog.models import Post
+from common import utils
+from common.conditional import ConditionalGetMixin
+from common.pagination import CursorPaginationMixin
 
 from .forms import LoginForm, ProfileUpdateForm, SignupForm, UserUpdateForm
 from .models import Account, Bookmark, Like, UserFollowing
 from .tokens import email_confirmation_token
 
 
-class UserProfile(ListView):
+class UserProfile(ConditionalGetMixin, CursorPaginationMixin, ListView):
     """Show profile of the user and all posts posted by the user."""
 
     context_object_name = "author_posts"
@@ -28,17 +34,73 @@ class UserProfile(ListView):
 
     def get_queryset(self):
         # Filtering posts by the user only
-        self.user = get_object_or_404(Account, uid=self.kwargs.get("uid"))
+        is_following = UserFollowing.objects.filter(
+            user=self.request.user.pk, user_following=OuterRef("pk")
+        )
+        self.user = get_object_or_404(
+            Account.objects.select_related("profile").annotate(
+                is_following=Exists(is_following)
+            ),
+            uid=self.kwargs.get("uid"),
+        )
         return (
-            Post.objects.filter(author=self.user)
-            .select_related("category")
-            .select_related("author")
+            Post.objects.for_listing()
+            .with_viewer_state(self.request.user)
+            .filter(author=self.user)
             .filter(status=1)
         )
 
+    def get_validators(self):
+        viewer = self.request.user
+        # Subqueries rather than a grouped join, each reads one index range
+        posts = Post.objects.filter(author=OuterRef("pk"), status=1)
+        bookmarks = Bookmark.objects.summary(viewer)
+        likes = Like.objects.summary(viewer)
+        counters = {
+            f"total_{counter}": utils.sum_subquery(posts, "author", counter)
+            for counter in Post.COUNTERS
+        }
+        stats = (
+            Account.objects.filter(uid=self.kwargs.get("uid"))
+            .annotate(
+                latest=Subquery(posts.values("last_update")[:1]),
+                total=utils.count_subquery(posts, "author"),
+                is_following=Exists(
+                    UserFollowing.objects.filter(
+                        user=viewer.pk, user_following=OuterRef("pk")
+                    )
+                ),
+                **counters,
+                **bookmarks,
+                **likes,
+            )
+            .values(
+                "first_name",
+                "last_name",
+                "profile__title",
+                "profile__about",
+                "profile__followers_count",
+                "profile__following_count",
+                "profile__posts_count",
+                "latest",
+                "total",
+                "is_following",
+                *counters,
+                *bookmarks,
+                *likes,
+            )
+            .first()
+        )
+        if stats is None:
+            return None
+        # The cards show the names of their categories
+        versions = caching.versions(["categories"])
+        return (tuple(stats.values()), versions), stats["latest"]
+
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         context["user"] = self.user
+        context["is_following"] = self.user.is_following
         return context
 
 
@@ -52,6 +114,7 @@ class DraftPostList(LoginRequiredMixin, UserPassesTestMixin, ListView):
         return (
             Post.objects.filter(author=self.request.user)
             .select_related("category")
+            .defer("content")
             .filter(status=0)
             .order_by("-last_update")
         )
@@ -70,7 +133,8 @@ class SavedPostList(LoginRequiredMixin, UserPassesTestMixin, ListView):
 
     def get_queryset(self):
         return (
-            Bookmark.objects.select_related("post")
+            Bookmark.objects.select_related("post__category")
+            .defer("post__content", "post__search_vector")
             .filter(user=self.request.user)
             .order_by("-saved_at")
         )
@@ -82,23 +146,28 @@ class SavedPostList(LoginRequiredMixin, UserPassesTestMixin, ListView):
 
 
 class BookmarkPost(View):
-    """Handle bookmarking post using ajax calls."""
+    """
+    Handle bookmarking post using ajax calls.
+
+    The "bookmark" and "unbookmark" actions are idempotent, so repeated
+    clicks are harmless; without an action the current state is toggled.
+    """
 
     def post(self, request):
         user = self.request.user
         if user.is_authenticated:
             # bookmark selected post
             post_id = request.POST.get("post_id")
-            selected_post = Post.objects.get(pk=post_id)
-            is_bookmarked = False  # initial assumption
-            bookmark = Bookmark.objects.filter(user=user, post=selected_post).first()
-            if bookmark:
-                # The user has already saved it, unsave now
-                bookmark.delete()
-            else:
-                # save the bookmark now
-                Bookmark.objects.create(user=user, post=selected_post)
+            selected_post = get_object_or_404(Post.objects.only("id"), pk=post_id)
+            action = request.POST.get("action")
+            if action == "bookmark":
+                Bookmark.objects.add(user, selected_post)
                 is_bookmarked = True
+            elif action == "unbookmark":
+                Bookmark.objects.remove(user, selected_post)
+                is_bookmarked = False
+            else:
+                is_bookmarked = Bookmark.objects.toggle(user, selected_post)
             return JsonResponse(
                 {"is_bookmarked": is_bookmarked, "post_id": post_id}, status=200
             )
@@ -112,35 +181,31 @@ class BookmarkPost(View):
 
 
 class Follow(View):
-    """Handle Follow and Unfollow process."""
+    """
+    Handle Follow and Unfollow process.
+
+    The "follow" and "unfollow" actions are idempotent, so repeated clicks
+    are harmless; without an action the current state is toggled.
+    """
 
     def post(self, request):
-        current_user_id = self.request.user.pk
         if self.request.user.is_authenticated:
             # the user making the request
-            current_user = Account.objects.get(pk=current_user_id)
+            current_user = self.request.user
 
             # ID of the user to follow or unfollow
             user_id = request.POST["user_id"]
-            target_user = Account.objects.get(pk=user_id)
-            is_following = False  # initial assumption
+            target_user = get_object_or_404(Account.objects.only("id"), pk=user_id)
 
-            # All users followed by current user (following wrt to the user)
-            following = [f.user_following for f in current_user.following.all()]
-
-            if not target_user in following:
-                # Start following now
-                print(f"I am here 2 {current_user} following {target_user} now.")
-                UserFollowing.objects.create(
-                    user=current_user, user_following=target_user
-                )
+            action = request.POST.get("action")
+            if action == "follow":
+                UserFollowing.objects.follow(current_user, target_user)
                 is_following = True
+            elif action == "unfollow":
+                UserFollowing.objects.unfollow(current_user, target_user)
+                is_following = False
             else:
-                # It was already following, Unfollow the user now
-                print(f"I am here 3 {current_user} stops following {target_user} now.")
-                UserFollowing.objects.filter(
-                    user=current_user, user_following=target_user
-                ).delete()
+                is_following = UserFollowing.objects.toggle(current_user, target_user)
             return JsonResponse({"is_following": is_following}, status=200)
         else:
             messages.info(
@@ -151,26 +216,35 @@ class Follow(View):
 
 
 class LikePost(View):
-    """Handle like and unlike posts."""
+    """
+    Handle like and unlike posts.
 
-    def post(self, request):
+    The "like" and "unlike" actions are idempotent, so repeated clicks are
+    harmless; without an action the current state is toggled.
+    """
 
+    def post(self, request):
         user = self.request.user
         if user.is_authenticated:
-            # the user is authenticated, go to like activity
-            user = Account.objects.get(pk=user.pk)
             post_id = request.POST.get("post_id")
-            selected_post = Post.objects.get(pk=post_id)
-            is_liked = False  # initial assumption
-            if not selected_post in user.profile.likes:
-                # Like the post now
-                Like.objects.create(user=user, post=selected_post)
-                is_liked = True
-            else:
-                # Unlike the post
-                Like.objects.filter(user=user, post=selected_post).delete()
-
-            data = {"is_liked": is_liked, "likes_count": selected_post.like_set.count()}
+            selected_post = get_object_or_404(Post.objects.only("author"), pk=post_id)
+            action = request.POST.get("action")
+            with transaction.atomic(savepoint=False):
+                if action == "like":
+                    Like.objects.add(user, selected_post)
+                    is_liked = True
+                elif action == "unlike":
+                    Like.objects.remove(user, selected_post)
+                    is_liked = False
+                else:
+                    is_liked = Like.objects.toggle(user, selected_post)
+                # The count this request's write left, not one read before it
+                likes_count = (
+                    Post.objects.filter(pk=post_id)
+                    .values_list("like_count", flat=True)
+                    .get()
+                )
+            data = {"is_liked": is_liked, "likes_count": likes_count}
             return JsonResponse(data, status=200)
         else:
             messages.info(
@@ -212,7 +286,8 @@ def signup(request):
         # the user has submitted the form (POST request): get the data submitted
         signup_form = SignupForm(request.POST)
         if signup_form.is_valid():
-            try:
+            # The account and its verification email are stored together
+            with transaction.atomic():
                 user = signup_form.save(commit=False)
                 user.is_active = False  # until the user confirms the email
                 user.save()
@@ -231,10 +306,8 @@ def signup(request):
                 )
                 to_email = signup_form.cleaned_data.get("email")
                 email = EmailMessage(mail_subject, message, to=[to_email])
+                # Only queued in the outbox, the deliver task sends it
                 email.send()
-            except Exception as error:
-                print("Error: Error occurred while registering the user. Retrying...")
-                print(error.with_traceback())
 
             # Set user email to session variable to pass it to another view
             first_name = signup_form.cleaned_data.get("first_name")
@@ -284,8 +357,7 @@ def inform_to_verify(request):
 def update_profile(request, uid):
     """Update profile for authenticated user."""
     # Check if the user is authorized to edit the profile.
-    owner = Account.objects.get(uid=uid)
-    if request.user == owner:
+    if request.user.uid == uid:
         # can edit its own profile
         if request.method == "POST":
             user_form = UserUpdateForm(request.POST, instance=request.user)
@@ -294,7 +366,9 @@ def update_profile(request, uid):
             )
             if user_form.is_valid() and profile_form.is_valid():
                 user_form.save()
-                profile_form.save()
+                # Only the edited fields: the counters loaded with the form
+                # may be stale already
+                profile_form.instance.save(update_fields=ProfileUpdateForm.Meta.fields)
                 messages.success(request, "Your account has been updated successfully.")
                 return redirect(to=reverse("accounts:profile", args=(uid,)))
         else:
@@ -0,0 +1,341 @@
+"""
+Search-as-you-type suggestions from an in-process prefix index.
+
+Post titles, category names and author names are kept in a sorted list of
+(key, kind, id) tuples so a prefix lookup is a bisect plus a short scan and
+never touches the database. Every word of a label starts a key, so "tips"
+finds "Python tips".
+
+Each process builds the index when it boots (see warm_up) and applies its
+own changes to it from signal receivers (see blog.signals). Changes are
+also published in the shared cache, numbered by a generation counter
+which every lookup compares with the one of its index: an index behind
+replays the changes of the other processes it missed, a single cache
+read and no query. Only an index too far behind, or missing a change the
+cache lost, is rebuilt from the database. It holds at most MAX_ENTRIES
+labels; once full, the oldest entries are evicted.
+"""
+
+import bisect
+import logging
+import re
+import threading
+import time
+from collections import OrderedDict
+
+from django.apps import apps
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.urls import reverse
+
+MAX_ENTRIES = 20000
+# Only the first few words of a label start a key
+MAX_KEYS_PER_ENTRY = 4
+MAX_LABEL_LENGTH = 100
+DEFAULT_LIMIT = 8
+# Counts the label changes of all processes
+GENERATION_KEY = "autocomplete:generation"
+# Seconds a change is kept for the other processes to replay
+CHANGE_TTL = 60 * 60
+# An index further behind is rebuilt rather than replaying the changes
+MAX_REPLAYED_CHANGES = 1000
+
+logger = logging.getLogger(__name__)
+
+WORD_RE = re.compile(r"\w+")
+
+
+def normalize(text):
+    """Return text lowercased with collapsed whitespace."""
+    return " ".join(text.lower().split())
+
+
+def entry_keys(label):
+    """Return the index keys of label: its suffixes starting at each word."""
+    label = normalize(label)
+    starts = [match.start() for match in WORD_RE.finditer(label)]
+    return {label[start:] for start in starts[:MAX_KEYS_PER_ENTRY]}
+
+
+class PrefixIndex:
+    """A bounded, thread-safe prefix index of labelled links."""
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.keys = []
+        # (kind, id) -> (label, url, keys), oldest first
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _discard(self, ref):
+        label, url, keys = self.entries.pop(ref)
+        for key in keys:
+            position = bisect.bisect_left(self.keys, (key, *ref))
+            if position < len(self.keys) and self.keys[position] == (key, *ref):
+                del self.keys[position]
+
+    def add(self, kind, object_id, label, url):
+        """Add or replace the entry for (kind, object_id)."""
+        ref = (kind, object_id)
+        label = label[:MAX_LABEL_LENGTH]
+        keys = entry_keys(label)
+        with self.lock:
+            if ref in self.entries:
+                self._discard(ref)
+            while len(self.entries) >= self.max_entries:
+                self._discard(next(iter(self.entries)))
+            self.entries[ref] = (label, url, keys)
+            for key in keys:
+                bisect.insort(self.keys, (key, *ref))
+
+    def remove(self, kind, object_id):
+        """Drop the entry for (kind, object_id) if it is indexed."""
+        with self.lock:
+            if (kind, object_id) in self.entries:
+                self._discard((kind, object_id))
+
+    def lookup(self, prefix, limit=DEFAULT_LIMIT):
+        """Return up to limit suggestions with a label word starting with prefix."""
+        prefix = normalize(prefix)
+        if not prefix:
+            return []
+        suggestions, seen = [], set()
+        with self.lock:
+            position = bisect.bisect_left(self.keys, (prefix,))
+            while position < len(self.keys) and len(suggestions) < limit:
+                key, kind, object_id = self.keys[position]
+                position += 1
+                if not key.startswith(prefix):
+                    break
+                if (kind, object_id) in seen:
+                    continue
+                seen.add((kind, object_id))
+                label, url, keys = self.entries[kind, object_id]
+                suggestions.append({"label": label, "kind": kind, "url": url})
+        return suggestions
+
+
+def add_post(index, post):
+    if post.status == 1:
+        url = reverse("blog:post-detail", args=[post.slug])
+        index.add("post", post.pk, post.title, url)
+    else:
+        index.remove("post", post.pk)
+
+
+def add_category(index, category):
+    url = reverse("blog:category", args=[category.slug])
+    index.add("category", category.pk, category.name, url)
+
+
+def add_author(index, user):
+    if user.is_active:
+        url = reverse("accounts:profile", args=[user.uid])
+        index.add("author", user.pk, user.get_full_name(), url)
+    else:
+        index.remove("author", user.pk)
+
+
+ADDERS = {"post": add_post, "category": add_category, "author": add_author}
+
+
+class Change:
+    """Stands for an index, recording the call an adder makes to it."""
+
+    def add(self, kind, object_id, label, url):
+        self.change = (kind, object_id, label, url)
+
+    def remove(self, kind, object_id):
+        self.change = (kind, object_id, None, None)
+
+
+def label_change(kind, instance):
+    """Return the change reindexing instance of kind, see apply()."""
+    recorder = Change()
+    ADDERS[kind](recorder, instance)
+    return recorder.change
+
+
+def removal(kind, object_id):
+    return (kind, object_id, None, None)
+
+
+def apply(index, change):
+    """Apply a (kind, id, label, url) change, without url a removal."""
+    kind, object_id, label, url = change
+    if url is None:
+        index.remove(kind, object_id)
+    else:
+        index.add(kind, object_id, label, url)
+
+
+def build(index=None):
+    """
+    Fill index (a new PrefixIndex by default) with the published posts,
+    categories and active authors, and return it.
+    """
+    Account = apps.get_model("accounts", "Account")
+    Category = apps.get_model("blog", "Category")
+    Post = apps.get_model("blog", "Post")
+    if index is None:
+        index = PrefixIndex()
+    # Oldest first so the most recent posts survive eviction
+    posts = Post.objects.filter(status=1).order_by("last_update", "id")
+    for post in posts.only("title", "slug", "status").iterator():
+        add_post(index, post)
+    for category in Category.objects.only("name", "slug").iterator():
+        add_category(index, category)
+    authors = Account.objects.filter(is_active=True)
+    for user in authors.only("first_name", "last_name", "uid", "is_active").iterator():
+        add_author(index, user)
+    return index
+
+
+def first_generation():
+    # Not 1: a counter evicted and started again must not match the
+    # generation of indexes built before
+    return time.time_ns()
+
+
+def shared_generation():
+    return cache.get_or_set(GENERATION_KEY, first_generation, timeout=None)
+
+
+def change_key(generation):
+    return f"{GENERATION_KEY}:{generation}"
+
+
+def publish(change):
+    """Store change for the other processes; return its generation."""
+    cache.add(GENERATION_KEY, first_generation(), timeout=None)
+    generation = cache.incr(GENERATION_KEY)
+    # A process reading the generation in between finds no change and
+    # rebuilds its index, which is slower but just as correct
+    cache.set(change_key(generation), change, CHANGE_TTL)
+    return generation
+
+
+class ProcessIndex:
+    """
+    The index of factory type held by this process, built from the database
+    and brought up to the shared generation by replaying the changes of the
+    other processes, or rebuilt when they can't be. eager() tells whether
+    warm_up() builds it.
+    """
+
+    def __init__(self, factory, eager=None):
+        self.factory = factory
+        self.eager = eager or (lambda: True)
+        self.index = None
+        self.generation = None
+        self.lock = threading.Lock()
+        _indexes.append(self)
+
+    def get(self):
+        """Return the index, built or brought up to date first."""
+        generation = shared_generation()
+        if self.index is None or self.generation != generation:
+            # One thread updates, the others use the stale index meanwhile
+            if self.lock.acquire(blocking=self.index is None):
+                try:
+                    if self.index is None or not self.catch_up(generation):
+                        # Stamped with the generation read before building:
+                        # changes made meanwhile are replayed next time
+                        self.index = build(self.factory())
+                        self.generation = generation
+                finally:
+                    self.lock.release()
+        return self.index
+
+    def catch_up(self, generation):
+        """
+        Replay the changes published since the generation of the index up
+        to generation. Return False if some are missing from the cache.
+        """
+        behind = generation - self.generation
+        if behind == 0:
+            return True
+        if not 0 < behind <= MAX_REPLAYED_CHANGES:
+            return False
+        keys = [
+            change_key(number) for number in range(self.generation + 1, generation + 1)
+        ]
+        changes = cache.get_many(keys)
+        if len(changes) < len(keys):
+            return False
+        for key in keys:
+            apply(self.index, changes[key])
+        self.generation = generation
+        return True
+
+    def update(self, kind, instance):
+        """Reindex instance of kind, if this process has built the index."""
+        if self.index is not None:
+            ADDERS[kind](self.index, instance)
+
+    def remove(self, kind, object_id):
+        """Drop an object from the index, if this process has built it."""
+        if self.index is not None:
+            self.index.remove(kind, object_id)
+
+
+# Every ProcessIndex, bumped together
+_indexes = []
+
+
+def changed(change):
+    """
+    Publish a label change (see apply()) once the transaction commits (a
+    process rebuilding before would read the old labels). The indexes of
+    this process, which applied the change, stay current unless another
+    process changed labels too.
+    """
+
+    def bump():
+        generation = publish(change)
+        for index in _indexes:
+            if index.generation == generation - 1:
+                index.generation = generation
+
+    transaction.on_commit(bump)
+
+
+def warm_up():
+    """Build the indexes of this process in the background (at boot)."""
+
+    def build_all():
+        try:
+            for index in _indexes:
+                if index.eager():
+                    index.get()
+        except Exception:
+            # The first lookups will build it
+            logger.exception("Could not build the label indexes")
+        finally:
+            connection.close()
+
+    threading.Thread(target=build_all, daemon=True).start()
+
+
+prefix_index = ProcessIndex(PrefixIndex)
+
+
+def get_index():
+    """Return this process' index, up to date with the shared generation."""
+    return prefix_index.get()
+
+
+def update(kind, instance):
+    prefix_index.update(kind, instance)
+
+
+def remove(kind, object_id):
+    prefix_index.remove(kind, object_id)
+
+
+def suggest(prefix, limit=DEFAULT_LIMIT):
+    """Return suggestions for a partially typed query."""
+    return get_index().lookup(prefix, limit)
@@ -0,0 +1,152 @@
+"""
+Full-page cache for anonymous visitors, and the object caches of the
+blog's hot reads.
+
+A cached page remembers the version of every scope it was built from:
+"listing" (the set of published posts), "leaderboard", and "post:<id>",
+"author:<id>" and "category:<id>" for the objects it shows. Saving or
+deleting one of those objects gives its scope a new version (see
+blog.signals), so the next request sees a mismatch and renders the page
+again. PAGE_TTL bounds the staleness of anything not tracked by a scope,
+such as like counts.
+"""
+
+import hashlib
+import uuid
+
+from django.contrib import messages
+from django.core.cache import cache
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+
+from common.cache import TwoTierCache
+
+PAGE_TTL = 300
+STATS_KEYS = {"hits": "page:stats:hits", "misses": "page:stats:misses"}
+
+# Hot objects shared by the requests of every user (see common.cache)
+featured_posts = TwoTierCache("featured-posts", timeout=60)
+# Posts by slug, without counters or viewer state (read per request)
+post_details = TwoTierCache("post-detail", timeout=PAGE_TTL)
+
+
+def version_key(scope):
+    return f"page:version:{scope}"
+
+
+def versions(scopes):
+    """Return {scope: current version} (None for never bumped scopes)."""
+    found = cache.get_many([version_key(scope) for scope in scopes])
+    return {scope: found.get(version_key(scope)) for scope in scopes}
+
+
+def bump(*scopes):
+    """Give scopes new versions, making the pages built from them stale."""
+    # Random tokens rather than counters, so an evicted version can never
+    # come back with a value a stale page recorded
+    token = uuid.uuid4().hex
+    cache.set_many({version_key(scope): token for scope in scopes}, timeout=None)
+
+
+def post_scopes(post):
+    """Return the scopes of a rendered post."""
+    return {
+        f"post:{post.pk}",
+        f"author:{post.author_id}",
+        f"category:{post.category_id}",
+    }
+
+
+def record(name):
+    key = STATS_KEYS[name]
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Evicted in between, the count restarts
+        cache.set(key, 1, timeout=None)
+
+
+def stats():
+    """Return the page cache hit and miss counts."""
+    counts = cache.get_many(STATS_KEYS.values())
+    return {name: counts.get(key, 0) for name, key in STATS_KEYS.items()}
+
+
+def is_cacheable(request):
+    """Only anonymous reads without pending flash messages are cached."""
+    return (
+        request.method in ("GET", "HEAD")
+        and not request.user.is_authenticated
+        and not len(messages.get_messages(request))
+    )
+
+
+def page_key(request):
+    digest = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f"page:{digest}"
+
+
+# Response headers kept with a cached page
+CACHED_HEADERS = ("Content-Type", "ETag", "Last-Modified")
+
+
+def get_page(request):
+    """Return the cached response for request if it is still fresh."""
+    entry = cache.get(page_key(request))
+    if entry is not None:
+        recorded, content, headers = entry
+        if versions(recorded) == recorded:
+            record("hits")
+            response = get_conditional_response(request, etag=headers.get("ETag"))
+            if response is None:
+                response = HttpResponse(content)
+            else:
+                # 304 Not Modified carries the validators only
+                headers.pop("Content-Type", None)
+            for name, value in headers.items():
+                response[name] = value
+            response["X-Page-Cache"] = "hit"
+            return response
+    record("misses")
+    return None
+
+
+def set_page(request, response, recorded):
+    """Cache the rendered response under the recorded scope versions."""
+    headers = {name: response[name] for name in CACHED_HEADERS if name in response}
+    cache.set(page_key(request), (recorded, response.content, headers), PAGE_TTL)
+    response["X-Page-Cache"] = "miss"
+
+
+class AnonymousPageCacheMixin:
+    """
+    Serve anonymous GET requests from the page cache. The page depends on
+    the static cache_scopes and on the scopes get_cache_scopes() derives
+    from the rendered context.
+    """
+
+    cache_scopes = ()
+
+    def get_cache_scopes(self, context):
+        return set()
+
+    def dispatch(self, request, *args, **kwargs):
+        if not is_cacheable(request):
+            return super().dispatch(request, *args, **kwargs)
+        response = get_page(request)
+        if response is not None:
+            return response
+        # Static scopes are read before the queries run, so a concurrent
+        # change marks the stored page stale right away instead of being
+        # hidden; scopes found in the context can only be read afterwards
+        recorded = versions(self.cache_scopes)
+        response = super().dispatch(request, *args, **kwargs)
+        if response.status_code == 200 and hasattr(response, "render"):
+
+            def store(response):
+                scopes = self.get_cache_scopes(response.context_data)
+                set_page(request, response, {**versions(scopes), **recorded})
+
+            response.add_post_render_callback(store)
+        return response
@@ -0,0 +1,106 @@
+"""
+Popular authors and categories.
+
+Rankings are computed by refresh() (run hourly by the task workers, see
+blog.tasks, or by the refresh_leaderboards command) and stored in the
+small Ranking table. Requests read the ranked objects through a two-tier
+cache reloaded from the table every CACHE_TTL seconds, so listing views
+do no ranking work at all.
+"""
+
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from accounts.models import Account, Profile
+from common.cache import TwoTierCache
+
+from . import caching
+from .models import Category, Ranking
+
+# How many entries are materialized per leaderboard
+SIZE = 20
+# Categories are ranked by posts published within this window
+CATEGORY_WINDOW = timedelta(days=30)
+# Seconds the ranked objects are cached for
+CACHE_TTL = 60
+# Score weights of an author's followers and received likes
+FOLLOWER_WEIGHT = 2
+LIKE_WEIGHT = 1
+
+rankings = TwoTierCache("leaderboard", timeout=CACHE_TTL)
+
+
+def rank_authors(size=SIZE):
+    """Return (user_id, score) of the top authors by followers and likes."""
+    profiles = (
+        Profile.objects.annotate(
+            score=F("followers_count") * FOLLOWER_WEIGHT
+            + F("likes_received") * LIKE_WEIGHT
+        )
+        .filter(score__gt=0)
+        .order_by("-score", "user_id")
+        .values_list("user_id", "score")
+    )
+    return list(profiles[:size])
+
+
+def rank_categories(size=SIZE, window=CATEGORY_WINDOW):
+    """Return (category_id, score) of the categories with most recent posts."""
+    since = timezone.now() - window
+    recent = Q(post__status=1, post__last_update__gte=since)
+    categories = (
+        Category.objects.annotate(score=Count("post", filter=recent))
+        .filter(score__gt=0)
+        .order_by("-score", "id")
+        .values_list("id", "score")
+    )
+    return list(categories[:size])
+
+
+def refresh(kinds=(Ranking.AUTHOR, Ranking.CATEGORY)):
+    """Recompute and store the given leaderboards."""
+    rankers = {Ranking.AUTHOR: rank_authors, Ranking.CATEGORY: rank_categories}
+    for kind in kinds:
+        entries = rankers[kind]()
+        with transaction.atomic():
+            Ranking.objects.filter(kind=kind).delete()
+            Ranking.objects.bulk_create(
+                Ranking(kind=kind, position=position, object_id=pk, score=score)
+                for position, (pk, score) in enumerate(entries, start=1)
+            )
+    rankings.invalidate()
+    caching.bump("leaderboard")
+
+
+def _ranked(kind, queryset):
+    """Return the ranked objects of kind, loading them at most every CACHE_TTL."""
+
+    def load():
+        ids = list(
+            Ranking.objects.filter(kind=kind)
+            .order_by("position")
+            .values_list("object_id", flat=True)
+        )
+        by_id = queryset.in_bulk(ids)
+        objects = [by_id[pk] for pk in ids if pk in by_id]
+        if not objects:
+            # Nothing has been ranked yet, serve arbitrary rows meanwhile
+            objects = list(queryset[:SIZE])
+        return objects
+
+    return rankings.get_or_set(kind, load)
+
+
+def popular_authors(limit=5):
+    """Return the most popular authors (with their profile)."""
+    authors = _ranked(Ranking.AUTHOR, Account.objects.select_related("profile"))
+    return authors[:limit]
+
+
+def popular_categories(limit=6):
+    """Return the categories with most recently published posts."""
+    categories = _ranked(Ranking.CATEGORY, Category.objects.all())
+    return categories[:limit]
@@ -0,0 +1,56 @@
+from functools import reduce
+from operator import or_
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from blog import caching
+from blog.models import Post
+
+
+class Command(BaseCommand):
+    help = "Compute the content-derived fields (read time, excerpts) of existing posts."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="Number of posts loaded and updated per batch.",
+        )
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Recompute every post instead of only the missing ones.",
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options["chunk_size"]
+        posts = Post.objects.only("id", "content").order_by("pk")
+        if not options["all"]:
+            missing = [Q(**{f"{field}__isnull": True}) for field in Post.DERIVED_FIELDS]
+            posts = posts.filter(reduce(or_, missing))
+
+        # Walk the table by primary key so each batch is a cheap range scan
+        # and rows updated in one batch never shift the next one.
+        last_pk, updated = 0, 0
+        while True:
+            batch = list(posts.filter(pk__gt=last_pk)[:chunk_size])
+            if not batch:
+                break
+            for post in batch:
+                post.update_derived_fields()
+            with transaction.atomic():
+                Post.objects.bulk_update(batch, Post.DERIVED_FIELDS)
+            # Cached pages show the old values, last_update did not change
+            caching.bump(*(f"post:{post.pk}" for post in batch))
+            last_pk = batch[-1].pk
+            updated += len(batch)
+            self.stdout.write(f"Updated {updated} posts...")
+
+        if updated:
+            caching.bump("listing")
+            caching.post_details.invalidate()
+            caching.featured_posts.invalidate()
+        self.stdout.write(self.style.SUCCESS(f"Backfilled {updated} posts."))
@@ -0,0 +1,87 @@
+import random
+import statistics
+import string
+
+from django.core.management.base import BaseCommand
+
+from blog.search.trigram import THRESHOLD, TrigramIndex, trigrams, word_similarity
+
+from .bench_search import timed
+
+
+def vocabulary(rng, size):
+    """Return size distinct random words and Zipf-like weights for them."""
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choices(string.ascii_lowercase, k=rng.randint(4, 9))))
+    words = sorted(words)
+    rng.shuffle(words)
+    return words, [1 / rank for rank in range(1, size + 1)]
+
+
+def misspell(rng, word):
+    """Return word with one character dropped, doubled or swapped."""
+    i = rng.randrange(len(word) - 1)
+    edit = rng.choice(("drop", "double", "swap"))
+    if edit == "drop":
+        return word[:i] + word[i + 1 :]
+    if edit == "double":
+        return word[:i] + word[i] + word[i:]
+    return word[:i] + word[i + 1] + word[i] + word[i + 2 :]
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the in-process trigram index against a linear similarity "
+        "scan as the number of labels grows."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes", type=int, nargs="+", default=[1000, 10000, 100000]
+        )
+        parser.add_argument("--vocabulary", type=int, default=20000)
+        parser.add_argument("--queries", type=int, default=50)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        rng = random.Random(options["seed"])
+        words, weights = vocabulary(rng, options["vocabulary"])
+        self.stdout.write(
+            f"{'labels':>8} {'index p50':>10} {'index p95':>10} "
+            f"{'scan p50':>10} {'scan p95':>10}  (ms)"
+        )
+        for size in options["sizes"]:
+            labels = [" ".join(rng.choices(words, weights, k=4)) for _ in range(size)]
+            index = TrigramIndex(max_entries=size)
+            for i, label in enumerate(labels):
+                index.add("post", i, label, "")
+            grams = [trigrams(label) for label in labels]
+
+            # Queries are misspelled words, uniformly drawn from the vocabulary
+            queries = [
+                misspell(rng, rng.choice(words)) for _ in range(options["queries"])
+            ]
+            engine, scan = [], []
+            for query in queries:
+                _, ms = timed(index.lookup, query, 10)
+                engine.append(ms)
+                query_grams = trigrams(query)
+                _, ms = timed(
+                    lambda: [
+                        i
+                        for i, label_grams in enumerate(grams)
+                        if word_similarity(query_grams, label_grams) >= THRESHOLD
+                    ]
+                )
+                scan.append(ms)
+
+            row = [size]
+            for samples in (engine, scan):
+                row += [
+                    statistics.median(samples),
+                    statistics.quantiles(samples, n=20)[-1],
+                ]
+            self.stdout.write(
+                "{:>8} {:>10.2f} {:>10.2f} {:>10.2f} {:>10.2f}".format(*row)
+            )
@@ -0,0 +1,48 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from blog.models import Post
+
+
+def fetched_bytes(queryset):
+    """Return (rows, bytes) transferred by running the queryset's SQL."""
+    sql, params = queryset.query.sql_with_params()
+    total, rows = 0, 0
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        for row in cursor.fetchall():
+            rows += 1
+            for value in row:
+                if isinstance(value, (str, bytes)):
+                    total += len(value.encode() if isinstance(value, str) else value)
+                elif value is not None:
+                    total += len(str(value))
+    return rows, total
+
+
+class Command(BaseCommand):
+    help = "Compare the bytes fetched per listing page with and without content."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--page-size", type=int, default=10)
+        parser.add_argument("--pages", type=int, default=5)
+
+    def handle(self, *args, **options):
+        page_size, pages = options["page_size"], options["pages"]
+        published = Post.objects.filter(status=1)
+        before = published.select_related("category", "author")
+        after = published.for_listing()
+
+        self.stdout.write(
+            f"{'page':>6} {'rows':>6} {'before':>12} {'after':>12} {'saved':>7}"
+        )
+        for page in range(pages):
+            start = page * page_size
+            rows, full = fetched_bytes(before[start : start + page_size])
+            _, deferred = fetched_bytes(after[start : start + page_size])
+            if not rows:
+                break
+            saved = 100 * (full - deferred) / full if full else 0
+            self.stdout.write(
+                f"{page + 1:>6} {rows:>6} {full:>12} {deferred:>12} {saved:>6.1f}%"
+            )
@@ -0,0 +1,206 @@
+"""
+Micro-benchmarks of the helpers and templates run by every request.
+
+Each benchmark is timed with timeit: the number of loops is picked so a
+run lasts --min-time seconds, then --repeat runs are made and the fastest
+and median time per call are reported in microseconds, as JSON with
+sorted keys. Save a report as the baseline and check a later one against
+it with compare_benchmarks.
+
+Templates are rendered with a context built in memory, so only template
+work is measured; the helpers that query run in a transaction rolled back
+afterwards.
+"""
+
+import random
+import statistics
+import timeit
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.template.loader import render_to_string
+from django.test import RequestFactory
+from django.utils import timezone
+
+from accounts.models import Account, Profile
+from blog.forms import CommentForm
+from blog.models import Category, Post
+from blog.templatetags.post_read_time import estimated_read_time
+from common import utils
+
+from .bench_search import Rollback, vocabulary
+from .run_benchmarks import environment, write_report
+
+# Posts on a listing page (see PostList.paginate_by)
+PAGE_SIZE = 10
+# Words of the small and large HTML bodies
+SMALL_BODY, LARGE_BODY = 60, 6000
+
+
+class Command(BaseCommand):
+    help = (
+        "Time the slug and uid allocators, read time estimation, comment "
+        "validation and page templates, and report them as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument(
+            "--min-time",
+            type=float,
+            default=0.2,
+            help="Seconds each timed run lasts at least.",
+        )
+        parser.add_argument(
+            "--only", help="Run the benchmarks whose name contains this."
+        )
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--output", help="Write the report to this file.")
+
+    def handle(self, *args, **options):
+        self.options = options
+        self.results = {}
+        rng = random.Random(options["seed"])
+        words, weights = vocabulary(rng, 2000)
+        self.html = {
+            size: "".join(
+                "<p>%s</p>" % " ".join(rng.choices(words, weights, k=size // 10))
+                for _ in range(10)
+            )
+            for size in (SMALL_BODY, LARGE_BODY)
+        }
+        try:
+            with transaction.atomic():
+                self.bench_allocators()
+                raise Rollback
+        except Rollback:
+            pass
+        self.bench_read_time()
+        self.bench_comment_form()
+        self.bench_templates()
+
+        report = {
+            "meta": {
+                **environment(),
+                "repeat": options["repeat"],
+                "min_time": options["min_time"],
+            },
+            "benchmarks": self.results,
+        }
+        write_report(self, report, options["output"])
+
+    def bench(self, name, function):
+        """Time function() and record its time per call under name."""
+        if self.options["only"] and self.options["only"] not in name:
+            return
+        timer = timeit.Timer(function)
+        loops = 1
+        # Like Timer.autorange(), up to --min-time rather than 0.2 seconds
+        while timer.timeit(loops) < self.options["min_time"]:
+            loops *= 2
+        runs = [
+            seconds / loops * 1e6
+            for seconds in timer.repeat(self.options["repeat"], loops)
+        ]
+        self.results[name] = {
+            "loops": loops,
+            "min_us": round(min(runs), 3),
+            "median_us": round(statistics.median(runs), 3),
+        }
+        self.stderr.write(f"{name}: {min(runs):.1f} us")
+
+    def bench_allocators(self):
+        taken = Category.objects.create(name="Bench micro", slug="bench-micro")
+        self.bench("generate_slug:free", lambda: utils.generate_slug(Category, "x y"))
+        # The plain slug is taken, a suffixed one is returned
+        self.bench(
+            "generate_slug:taken", lambda: utils.generate_slug(Category, taken.name)
+        )
+        names = [f"Bench micro {i}" for i in range(50)] + [taken.name] * 50
+        self.bench("allocate_slugs:100", lambda: utils.allocate_slugs(Category, names))
+        self.bench("generate_uid", utils.generate_uid)
+        self.bench("allocate_uids:1000", lambda: utils.allocate_uids(1000))
+
+        def insert_conflicting():
+            # A concurrent insert took the slug: the insert fails and retries
+            category = Category(name=taken.name, slug=taken.slug)
+            utils.save_unique(
+                category,
+                "slug",
+                lambda: utils.random_slug(taken.name),
+                lambda: super(Category, category).save(),
+            )
+
+        self.bench("save_unique:taken", insert_conflicting)
+
+    def bench_read_time(self):
+        for size, html in self.html.items():
+            self.bench(
+                f"estimated_read_time:{size}_words",
+                lambda html=html: estimated_read_time(html),
+            )
+        post = Post(content=self.html[LARGE_BODY], read_time=25)
+        self.bench("estimated_read_time:stored", lambda: estimated_read_time(post))
+
+    def bench_comment_form(self):
+        for label, content in (("valid", "Nice post! " * 10), ("invalid", "x" * 301)):
+            self.bench(
+                f"CommentForm:{label}",
+                lambda content=content: CommentForm({"content": content}).is_valid(),
+            )
+
+    def bench_templates(self):
+        now = timezone.now()
+        author = Account(
+            pk=1, email="author@example.com", first_name="A", last_name="B", uid="a1"
+        )
+        Profile(user=author, title="Writer", about="Writes about Django.")
+        reader = Account(
+            pk=2, email="reader@example.com", first_name="C", last_name="D", uid="c2"
+        )
+        category = Category(pk=1, name="Django", slug="django")
+        posts = []
+        for pk in range(1, PAGE_SIZE + 1):
+            post = Post(
+                pk=pk,
+                author=author,
+                category=category,
+                title=f"Post {pk}",
+                slug=f"post-{pk}",
+                content=self.html[SMALL_BODY],
+                status=1,
+                last_update=now,
+                like_count=pk,
+                comment_count=pk,
+            )
+            post.update_derived_fields()
+            posts.append(post)
+
+        for user in (AnonymousUser(), reader):
+            request = RequestFactory().get("/stories/")
+            request.user = user
+            viewer = "member" if user.is_authenticated else "anonymous"
+            context = {
+                "posts": posts,
+                "popular_authors": [author],
+                "popular_categories": [category],
+                "is_paginated": False,
+            }
+            # Cards come from the fragment cache after the first render
+            self.bench(
+                f"render:blog/index.html:{viewer}",
+                lambda context=context, request=request: render_to_string(
+                    "blog/index.html", context, request
+                ),
+            )
+            self.bench(
+                f"render:blog/post_detail.html:{viewer}",
+                lambda request=request: render_to_string(
+                    "blog/post_detail.html", {"post": posts[0]}, request
+                ),
+            )
+        self.bench(
+            "render:blog/post_card.html",
+            lambda: render_to_string("blog/post_card.html", {"post": posts[0]}),
+        )
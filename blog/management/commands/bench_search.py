@@ -0,0 +1,106 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Q
+
+from accounts.models import Account
+from blog.models import Category, Post
+from blog.search import get_backend
+
+SYLLABLES = ["ka", "lo", "mi", "ne", "ru", "sa", "ti", "vo", "ze", "pa", "qu", "do"]
+
+
+def vocabulary(rng, size):
+    """Return size distinct pseudo-words and Zipf-like weights for them."""
+    words = set()
+    while len(words) < size:
+        words.add("".join(rng.choices(SYLLABLES, k=rng.randint(2, 4))))
+    words = sorted(words)
+    rng.shuffle(words)
+    return words, [1 / rank for rank in range(1, size + 1)]
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+class Rollback(Exception):
+    pass
+
+
+class Command(BaseCommand):
+    help = (
+        "Benchmark the configured search backend against a naive scan over a "
+        "seeded corpus (rolled back afterwards)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--posts", type=int, default=2000)
+        parser.add_argument("--words", type=int, default=400, help="Words per post.")
+        parser.add_argument("--vocabulary", type=int, default=5000)
+        parser.add_argument("--queries", type=int, default=50)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def seed(self, options, rng, words, weights):
+        author = Account.objects.create_user(
+            "bench-search@example.com", "Bench", "Search", None
+        )
+        category = Category.objects.create(name="Bench search", slug="bench-search")
+        posts = [
+            Post(
+                author=author,
+                category=category,
+                title=" ".join(rng.choices(words, weights, k=6)),
+                slug=f"bench-search-{i}",
+                content="<p>%s</p>"
+                % " ".join(rng.choices(words, weights, k=options["words"])),
+                status=1,
+            )
+            for i in range(options["posts"])
+        ]
+        # bulk_create skips signals, the index is built separately
+        return Post.objects.bulk_create(posts, batch_size=500)
+
+    def run(self, options):
+        rng = random.Random(options["seed"])
+        words, weights = vocabulary(rng, options["vocabulary"])
+        backend = get_backend()
+        _, seed_ms = timed(self.seed, options, rng, words, weights)
+        indexed, index_ms = timed(backend.rebuild)
+
+        # Query words from the head of the distribution, which match many posts
+        queries = [rng.sample(words[:200], 2) for _ in range(options["queries"])]
+        engine, naive = [], []
+        for query in queries:
+            _, ms = timed(backend.search_ids, " ".join(query))
+            engine.append(ms)
+            scan = Post.objects.filter(status=1)
+            for word in query:
+                scan = scan.filter(
+                    Q(title__icontains=word) | Q(content__icontains=word)
+                )
+            _, ms = timed(list, scan.values_list("pk", flat=True))
+            naive.append(ms)
+
+        name = backend.__class__.__name__
+        self.stdout.write(f"Seeded {options['posts']} posts in {seed_ms:.0f} ms")
+        self.stdout.write(f"{name} indexed {indexed} posts in {index_ms:.0f} ms")
+        self.stdout.write(f"{'engine':<24} {'p50 ms':>8} {'p95 ms':>8}")
+        for label, samples in ((name, engine), ("naive scan", naive)):
+            p95 = statistics.quantiles(samples, n=20)[-1]
+            self.stdout.write(
+                f"{label:<24} {statistics.median(samples):>8.2f} {p95:>8.2f}"
+            )
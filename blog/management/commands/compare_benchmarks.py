@@ -0,0 +1,70 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+
+# Report section -> metrics compared, lower is better
+METRICS = {
+    # bench_micro
+    "benchmarks": ("min_us",),
+    # run_benchmarks
+    "routes": ("p50_ms", "p95_ms", "queries_max"),
+}
+
+
+def load(path):
+    try:
+        with open(path) as file:
+            return json.load(file)
+    except (OSError, ValueError) as error:
+        raise CommandError(f"Cannot read report {path}: {error}")
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare a bench_micro or run_benchmarks report with a baseline and "
+        "fail on regressions above the threshold."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("baseline", help="Report of the reference commit.")
+        parser.add_argument("report", help="Report of the commit under test.")
+        parser.add_argument(
+            "--threshold",
+            type=float,
+            default=10,
+            help="Percent a metric may grow before it counts as a regression.",
+        )
+
+    def handle(self, *args, **options):
+        baseline, report = load(options["baseline"]), load(options["report"])
+        limit = 1 + options["threshold"] / 100
+        sections = [section for section in METRICS if section in report]
+        if not sections or not all(section in baseline for section in sections):
+            raise CommandError("The reports are not of the same benchmark.")
+
+        regressions = []
+        self.stdout.write(
+            f"{'benchmark':<48} {'baseline':>12} {'now':>12} {'change':>8}"
+        )
+        for section in sections:
+            for name, result in sorted(report[section].items()):
+                before = baseline[section].get(name)
+                if before is None:
+                    self.stdout.write(f"{name:<48} {'(new)':>12}")
+                    continue
+                for metric in METRICS[section]:
+                    old, new = before[metric], result[metric]
+                    label = f"{name} {metric}"
+                    change = f"{(new / old - 1) * 100:+.1f}%" if old else ""
+                    line = f"{label:<48} {old:>12} {new:>12} {change:>8}"
+                    # A metric going up from zero is a regression too
+                    if new > old * limit or (not old and new):
+                        regressions.append(label)
+                        line += "  REGRESSION"
+                    self.stdout.write(line)
+        if regressions:
+            raise CommandError(
+                f"{len(regressions)} regression(s) above {options['threshold']}%: "
+                + ", ".join(regressions)
+            )
+        self.stdout.write(f"No regressions above {options['threshold']}%.")
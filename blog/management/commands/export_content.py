@@ -0,0 +1,117 @@
+"""
+Export the site's content as JSON lines, for import_content.
+
+Every line is one record: {"type": ..., fields}. Records refer to each
+other by natural keys (emails of users, slugs of categories and posts),
+never by primary keys, so they can be imported into a database that
+already has content. Types come in dependency order. Counters, timelines
+and the search index are derived and not exported.
+"""
+
+import json
+from datetime import datetime
+
+from django.core.management.base import BaseCommand
+
+from accounts.models import Account, Bookmark, Like, UserFollowing
+from blog.models import Category, Comment, Post
+
+# Record type -> (model, {record key: field lookup}), in dependency order
+RECORDS = {
+    "category": (Category, {"name": "name", "slug": "slug"}),
+    "user": (
+        Account,
+        {
+            "email": "email",
+            "first_name": "first_name",
+            "last_name": "last_name",
+            "uid": "uid",
+            "password": "password",
+            "is_active": "is_active",
+            "is_staff": "is_staff",
+            "is_superuser": "is_superuser",
+            "is_admin": "is_admin",
+            "date_joined": "date_joined",
+            "last_login": "last_login",
+            "title": "profile__title",
+            "about": "profile__about",
+        },
+    ),
+    "post": (
+        Post,
+        {
+            "author": "author__email",
+            "category": "category__slug",
+            "title": "title",
+            "slug": "slug",
+            "content": "content",
+            "status": "status",
+            "published_at": "published_at",
+            "last_update": "last_update",
+            "read_time": "read_time",
+            "excerpt": "excerpt",
+            "excerpt_html": "excerpt_html",
+        },
+    ),
+    "comment": (
+        Comment,
+        {
+            "post": "post__slug",
+            "author": "author__email",
+            "content": "content",
+            "commented_on": "commented_on",
+        },
+    ),
+    "like": (Like, {"user": "user__email", "post": "post__slug"}),
+    "bookmark": (
+        Bookmark,
+        {"user": "user__email", "post": "post__slug", "saved_at": "saved_at"},
+    ),
+    "follow": (
+        UserFollowing,
+        {"user": "user__email", "following": "user_following__email"},
+    ),
+}
+
+
+def encode(value):
+    # isoformat() keeps the microseconds DjangoJSONEncoder drops
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+
+class Command(BaseCommand):
+    help = (
+        "Stream categories, users (with password hashes), posts, comments, "
+        "likes, bookmarks and follows out as JSON lines."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--output", help="Write to this file, not stdout.")
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=2000,
+            help="Rows fetched from the database at a time.",
+        )
+
+    def handle(self, *args, **options):
+        if options["output"]:
+            with open(options["output"], "w") as file:
+                self.export(options["chunk_size"], lambda line: file.write(line + "\n"))
+        else:
+            self.export(options["chunk_size"], self.stdout.write)
+
+    def export(self, chunk_size, write):
+        for kind, (model, fields) in RECORDS.items():
+            rows = model.objects.order_by("pk").values_list(*fields.values())
+            count = 0
+            # iterator() streams the rows rather than caching the queryset
+            for row in rows.iterator(chunk_size=chunk_size):
+                write(
+                    json.dumps({"type": kind, **dict(zip(fields, row))}, default=encode)
+                )
+                count += 1
+            # The records may be on stdout
+            self.stderr.write(f"Exported {count} {kind} records.")
@@ -0,0 +1,333 @@
+"""
+Import the JSON lines written by export_content.
+
+Lines are read and inserted --batch-size at a time with bulk_create, each
+batch in its own transaction, so memory stays flat whatever the size of
+the file. Slugs and uids that are missing, or taken by other rows, are
+allocated for a whole batch at once (see common.utils). Every batch
+resolves the natural keys it refers to with one query per type.
+
+After each batch the byte offset reached is saved next to the file
+(<file>.progress), and an interrupted import started again resumes from
+there. Records already in the database (same email, slug, relation, or
+comment of the same author on the same post at the same time) are
+skipped, so a batch replayed after a crash does not duplicate anything.
+
+Bulk inserts skip signals: counters, timelines, the search index and the
+leaderboards are rebuilt once at the end.
+"""
+
+import json
+import os
+from collections import Counter, defaultdict
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from accounts.models import Account, Bookmark, Like, Profile, UserFollowing
+from blog import caching
+from blog.models import Category, Comment, Post
+from common import utils
+
+from .export_content import RECORDS
+from .seed_benchmark_data import rebuild_derived
+
+
+def parse(value):
+    return parse_datetime(value) if value else None
+
+
+def pk_map(model, field, values):
+    """Return {value of field: pk} for the rows of model with those values."""
+    rows = model.objects.filter(**{f"{field}__in": set(values) - {None}})
+    return dict(rows.values_list(field, "pk"))
+
+
+def absent(model, field, records, key):
+    """
+    Return the records whose key is not yet stored in field of model, the
+    first one only of records sharing a key. Records without key are kept.
+    """
+    stored = set(pk_map(model, field, [record.get(key) for record in records]))
+    fresh = []
+    for record in records:
+        value = record.get(key)
+        if value in stored:
+            continue
+        if value:
+            stored.add(value)
+        fresh.append(record)
+    return fresh
+
+
+def read_progress(path):
+    try:
+        with open(path) as file:
+            return int(file.read())
+    except FileNotFoundError:
+        return 0
+
+
+def save_progress(path, offset):
+    # Replace the file in one step, a crash never leaves it half written
+    with open(f"{path}.tmp", "w") as file:
+        file.write(str(offset))
+    os.replace(f"{path}.tmp", path)
+
+
+class Command(BaseCommand):
+    help = (
+        "Import the JSON lines of export_content in bounded batches, resuming "
+        "an interrupted import."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("path", help="File written by export_content.")
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Records inserted per transaction.",
+        )
+        parser.add_argument(
+            "--restart",
+            action="store_true",
+            help="Start from the beginning, ignoring the saved progress.",
+        )
+        parser.add_argument(
+            "--skip-rebuild",
+            action="store_true",
+            help="Leave counters, timelines, search index and leaderboards as is.",
+        )
+
+    def handle(self, *args, **options):
+        path, batch_size = options["path"], options["batch_size"]
+        progress = f"{path}.progress"
+        offset = 0 if options["restart"] else read_progress(progress)
+        self.counts = Counter()
+        handlers = {
+            "category": self.import_categories,
+            "user": self.import_users,
+            "post": self.import_posts,
+            "comment": self.import_comments,
+            "like": lambda records: self.import_relations(
+                "like", Like, "post", records
+            ),
+            "bookmark": lambda records: self.import_relations(
+                "bookmark", Bookmark, "post", records
+            ),
+            "follow": lambda records: self.import_relations(
+                "follow", UserFollowing, "user_following", records, key="following"
+            ),
+        }
+
+        with open(path, "rb") as file:
+            if offset:
+                self.stdout.write(f"Resuming after byte {offset}.")
+                file.seek(offset)
+            batch = []
+            while True:
+                line = file.readline()
+                if line.strip():
+                    record = json.loads(line)
+                    if record.get("type") not in handlers:
+                        raise CommandError(f"Unknown record: {line[:80]!r}")
+                    batch.append(record)
+                if batch and (len(batch) == batch_size or not line):
+                    self.import_batch(batch, handlers)
+                    save_progress(progress, file.tell())
+                    batch = []
+                if not line:
+                    break
+        if os.path.exists(progress):
+            os.remove(progress)
+
+        for kind in RECORDS:
+            imported, skipped = self.counts[kind], self.counts[f"{kind} skipped"]
+            self.stdout.write(f"{kind}: {imported} imported, {skipped} skipped")
+        # Cached pages do not know about the new posts
+        caching.bump("listing")
+        if not options["skip_rebuild"]:
+            rebuild_derived(self)
+
+    def import_batch(self, records, handlers):
+        by_type = defaultdict(list)
+        for record in records:
+            by_type[record["type"]].append(record)
+        with transaction.atomic():
+            # Records of a batch may refer to earlier records of the batch
+            for kind in RECORDS:
+                if by_type[kind]:
+                    handlers[kind](by_type[kind])
+
+    def insert(self, kind, model, objs, skipped):
+        created = model.objects.bulk_create(objs)
+        self.counts[kind] += len(objs)
+        self.counts[f"{kind} skipped"] += skipped
+        return created
+
+    def restore(self, model, objs, keys, field, values, since=None):
+        """
+        Store the exported values of an auto_now field, which inserts reset.
+        Not every database returns the primary keys of bulk inserts, so the
+        rows are found again by their keys fields (and, with since, a value
+        of field not older than that), rows sharing keys in insertion order.
+        """
+        rows = model.objects.filter(
+            **{f"{key}__in": {getattr(obj, key) for obj in objs} for key in keys}
+        )
+        if since:
+            rows = rows.filter(**{f"{field}__gte": since})
+        pks = defaultdict(list)
+        for *key, pk in rows.order_by("pk").values_list(*keys, "pk"):
+            pks[tuple(key)].append(pk)
+        pks = {key: iter(found) for key, found in pks.items()}
+        for obj, value in zip(objs, values):
+            obj.pk = next(pks[tuple(getattr(obj, key) for key in keys)])
+            setattr(obj, field, value or getattr(obj, field))
+        model.objects.bulk_update(objs, [field])
+
+    def import_categories(self, records):
+        fresh = absent(Category, "slug", records, "slug")
+        unnamed = [record["name"] for record in fresh if not record.get("slug")]
+        slugs = iter(utils.allocate_slugs(Category, unnamed))
+        categories = [
+            Category(name=record["name"], slug=record.get("slug") or next(slugs))
+            for record in fresh
+        ]
+        self.insert("category", Category, categories, len(records) - len(fresh))
+
+    def import_users(self, records):
+        fresh = absent(Account, "email", records, "email")
+        # Keep the exported uids unless taken, allocate the missing ones
+        taken = set(pk_map(Account, "uid", [record.get("uid") for record in fresh]))
+        uids = []
+        for record in fresh:
+            uid = record.get("uid")
+            uids.append(uid if uid and uid not in taken else None)
+            taken.add(uid)
+        allocated = iter(utils.allocate_uids(uids.count(None)))
+        accounts = [
+            Account(
+                email=record["email"],
+                first_name=record["first_name"],
+                last_name=record["last_name"],
+                uid=uid or next(allocated),
+                password=record.get("password") or make_password(None),
+                is_active=record.get("is_active", True),
+                is_staff=record.get("is_staff", False),
+                is_superuser=record.get("is_superuser", False),
+                is_admin=record.get("is_admin", False),
+                date_joined=parse(record.get("date_joined")) or timezone.now(),
+                last_login=parse(record.get("last_login")),
+            )
+            for record, uid in zip(fresh, uids)
+        ]
+        self.insert("user", Account, accounts, len(records) - len(fresh))
+        # Not every database returns the primary keys of bulk inserts
+        users = pk_map(Account, "email", [record["email"] for record in fresh])
+        Profile.objects.bulk_create(
+            Profile(
+                user_id=users[record["email"]],
+                title=record.get("title") or "",
+                about=record.get("about") or "",
+            )
+            for record in fresh
+        )
+
+    def import_posts(self, records):
+        fresh = absent(Post, "slug", records, "slug")
+        authors = pk_map(Account, "email", [record["author"] for record in fresh])
+        categories = pk_map(Category, "slug", [record["category"] for record in fresh])
+        fresh = [
+            record
+            for record in fresh
+            if record["author"] in authors and record["category"] in categories
+        ]
+        untitled = [record["title"] for record in fresh if not record.get("slug")]
+        slugs = iter(utils.allocate_slugs(Post, untitled))
+        posts = []
+        for record in fresh:
+            post = Post(
+                author_id=authors[record["author"]],
+                category_id=categories[record["category"]],
+                title=record["title"],
+                slug=record.get("slug") or next(slugs),
+                content=record["content"],
+                status=record.get("status", 0),
+                published_at=parse(record.get("published_at")),
+                read_time=record.get("read_time"),
+                excerpt=record.get("excerpt"),
+                excerpt_html=record.get("excerpt_html"),
+            )
+            if post.read_time is None:
+                post.update_derived_fields()
+            if post.status == 1 and post.published_at is None:
+                post.published_at = parse(record.get("last_update")) or timezone.now()
+            posts.append(post)
+        posts = self.insert("post", Post, posts, len(records) - len(fresh))
+        updates = [parse(record.get("last_update")) for record in fresh]
+        self.restore(Post, posts, ["slug"], "last_update", updates)
+
+    def import_comments(self, records):
+        authors = pk_map(Account, "email", [record["author"] for record in records])
+        posts = pk_map(Post, "slug", [record["post"] for record in records])
+        # A comment is the same if its author wrote it on the post at that time
+        stored = set(
+            Comment.objects.filter(
+                post__in=posts.values(),
+                commented_on__in=[parse(record["commented_on"]) for record in records],
+            ).values_list("post_id", "author_id", "commented_on")
+        )
+        fresh, comments = [], []
+        for record in records:
+            if record["author"] not in authors or record["post"] not in posts:
+                continue
+            key = (
+                posts[record["post"]],
+                authors[record["author"]],
+                parse(record["commented_on"]),
+            )
+            if key in stored:
+                continue
+            stored.add(key)
+            fresh.append(record)
+            comments.append(
+                Comment(post_id=key[0], author_id=key[1], content=record["content"])
+            )
+        inserted = timezone.now()
+        comments = self.insert("comment", Comment, comments, len(records) - len(fresh))
+        dates = [parse(record["commented_on"]) for record in fresh]
+        # The stored comments with the same text are older than the insert
+        keys = ["post_id", "author_id", "content"]
+        self.restore(Comment, comments, keys, "commented_on", dates, since=inserted)
+
+    def import_relations(self, kind, model, field, records, key="post"):
+        """
+        Import likes, bookmarks or follows: relations of a user, by email,
+        and the post (by slug) or user (by email) of field, under key.
+        """
+        target = model._meta.get_field(field).related_model
+        natural_key = "slug" if target is Post else "email"
+        users = pk_map(Account, "email", [record["user"] for record in records])
+        targets = pk_map(target, natural_key, [record[key] for record in records])
+        stored = set(
+            model.objects.filter(
+                user__in=users.values(), **{f"{field}__in": targets.values()}
+            ).values_list("user_id", f"{field}_id")
+        )
+        fresh, objs = [], []
+        for record in records:
+            pair = (users.get(record["user"]), targets.get(record[key]))
+            if None in pair or pair in stored:
+                continue
+            stored.add(pair)
+            fresh.append(record)
+            objs.append(model(user_id=pair[0], **{f"{field}_id": pair[1]}))
+        objs = self.insert(kind, model, objs, len(records) - len(fresh))
+        if model is Bookmark:
+            dates = [parse(record.get("saved_at")) for record in fresh]
+            self.restore(Bookmark, objs, ["user_id", "post_id"], "saved_at", dates)
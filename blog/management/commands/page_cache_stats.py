@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from blog import caching
+
+
+class Command(BaseCommand):
+    help = "Show the hit and miss counts of the anonymous page cache."
+
+    def handle(self, *args, **options):
+        stats = caching.stats()
+        total = stats["hits"] + stats["misses"]
+        ratio = stats["hits"] / total if total else 0
+        self.stdout.write(
+            f"{stats['hits']} hits, {stats['misses']} misses ({ratio:.1%} hit ratio)"
+        )
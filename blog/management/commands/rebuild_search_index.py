@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from blog.search import get_backend
+
+
+class Command(BaseCommand):
+    help = "Rebuild the full-text search index of published posts."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=500,
+            help="Number of posts indexed per batch.",
+        )
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        indexed = backend.rebuild(chunk_size=options["chunk_size"])
+        name = backend.__class__.__name__
+        self.stdout.write(self.style.SUCCESS(f"Indexed {indexed} posts with {name}."))
@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand
+
+from blog import timeline
+
+
+class Command(BaseCommand):
+    help = "Recreate the following feeds from the follow relations."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--size",
+            type=int,
+            default=timeline.BACKFILL_SIZE,
+            help="Latest posts of each followed author added to a feed.",
+        )
+
+    def handle(self, *args, **options):
+        written = timeline.rebuild(size=options["size"])
+        self.stdout.write(self.style.SUCCESS(f"Wrote {written} timeline entries."))
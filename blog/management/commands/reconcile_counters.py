@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand
+from django.db.models import OuterRef
+
+from accounts.models import Bookmark, Like
+from blog.models import Comment, Post
+from common import utils
+
+# counter field on Post -> model whose rows it counts
+COUNTERS = {
+    "like_count": Like,
+    "comment_count": Comment,
+    "bookmark_count": Bookmark,
+}
+
+
+def actual_count(model):
+    """Correlated subquery counting the rows of model for the outer post."""
+    return utils.count_subquery(model.objects.filter(post=OuterRef("pk")), "post")
+
+
+class Command(BaseCommand):
+    help = "Repair drift in the like, comment and bookmark counters of posts."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--chunk-size",
+            type=int,
+            default=1000,
+            help="Number of posts checked per batch.",
+        )
+        parser.add_argument(
+            "--dry-run",
+            action="store_true",
+            help="Report drifted posts without fixing them.",
+        )
+
+    def handle(self, *args, **options):
+        checked, drifted = utils.reconcile(
+            Post.objects.all(),
+            {field: actual_count(model) for field, model in COUNTERS.items()},
+            options["chunk_size"],
+            options["dry_run"],
+        )
+        verb = "Found" if options["dry_run"] else "Repaired"
+        self.stdout.write(
+            self.style.SUCCESS(f"{verb} {drifted} drifted of {checked} posts.")
+        )
@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from blog import leaderboard
+from blog.models import Ranking
+
+
+class Command(BaseCommand):
+    help = "Recompute the popular authors and categories leaderboards."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "kinds",
+            nargs="*",
+            help="Leaderboards to refresh: author, category (all by default).",
+        )
+
+    def handle(self, *args, **options):
+        known = [kind for kind, _ in Ranking.KINDS]
+        kinds = options["kinds"] or known
+        unknown = set(kinds) - set(known)
+        if unknown:
+            raise CommandError(f"Unknown leaderboards: {', '.join(sorted(unknown))}")
+        leaderboard.refresh(kinds)
+        for kind in kinds:
+            count = Ranking.objects.filter(kind=kind).count()
+            self.stdout.write(self.style.SUCCESS(f"Ranked {count} {kind} entries."))
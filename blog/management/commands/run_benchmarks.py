@@ -0,0 +1,306 @@
+"""
+Replay skewed traffic against every URL of the blog and accounts apps.
+
+Requests go through the Django test client, in process, against the data
+of seed_benchmark_data: pages of popular posts, authors and categories
+are requested more often, by the same Zipf weights. Each route gets
+--warmup unmeasured requests, then the measured requests of all routes
+are replayed in a shuffled order. Everything runs in a transaction that
+is rolled back, and the caches are emptied before and after, so every
+run starts from the same state.
+
+The report is JSON with sorted keys: per route the p50/p95/p99 latency
+in ms, the mean and max queries per request and the status codes seen,
+plus the peak RSS of the process, so reports of two commits can be
+diffed.
+"""
+
+import json
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import time
+from collections import Counter, namedtuple
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.test import Client, override_settings
+from django.urls import reverse
+
+from accounts.models import Account, Bookmark, Like, UserFollowing
+from blog.models import Category, Comment, Post
+from common.middleware import QueryRecorder
+from common.testing import clear_caches, url_names
+
+from .bench_search import Rollback
+from .seed_benchmark_data import benchmark_accounts, zipf_weights
+
+# A request of a route: client.<method>(path, data)
+Request = namedtuple("Request", "client method path data")
+
+
+def quantiles(samples):
+    """Return the p50, p95 and p99 of samples."""
+    cuts = statistics.quantiles(samples, n=100, method="inclusive")
+    return {"p50": cuts[49], "p95": cuts[94], "p99": cuts[98]}
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, check=True, text=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def environment():
+    """Return what a benchmark report was measured on."""
+    return {
+        "commit": git_commit(),
+        "database": connection.vendor,
+        "django": django.get_version(),
+        "python": platform.python_version(),
+    }
+
+
+def write_report(command, report, path):
+    """Write report as sorted JSON to path, or to the command's stdout."""
+    output = json.dumps(report, indent=2, sort_keys=True) + "\n"
+    if path:
+        with open(path, "w") as file:
+            file.write(output)
+    else:
+        command.stdout.write(output, ending="")
+
+
+class Traffic:
+    """Draw the targets of requests by popularity."""
+
+    def __init__(self, rng, values, exponent):
+        self.rng = rng
+        self.values = values
+        self.weights = zipf_weights(len(values), exponent)
+
+    def __call__(self):
+        return self.rng.choices(self.values, cum_weights=self.weights)[0]
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay Zipf-skewed traffic against every URL over the data of "
+        "seed_benchmark_data and report latency, queries and peak RSS as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--requests", type=int, default=100, help="Measured requests per URL."
+        )
+        parser.add_argument(
+            "--warmup", type=int, default=5, help="Unmeasured requests per URL."
+        )
+        parser.add_argument(
+            "--zipf", type=float, default=1.1, help="Exponent of the traffic skew."
+        )
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--output", help="Write the report to this file.")
+
+    def handle(self, *args, **options):
+        if options["requests"] < 2:
+            raise CommandError("Measure at least 2 requests per URL.")
+        rng = random.Random(options["seed"])
+        # The test client's host, and no mail or query sampling on the side
+        with override_settings(
+            ALLOWED_HOSTS=["testserver"],
+            EMAIL_BACKEND="django.core.mail.backends.locmem.EmailBackend",
+            QUERY_SAMPLE_RATE=0,
+        ):
+            try:
+                with transaction.atomic():
+                    clear_caches()
+                    routes = self.get_routes(rng, options["zipf"])
+                    missing = url_names("blog.urls") | url_names("accounts.urls")
+                    missing -= set(routes)
+                    if missing:
+                        raise CommandError(
+                            f"No traffic defined for {', '.join(sorted(missing))}."
+                        )
+                    results = self.replay(rng, routes, options)
+                    raise Rollback
+            except Rollback:
+                pass
+            finally:
+                clear_caches()
+
+        report = {
+            "meta": {
+                **environment(),
+                "seed": options["seed"],
+                "requests": options["requests"],
+                "warmup": options["warmup"],
+                "zipf": options["zipf"],
+            },
+            "data": self.data,
+            # Kilobytes on Linux
+            "peak_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+            "routes": results,
+        }
+        write_report(self, report, options["output"])
+
+    def get_routes(self, rng, exponent):
+        """Return {URL name: function returning the next Request}."""
+        accounts = benchmark_accounts()
+        posts = Post.objects.filter(author__in=accounts)
+        self.data = {
+            model.__name__: model.objects.filter(**{lookup: accounts}).count()
+            for model, lookup in (
+                (Account, "pk__in"),
+                (Post, "author__in"),
+                (Comment, "author__in"),
+                (Like, "user__in"),
+                (Bookmark, "user__in"),
+                (UserFollowing, "user__in"),
+            )
+        }
+        categories = Category.objects.filter(post__in=posts).distinct()
+        self.data["Category"] = categories.count()
+
+        # The most prolific author among commenters browses and interacts
+        comment = Comment.objects.filter(
+            author__in=accounts, author__profile__posts_count__gt=0
+        )
+        comment = comment.order_by("-author__profile__posts_count", "pk").first()
+        if comment is None:
+            raise CommandError("No benchmark data, run seed_benchmark_data first.")
+        viewer = comment.author
+
+        def ranked(queryset, field, *ordering):
+            values = queryset.order_by(*ordering, "pk").values_list(field, flat=True)
+            return Traffic(rng, list(values), exponent)
+
+        published = posts.filter(status=1)
+        popular_post = ranked(published, "pk", "-like_count")
+        popular_slug = ranked(published, "slug", "-like_count")
+        commented_slug = ranked(published, "slug", "-comment_count")
+        popular_author = ranked(accounts, "pk", "-profile__followers_count")
+        author_uid = ranked(accounts, "uid", "-profile__followers_count")
+        category_slug = ranked(
+            categories.annotate(posts=Count("post")), "slug", "-posts"
+        )
+        titles = ranked(published, "title", "-like_count")
+        own_slugs = list(posts.filter(author=viewer).values_list("slug", flat=True))
+        own_comments = list(
+            Comment.objects.filter(author=viewer).values_list("post__slug", "pk")
+        )
+
+        anonymous, member = Client(), Client()
+        member.force_login(viewer)
+
+        def get(path, client=member):
+            return lambda: Request(client, "get", path, None)
+
+        def url(name, *args):
+            return reverse(name, args=args)
+
+        def signed_out():
+            # A new session for each request, as logging out ends it
+            client = Client()
+            client.force_login(viewer)
+            return Request(client, "get", url("accounts:logout"), None)
+
+        def own_post(name):
+            slug = rng.choice(own_slugs)
+            return Request(member, "get", url(name, slug), None)
+
+        def own_comment(name):
+            slug, pk = rng.choice(own_comments)
+            return Request(member, "get", url(name, slug, pk), None)
+
+        def toggle(name, field, target):
+            return lambda: Request(
+                member, "post", url(name), {field: target(), "action": "toggle"}
+            )
+
+        def search(name):
+            def request():
+                words = titles().split()
+                query = " ".join(rng.sample(words, min(len(words), 2)))
+                return Request(member, "get", url(name), {"q": query})
+
+            return request
+
+        def popular(name, target):
+            return lambda: Request(member, "get", url(name, target()), None)
+
+        return {
+            "blog:home": get(url("blog:home"), client=anonymous),
+            "blog:post-list": get(url("blog:post-list")),
+            "blog:following": get(url("blog:following")),
+            "blog:search": search("blog:search"),
+            "blog:search-suggest": search("blog:search-suggest"),
+            "blog:post-create": get(url("blog:post-create")),
+            "blog:post-detail": popular("blog:post-detail", popular_slug),
+            "blog:post-update": lambda: own_post("blog:post-update"),
+            "blog:post-delete": lambda: own_post("blog:post-delete"),
+            "blog:comment-list": popular("blog:comment-list", commented_slug),
+            "blog:comment-update": lambda: own_comment("blog:comment-update"),
+            "blog:comment-delete": lambda: own_comment("blog:comment-delete"),
+            "blog:category": popular("blog:category", category_slug),
+            "accounts:signup": get(url("accounts:signup"), client=anonymous),
+            "accounts:login": get(url("accounts:login"), client=anonymous),
+            "accounts:logout": signed_out,
+            "accounts:verify": get(url("accounts:verify"), client=anonymous),
+            "accounts:follow": toggle("accounts:follow", "user_id", popular_author),
+            "accounts:like": toggle("accounts:like", "post_id", popular_post),
+            "accounts:bookmark": toggle("accounts:bookmark", "post_id", popular_post),
+            # An expired link: the lookup of the account and the token check
+            "accounts:activate": get(
+                url("accounts:activate", "MQ", "expired-token"), client=anonymous
+            ),
+            "accounts:profile": popular("accounts:profile", author_uid),
+            "accounts:update-profile": get(url("accounts:update-profile", viewer.uid)),
+            "accounts:draft": get(url("accounts:draft", viewer.uid)),
+            "accounts:saved": get(url("accounts:saved", viewer.uid)),
+        }
+
+    def replay(self, rng, routes, options):
+        for name, next_request in routes.items():
+            for _ in range(options["warmup"]):
+                self.send(next_request())
+
+        schedule = [name for name in routes for _ in range(options["requests"])]
+        rng.shuffle(schedule)
+        timings = {name: [] for name in routes}
+        queries = {name: [] for name in routes}
+        statuses = {name: Counter() for name in routes}
+        for name in schedule:
+            ms, count, status = self.send(routes[name]())
+            timings[name].append(ms)
+            queries[name].append(count)
+            statuses[name][str(status)] += 1
+
+        return {
+            name: {
+                **{
+                    f"{label}_ms": round(value, 3)
+                    for label, value in quantiles(timings[name]).items()
+                },
+                "queries_mean": round(statistics.mean(queries[name]), 2),
+                "queries_max": max(queries[name]),
+                "status": dict(statuses[name]),
+            }
+            for name in routes
+        }
+
+    def send(self, request):
+        """Send request, return its duration in ms, queries and status."""
+        method = getattr(request.client, request.method)
+        with QueryRecorder() as recorder:
+            start = time.perf_counter()
+            response = method(request.path, request.data)
+            ms = (time.perf_counter() - start) * 1000
+        return ms, len(recorder), response.status_code
@@ -0,0 +1,278 @@
+"""
+Seed a database with benchmark data of realistic shape.
+
+Users, posts and categories get a popularity rank, and who writes, who is
+followed, which posts are liked, bookmarked and commented on are drawn by
+Zipf weights (1 / rank ** --zipf), so a few authors have most followers
+and a few posts most likes, as on a real site. Rows are bulk inserted,
+which skips signals: counters, timelines, the search index and the
+leaderboards are rebuilt by the maintenance commands afterwards.
+"""
+
+import itertools
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from accounts.models import Account, Bookmark, Like, Profile, UserFollowing
+from blog import leaderboard, timeline
+from blog.models import Category, Comment, Post
+from blog.search import get_backend
+from common import utils
+
+from .bench_search import timed, vocabulary
+
+# Seeded accounts are bench-<n>@example.com, all with this password
+EMAIL_PREFIX = "bench-"
+EMAIL_DOMAIN = "@example.com"
+PASSWORD = "benchmark"
+# Seeded categories are named "Bench <word>"
+CATEGORY_PREFIX = "Bench "
+# Share of the seeded posts that are published, the rest are drafts
+PUBLISHED_SHARE = 0.9
+# Rounds of drawing before a relation gives up on reaching its count
+PAIR_ATTEMPTS = 20
+
+
+def benchmark_accounts():
+    return Account.objects.filter(
+        email__startswith=EMAIL_PREFIX, email__endswith=EMAIL_DOMAIN
+    )
+
+
+def rebuild_derived(command):
+    """
+    Rebuild what bulk inserts skip: counters, timelines, the search index
+    and the leaderboards, reporting to command's stdout.
+    """
+    steps = (
+        ("counters", call_command, "reconcile_counters"),
+        ("profiles", call_command, "reconcile_profiles"),
+        ("timelines", timeline.rebuild),
+        ("search index", get_backend().rebuild),
+        ("leaderboards", leaderboard.refresh),
+    )
+    for label, function, *args in steps:
+        kwargs = {"stdout": command.stdout} if function is call_command else {}
+        _, ms = timed(lambda: function(*args, **kwargs))
+        command.stdout.write(f"Rebuilt the {label} in {ms:.0f} ms")
+
+
+def zipf_weights(size, exponent):
+    """Return cumulative Zipf weights of size ranks, for random.choices()."""
+    return list(
+        itertools.accumulate(1 / rank**exponent for rank in range(1, size + 1))
+    )
+
+
+def draw_pairs(rng, count, left, right, left_weights, right_weights, loops=True):
+    """
+    Return up to count distinct (a, b) pairs, a drawn from left and b from
+    right by their cumulative weights; a == b is skipped unless loops.
+    """
+    pairs = set()
+    count = min(count, len(left) * len(right))
+    for _ in range(PAIR_ATTEMPTS):
+        missing = count - len(pairs)
+        if missing <= 0:
+            break
+        lefts = rng.choices(left, cum_weights=left_weights, k=missing)
+        rights = rng.choices(right, cum_weights=right_weights, k=missing)
+        pairs.update((a, b) for a, b in zip(lefts, rights) if loops or a != b)
+    return sorted(pairs)
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed users, categories, posts, comments, likes, bookmarks and follows "
+        "with Zipf-skewed popularity, for run_benchmarks."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=1000)
+        parser.add_argument("--categories", type=int, default=20)
+        parser.add_argument("--posts", type=int, default=5000)
+        parser.add_argument("--comments", type=int, default=20000)
+        parser.add_argument("--likes", type=int, default=50000)
+        parser.add_argument("--bookmarks", type=int, default=10000)
+        parser.add_argument("--follows", type=int, default=20000)
+        parser.add_argument("--words", type=int, default=300, help="Words per post.")
+        parser.add_argument(
+            "--days",
+            type=int,
+            default=365,
+            help="Posts are published over this many past days.",
+        )
+        parser.add_argument(
+            "--zipf", type=float, default=1.1, help="Exponent of the popularity skew."
+        )
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=1000,
+            help="Rows inserted per statement.",
+        )
+        parser.add_argument(
+            "--clear",
+            action="store_true",
+            help="Delete previously seeded benchmark data first.",
+        )
+
+    def handle(self, *args, **options):
+        if options["users"] < 2 or min(options["categories"], options["posts"]) < 1:
+            raise CommandError("Seed at least 2 users, 1 category and 1 post.")
+        if benchmark_accounts().exists() or self.categories().exists():
+            if not options["clear"]:
+                raise CommandError(
+                    "Benchmark data is already seeded, pass --clear to replace it."
+                )
+            _, ms = timed(self.clear)
+            self.stdout.write(f"Cleared the previous benchmark data in {ms:.0f} ms")
+
+        rng = random.Random(options["seed"])
+        self.batch_size = options["batch_size"]
+        with transaction.atomic():
+            _, ms = timed(self.seed, options, rng)
+        self.stdout.write(f"Seeded the rows in {ms:.0f} ms")
+        rebuild_derived(self)
+
+    def categories(self):
+        return Category.objects.filter(name__startswith=CATEGORY_PREFIX)
+
+    def clear(self):
+        # Posts cascade from their authors; categories do not cascade
+        benchmark_accounts().delete()
+        self.categories().delete()
+
+    def seed(self, options, rng):
+        words, weights = vocabulary(rng, 2000)
+        weights = list(itertools.accumulate(weights))
+
+        def text(count):
+            return " ".join(rng.choices(words, cum_weights=weights, k=count))
+
+        users = self.seed_users(options["users"], rng, words)
+        categories = self.seed_categories(options["categories"], rng, words)
+
+        # One rank for writing and being followed, popular authors write most
+        exponent = options["zipf"]
+        authors = rng.sample(users, len(users))
+        author_weights = zipf_weights(len(authors), exponent)
+        # Active readers like, bookmark, comment and follow the most
+        readers = rng.sample(users, len(users))
+        reader_weights = zipf_weights(len(readers), exponent)
+
+        now = timezone.now()
+        drawn_authors = rng.choices(
+            authors, cum_weights=author_weights, k=options["posts"]
+        )
+        drawn_categories = rng.choices(
+            categories,
+            cum_weights=zipf_weights(len(categories), exponent),
+            k=options["posts"],
+        )
+        posts = []
+        for author, category in zip(drawn_authors, drawn_categories):
+            published = rng.random() < PUBLISHED_SHARE
+            post = Post(
+                author_id=author,
+                category_id=category,
+                title=text(rng.randint(3, 8)).capitalize(),
+                content="".join(
+                    f"<p>{text(options['words'] // 4)}</p>" for _ in range(4)
+                ),
+                status=1 if published else 0,
+            )
+            if published:
+                post.published_at = now - timedelta(
+                    seconds=rng.randrange(options["days"] * 86400)
+                )
+            post.update_derived_fields()
+            posts.append(post)
+        for batch in self.batches(posts):
+            slugs = utils.allocate_slugs(Post, [post.title for post in batch])
+            for post, slug in zip(batch, slugs):
+                post.slug = slug
+            Post.objects.bulk_create(batch)
+        self.stdout.write(f"Post: {len(posts)} rows")
+        # last_update is set on insert, spread it like the publication dates
+        seeded = Post.objects.filter(author__in=benchmark_accounts())
+        seeded.update(last_update=Coalesce(F("published_at"), F("last_update")))
+
+        published = list(
+            seeded.filter(status=1).order_by("pk").values_list("pk", flat=True)
+        )
+        # Post popularity is independent of the author's
+        published = rng.sample(published, len(published))
+        post_weights = zipf_weights(len(published), exponent)
+
+        comments = [
+            Comment(author_id=author, post_id=post, content=text(rng.randint(5, 30)))
+            for author, post in zip(
+                rng.choices(readers, cum_weights=reader_weights, k=options["comments"]),
+                rng.choices(published, cum_weights=post_weights, k=options["comments"]),
+            )
+        ]
+        self.insert(Comment, comments)
+
+        relations = (
+            (Like, "likes", "post_id", published, post_weights),
+            (Bookmark, "bookmarks", "post_id", published, post_weights),
+            (UserFollowing, "follows", "user_following_id", authors, author_weights),
+        )
+        for model, option, target, targets, target_weights in relations:
+            pairs = draw_pairs(
+                rng,
+                options[option],
+                readers,
+                targets,
+                reader_weights,
+                target_weights,
+                # Users do not follow themselves
+                loops=model is not UserFollowing,
+            )
+            self.insert(model, [model(user_id=a, **{target: b}) for a, b in pairs])
+
+    def seed_users(self, count, rng, words):
+        # Hashing is slow by design, the accounts share one hash
+        password = make_password(PASSWORD)
+        accounts = [
+            Account(
+                email=f"{EMAIL_PREFIX}{number}{EMAIL_DOMAIN}",
+                first_name=rng.choice(words).capitalize(),
+                last_name=rng.choice(words).capitalize(),
+                uid=uid,
+                password=password,
+                is_active=True,
+            )
+            for number, uid in enumerate(utils.allocate_uids(count))
+        ]
+        self.insert(Account, accounts)
+        users = list(benchmark_accounts().order_by("pk").values_list("pk", flat=True))
+        self.insert(Profile, [Profile(user_id=user) for user in users])
+        return users
+
+    def seed_categories(self, count, rng, words):
+        names = [f"{CATEGORY_PREFIX}{word}" for word in rng.sample(words, count)]
+        slugs = utils.allocate_slugs(Category, names)
+        categories = [
+            Category(name=name, slug=slug) for name, slug in zip(names, slugs)
+        ]
+        self.insert(Category, categories)
+        return list(self.categories().order_by("pk").values_list("pk", flat=True))
+
+    def batches(self, objs):
+        for start in range(0, len(objs), self.batch_size):
+            yield objs[start : start + self.batch_size]
+
+    def insert(self, model, objs):
+        model.objects.bulk_create(objs, batch_size=self.batch_size)
+        self.stdout.write(f"{model.__name__}: {len(objs)} rows")
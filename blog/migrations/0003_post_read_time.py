@@ -0,0 +1,19 @@
+# Generated by Django 4.1.6 on 2026-10-18 19:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("blog", "0002_comment"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="read_time",
+            field=models.PositiveSmallIntegerField(
+                blank=True, editable=False, null=True
+            ),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.1.6 on 2026-10-18 19:38
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("blog", "0003_post_read_time"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="excerpt",
+            field=models.TextField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="excerpt_html",
+            field=models.TextField(blank=True, editable=False, null=True),
+        ),
+    ]
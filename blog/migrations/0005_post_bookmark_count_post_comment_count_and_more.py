@@ -0,0 +1,27 @@
+# Generated by Django 4.1.6 on 2026-10-18 19:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("blog", "0004_post_excerpt_post_excerpt_html"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="post",
+            name="bookmark_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="comment_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="post",
+            name="like_count",
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
@@ -0,0 +1,16 @@
+# Generated by Django 4.1.6 on 2026-10-18 19:44
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("blog", "0005_post_bookmark_count_post_comment_count_and_more"),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name="post",
+            options={"ordering": ["-last_update", "-id"]},
+        ),
+    ]
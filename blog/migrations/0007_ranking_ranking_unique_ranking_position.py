@@ -0,0 +1,46 @@
+# Generated by Django 4.1.6 on 2026-10-18 19:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("blog", "0006_alter_post_options"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Ranking",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[("author", "Author"), ("category", "Category")],
+                        max_length=20,
+                    ),
+                ),
+                ("position", models.PositiveSmallIntegerField()),
+                ("object_id", models.PositiveBigIntegerField()),
+                ("score", models.FloatField()),
+                ("refreshed_at", models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                "ordering": ["kind", "position"],
+            },
+        ),
+        migrations.AddConstraint(
+            model_name="ranking",
+            constraint=models.UniqueConstraint(
+                fields=("kind", "position"), name="unique_ranking_position"
+            ),
+        ),
+    ]
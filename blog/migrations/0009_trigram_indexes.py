@@ -0,0 +1,34 @@
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations
+
+INDEXES = {
+    "blog_post_title_trgm_idx": ("blog_post", "title"),
+    "blog_category_name_trgm_idx": ("blog_category", "name"),
+}
+
+
+def create_trigram_indexes(apps, schema_editor):
+    """GIN trigram indexes on PostgreSQL; SQLite uses an in-process index."""
+    if schema_editor.connection.vendor == "postgresql":
+        for name, (table, column) in INDEXES.items():
+            schema_editor.execute(
+                f"CREATE INDEX {name} ON {table} USING gin ({column} gin_trgm_ops)"
+            )
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor == "postgresql":
+        for name in INDEXES:
+            schema_editor.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("blog", "0008_search_index"),
+    ]
+
+    operations = [
+        # Does nothing on databases other than PostgreSQL
+        TrigramExtension(),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 4.1.6 on 2026-10-18 20:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("blog", "0010_post_published_at_timelineentry"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="comment",
+            index=models.Index(
+                fields=["post", "-commented_on"], name="comment_post_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                condition=models.Q(("status", 1)),
+                fields=["-last_update", "-id"],
+                name="post_published_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                condition=models.Q(("status", 1)),
+                fields=["category", "-last_update", "-id"],
+                name="post_category_published_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                fields=["author", "status", "-last_update", "-id"],
+                name="post_author_status_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="post",
+            index=models.Index(
+                condition=models.Q(("status", 1)),
+                fields=["author", "-published_at", "-id"],
+                name="post_author_published_at_idx",
+            ),
+        ),
+    ]
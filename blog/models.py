@@ -1,10 +1,35 @@
+import html
+import re
+
+import readtime
 from ckeditor.fields import RichTextField
+from django.apps import apps
 from django.conf import settings
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
+from django.db.models import BooleanField, Exists, F, OuterRef, Value
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
 from django.urls import reverse
+from django.utils import timezone
+from django.utils.html import strip_tags
+from django.utils.text import Truncator
 
 from common import utils
 
+# Tags that break the text, whose words strip_tags would glue together
+BLOCK_TAG = re.compile(
+    r"<(?=/?(?:address|article|blockquote|br|dd|div|dl|dt|figcaption|h[1-6]|hr"
+    r"|li|ol|p|pre|section|table|td|th|tr|ul)\b)",
+    re.IGNORECASE,
+)
+
+
+def plain_text(content):
+    """Return the text of HTML content, one space between blocks."""
+    text = html.unescape(strip_tags(BLOCK_TAG.sub(" <", content)))
+    return " ".join(text.split())
+
 
 class Category(models.Model):
     """Generic category for posts."""
@@ -20,15 +45,66 @@ class Category(models.Model):
         return self.name
 
     def save(self, *args, **kwargs):
-        if not self.slug:
-            self.slug = utils.generate_slug(self.__class__, self.name)
-        super().save(*args, **kwargs)
+        if self.slug:
+            return super().save(*args, **kwargs)
+        self.slug = utils.generate_slug(self.__class__, self.name)
+        utils.save_unique(
+            self,
+            "slug",
+            lambda: utils.random_slug(self.name),
+            lambda: super(Category, self).save(*args, **kwargs),
+        )
+
+
+class PostQuerySet(models.QuerySet):
+    def for_listing(self):
+        """
+        Posts prepared for rendering as cards: related objects are joined
+        and the (potentially large) content column is never loaded.
+        """
+        return self.select_related("category", "author").defer(
+            "content", "search_vector"
+        )
+
+    def with_viewer_state(self, user):
+        """
+        Annotate whether user has liked and bookmarked each post and follows
+        its author (is_liked, is_bookmarked, is_following_author).
+
+        Each flag is an EXISTS subquery, so a whole page is resolved in the
+        same single query no matter how many posts it contains.
+        """
+        if not user.is_authenticated:
+            false = Value(False, output_field=BooleanField())
+            return self.annotate(
+                is_liked=false, is_bookmarked=false, is_following_author=false
+            )
+
+        Like = apps.get_model("accounts", "Like")
+        Bookmark = apps.get_model("accounts", "Bookmark")
+        UserFollowing = apps.get_model("accounts", "UserFollowing")
+        return self.annotate(
+            is_liked=Exists(Like.objects.filter(user=user, post=OuterRef("pk"))),
+            is_bookmarked=Exists(
+                Bookmark.objects.filter(user=user, post=OuterRef("pk"))
+            ),
+            is_following_author=Exists(
+                UserFollowing.objects.filter(
+                    user=user, user_following=OuterRef("author")
+                )
+            ),
+        )
 
 
 class Post(models.Model):
     """Blog posts written by users or the admin."""
 
     STATUS = [(0, "Draft"), (1, "Publish")]
+    # Fields computed from content by update_derived_fields()
+    DERIVED_FIELDS = ("read_time", "excerpt", "excerpt_html")
+    # Counters updated in place, without touching last_update
+    COUNTERS = ("like_count", "comment_count", "bookmark_count")
+    EXCERPT_LENGTH = 130
 
     author = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE)
     category = models.ForeignKey(Category, on_delete=models.DO_NOTHING)
@@ -37,19 +113,97 @@ class Post(models.Model):
     content = RichTextField()
     status = models.SmallIntegerField(choices=STATUS, default=0)
     last_update = models.DateTimeField(auto_now=True)
+    # Set when the post is first published, orders the following feeds
+    published_at = models.DateTimeField(null=True, blank=True, editable=False)
+    # Derived from content on save so listings don't have to parse the HTML
+    read_time = models.PositiveSmallIntegerField(null=True, blank=True, editable=False)
+    excerpt = models.TextField(null=True, blank=True, editable=False)
+    excerpt_html = models.TextField(null=True, blank=True, editable=False)
+    # Denormalized counters kept current by the like, bookmark and comment
+    # write paths (see reconcile_counters to repair drift)
+    like_count = models.PositiveIntegerField(default=0, editable=False)
+    comment_count = models.PositiveIntegerField(default=0, editable=False)
+    bookmark_count = models.PositiveIntegerField(default=0, editable=False)
+    # Weighted title/content tsvector used by the PostgreSQL search backend
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    objects = PostQuerySet.as_manager()
 
     def __str__(self) -> str:
         return self.title
 
     class Meta:
-        ordering = ["-last_update"]
+        # id breaks ties so the ordering is unique for cursor pagination
+        ordering = ["-last_update", "-id"]
+        # One index per listing, each matching its filter and ordering so a
+        # page is read in index order without sorting
+        indexes = [
+            models.Index(
+                fields=["-last_update", "-id"],
+                condition=models.Q(status=1),
+                name="post_published_idx",
+            ),
+            models.Index(
+                fields=["category", "-last_update", "-id"],
+                condition=models.Q(status=1),
+                name="post_category_published_idx",
+            ),
+            # Published posts of profiles and drafts alike
+            models.Index(
+                fields=["author", "status", "-last_update", "-id"],
+                name="post_author_status_idx",
+            ),
+            # Following feeds read the latest posts of an author
+            models.Index(
+                fields=["author", "-published_at", "-id"],
+                condition=models.Q(status=1),
+                name="post_author_published_at_idx",
+            ),
+        ]
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored status to detect publishing on the next save
+        if "status" in field_names:
+            instance._loaded_status = instance.status
+        return instance
 
     def save(self, *args, **kwargs):
-        """Assign unique slug from post title."""
+        """Assign unique slug from post title and refresh derived fields."""
         # Only when saving the post for the first time
-        if not self.slug:
+        allocated = not self.slug
+        if allocated:
             self.slug = utils.generate_slug(self.__class__, self.title)
-        return super().save(*args, **kwargs)
+
+        update_fields = kwargs.get("update_fields")
+        if update_fields is None or "content" in update_fields:
+            self.update_derived_fields()
+            if update_fields is not None:
+                kwargs["update_fields"] = {*update_fields, *self.DERIVED_FIELDS}
+        if self.status == 1 and self.published_at is None:
+            self.published_at = timezone.now()
+            if kwargs.get("update_fields") is not None:
+                kwargs["update_fields"] = {*kwargs["update_fields"], "published_at"}
+        if allocated:
+            utils.save_unique(
+                self,
+                "slug",
+                lambda: utils.random_slug(self.title),
+                lambda: super(Post, self).save(*args, **kwargs),
+            )
+        else:
+            super().save(*args, **kwargs)
+        # post_save receivers compare the new status with the loaded one
+        self._loaded_status = self.status
+
+    def update_derived_fields(self):
+        """Recompute the fields that are derived from the post content."""
+        self.read_time = readtime.of_html(self.content).minutes
+        self.excerpt = Truncator(plain_text(self.content)).chars(self.EXCERPT_LENGTH)
+        self.excerpt_html = Truncator(self.content).chars(
+            self.EXCERPT_LENGTH, html=True
+        )
 
     def get_absolute_url(self):
         """Absolute URL to post detail page."""
@@ -69,3 +223,84 @@ class Comment(models.Model):
 
     class Meta:
         ordering = ["-commented_on"]
+        indexes = [
+            models.Index(fields=["post", "-commented_on"], name="comment_post_idx")
+        ]
+
+
+class Ranking(models.Model):
+    """
+    Materialized leaderboard entry (see blog.leaderboard).
+
+    Rows are replaced as a whole by refresh_leaderboards, so reading the
+    popular authors or categories never has to rank anything.
+    """
+
+    AUTHOR = "author"
+    CATEGORY = "category"
+    KINDS = [(AUTHOR, "Author"), (CATEGORY, "Category")]
+
+    kind = models.CharField(max_length=20, choices=KINDS)
+    position = models.PositiveSmallIntegerField()
+    object_id = models.PositiveBigIntegerField()
+    score = models.FloatField()
+    refreshed_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        ordering = ["kind", "position"]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["kind", "position"], name="unique_ranking_position"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.kind} #{self.position}"
+
+
+class TimelineEntry(models.Model):
+    """
+    A post in the following feed of a user, written when the post is
+    published (see blog.timeline). published_at is copied from the post so
+    that a page of the feed is a range scan of a single index.
+    """
+
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name="timeline"
+    )
+    post = models.ForeignKey(
+        Post, on_delete=models.CASCADE, related_name="timeline_entries"
+    )
+    published_at = models.DateTimeField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["user", "post"], name="unique_timeline_post"
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=["user", "-published_at", "-post"], name="timeline_feed_idx"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.post_id} in the timeline of {self.user_id}"
+
+
+@receiver(post_save, sender=Comment)
+def increment_comment_count(sender, instance, created, **kwargs):
+    """Count a new comment on its post."""
+    if created:
+        Post.objects.filter(pk=instance.post_id).update(
+            comment_count=F("comment_count") + 1
+        )
+
+
+@receiver(post_delete, sender=Comment)
+def decrement_comment_count(sender, instance, **kwargs):
+    """Stop counting a deleted comment on its post."""
+    Post.objects.filter(pk=instance.post_id, comment_count__gt=0).update(
+        comment_count=F("comment_count") - 1
+    )
@@ -0,0 +1,106 @@
+"""
+Pluggable full-text and fuzzy (trigram) search.
+
+The engine is chosen by the SEARCH_BACKEND setting (a dotted path to a
+SearchBackend subclass) and otherwise by the database vendor.
+
+Saved posts are indexed by a task (see common.tasks), off the request.
+The trade-off is that a post cannot be found until a worker has run the
+task, so search requires run_workers just as the following feeds do; a
+queue backlog delays new and edited posts in results, nothing else.
+Ranked results are cached per normalized query for CACHE_TTL seconds;
+the cache is invalidated as a whole whenever the index changes.
+"""
+
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connection
+from django.utils.module_loading import import_string
+
+from blog.models import Post
+from common.tasks import task
+
+from .base import SearchBackend
+
+DEFAULT_BACKENDS = {
+    "postgresql": "blog.search.postgres.PostgresSearchBackend",
+    "sqlite": "blog.search.sqlite.SqliteSearchBackend",
+}
+
+CACHE_TTL = 60
+GENERATION_KEY = "search:generation"
+
+_backend = None
+
+
+def get_backend():
+    """Return the configured search backend instance."""
+    global _backend
+    if _backend is None:
+        path = getattr(settings, "SEARCH_BACKEND", None)
+        path = path or DEFAULT_BACKENDS.get(connection.vendor)
+        if path is None:
+            raise ImproperlyConfigured(
+                f"No search backend for {connection.vendor}, set SEARCH_BACKEND."
+            )
+        _backend = import_string(path)()
+    return _backend
+
+
+def normalize(query):
+    """Return query lowercased with collapsed whitespace."""
+    return " ".join(query.lower().split())
+
+
+def cached(namespace, query, compute):
+    """Return compute(query) for the normalized query, cached for a while."""
+    query = normalize(query)
+    if not query:
+        return []
+    generation = cache.get_or_set(GENERATION_KEY, 1, timeout=None)
+    digest = hashlib.md5(query.encode()).hexdigest()
+    key = f"search:{generation}:{namespace}:{digest}"
+    result = cache.get(key)
+    if result is None:
+        result = compute(query)
+        cache.set(key, result, CACHE_TTL)
+    return result
+
+
+def cached_search_ids(query):
+    """Return the ranked ids of posts matching query."""
+    return cached("ids", query, get_backend().search_ids)
+
+
+def cached_fuzzy_search(query):
+    """Return the ranked fuzzy matches of query (see SearchBackend.fuzzy_search)."""
+    return cached("fuzzy", query, get_backend().fuzzy_search)
+
+
+def invalidate_cache():
+    """Make every cached search result stale."""
+    cache.add(GENERATION_KEY, 1, timeout=None)
+    cache.incr(GENERATION_KEY)
+
+
+__all__ = [
+    "SearchBackend",
+    "cached_fuzzy_search",
+    "cached_search_ids",
+    "get_backend",
+    "invalidate_cache",
+]
+
+
+@task(unique=True)
+def index_post(post_id):
+    """Refresh the entry of a post in the index, dropping a deleted one."""
+    post = Post.objects.filter(pk=post_id).first()
+    if post is None:
+        get_backend().remove(Post(pk=post_id))
+    else:
+        get_backend().index(post)
+    invalidate_cache()
@@ -0,0 +1,103 @@
+import html
+
+from blog.models import Post
+
+# Sentinels marking highlighted words until the snippet is escaped
+START, STOP = "\x02", "\x03"
+
+# Columns loaded for a result: everything but the post body
+RESULT_FIELDS = (
+    "title",
+    "slug",
+    "last_update",
+    "read_time",
+    "excerpt",
+    "author__first_name",
+    "author__last_name",
+    "author__uid",
+    "category__name",
+    "category__slug",
+)
+
+
+def highlight(text):
+    """Escape a plain text snippet and turn the sentinels into <mark> tags."""
+    escaped = html.escape(html.unescape(text))
+    return escaped.replace(START, "<mark>").replace(STOP, "</mark>")
+
+
+class SearchBackend:
+    """Interface of the full-text search engines."""
+
+    # Upper bound of matches returned for a single query
+    max_results = 1000
+
+    def search_ids(self, query):
+        """Return the ids of published posts matching query, best first."""
+        raise NotImplementedError
+
+    def snippets(self, ids, query):
+        """
+        Return {post id: HTML snippet} with the words matching query
+        highlighted, computed by the engine instead of loading the content.
+        """
+        raise NotImplementedError
+
+    def fuzzy_search(self, query):
+        """
+        Return posts, categories and authors whose title or name is
+        trigram-similar to query, most similar first, as dicts with kind,
+        label, url and score keys.
+        """
+        raise NotImplementedError
+
+    def results(self, ids, query):
+        """Return the posts of ids (in that order) with a snippet attribute."""
+        posts = (
+            Post.objects.select_related("author", "category")
+            .only(*RESULT_FIELDS)
+            .in_bulk(ids)
+        )
+        snippets = self.snippets([pk for pk in ids if pk in posts], query)
+        results = []
+        for pk in ids:
+            if pk in posts:
+                post = posts[pk]
+                post.snippet = snippets.get(pk) or html.escape(post.excerpt or "")
+                results.append(post)
+        return results
+
+    def search(self, query):
+        """Return the published posts matching query, best first."""
+        return self.results(self.search_ids(query), query)
+
+    def index(self, post):
+        """Add or refresh post in the index (removing it if unpublished)."""
+        raise NotImplementedError
+
+    def remove(self, post):
+        """Remove post from the index."""
+        raise NotImplementedError
+
+    def clear(self):
+        """Remove every post from the index."""
+        raise NotImplementedError
+
+    def index_many(self, posts):
+        """Add or refresh a batch of posts."""
+        for post in posts:
+            self.index(post)
+
+    def rebuild(self, chunk_size=500):
+        """Rebuild the whole index in batches; return the number of posts."""
+        self.clear()
+        posts = Post.objects.filter(status=1).order_by("pk")
+        last_pk, indexed = 0, 0
+        while True:
+            batch = list(posts.filter(pk__gt=last_pk)[:chunk_size])
+            if not batch:
+                break
+            self.index_many(batch)
+            last_pk = batch[-1].pk
+            indexed += len(batch)
+        return indexed
@@ -0,0 +1,135 @@
+from django.apps import apps
+from django.contrib.postgres.search import (
+    SearchHeadline,
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+    TrigramWordSimilarity,
+)
+from django.db import connection
+from django.db.models import F, Func, Q, Value
+from django.db.models.functions import Greatest
+from django.urls import reverse
+
+from blog.models import Category, Post
+
+from . import trigram
+from .base import START, STOP, SearchBackend, highlight
+
+# Title matches weigh more than content matches
+DOCUMENT = SearchVector("title", weight="A") + SearchVector("content", weight="B")
+
+
+class PostgresSearchBackend(SearchBackend):
+    """
+    Search the stored Post.search_vector column (GIN indexed), which holds
+    the weighted title and content tsvector computed when a post is saved.
+    """
+
+    def search_ids(self, query):
+        search_query = SearchQuery(query, search_type="websearch")
+        matches = (
+            Post.objects.filter(status=1, search_vector=search_query)
+            .annotate(rank=SearchRank(F("search_vector"), search_query))
+            .order_by("-rank", "-last_update")
+            .values_list("pk", flat=True)
+        )
+        return list(matches[: self.max_results])
+
+    def snippets(self, ids, query):
+        if not ids:
+            return {}
+        search_query = SearchQuery(query, search_type="websearch")
+        # Strip the markup so the headline is built from the visible text
+        text = Func(
+            F("content"),
+            Value("<[^>]+>"),
+            Value(" "),
+            Value("g"),
+            function="regexp_replace",
+        )
+        headlines = Post.objects.filter(pk__in=ids).annotate(
+            headline=SearchHeadline(
+                text,
+                search_query,
+                start_sel=START,
+                stop_sel=STOP,
+                max_words=35,
+                min_words=15,
+            )
+        )
+        rows = headlines.values_list("pk", "headline")
+        return {pk: highlight(headline) for pk, headline in rows}
+
+    def fuzzy_search(self, query):
+        # The trigram_word_similar (<%) filters use the pg_trgm GIN indexes
+        Account = apps.get_model("accounts", "Account")
+        with connection.cursor() as cursor:
+            cursor.execute(
+                "SET pg_trgm.word_similarity_threshold = %s", [trigram.THRESHOLD]
+            )
+        limit = self.max_results
+        posts = (
+            Post.objects.filter(status=1, title__trigram_word_similar=query)
+            .annotate(score=TrigramWordSimilarity(query, "title"))
+            .order_by("-score")
+            .values_list("score", "title", "slug")[:limit]
+        )
+        categories = (
+            Category.objects.filter(name__trigram_word_similar=query)
+            .annotate(score=TrigramWordSimilarity(query, "name"))
+            .order_by("-score")
+            .values_list("score", "name", "slug")[:limit]
+        )
+        authors = (
+            Account.objects.filter(
+                Q(first_name__trigram_word_similar=query)
+                | Q(last_name__trigram_word_similar=query),
+                is_active=True,
+            )
+            .annotate(
+                score=Greatest(
+                    TrigramWordSimilarity(query, "first_name"),
+                    TrigramWordSimilarity(query, "last_name"),
+                )
+            )
+            .order_by("-score")
+            .values_list("score", "first_name", "last_name", "uid")[:limit]
+        )
+        matches = [
+            (score, title, "post", reverse("blog:post-detail", args=[slug]))
+            for score, title, slug in posts
+        ]
+        matches += [
+            (score, name, "category", reverse("blog:category", args=[slug]))
+            for score, name, slug in categories
+        ]
+        matches += [
+            (
+                score,
+                f"{first} {last}",
+                "author",
+                reverse("accounts:profile", args=[uid]),
+            )
+            for score, first, last, uid in authors
+        ]
+        matches.sort(key=lambda match: (-match[0], match[1]))
+        return [
+            {"kind": kind, "label": label, "url": url, "score": score}
+            for score, label, kind, url in matches[:limit]
+        ]
+
+    def index(self, post):
+        vector = DOCUMENT if post.status == 1 else None
+        Post.objects.filter(pk=post.pk).update(search_vector=vector)
+
+    def index_many(self, posts):
+        Post.objects.filter(pk__in=[post.pk for post in posts]).update(
+            search_vector=DOCUMENT
+        )
+
+    def remove(self, post):
+        Post.objects.filter(pk=post.pk).update(search_vector=None)
+
+    def clear(self):
+        Post.objects.exclude(search_vector=None).update(search_vector=None)
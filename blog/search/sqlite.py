@@ -0,0 +1,84 @@
+import re
+
+from django.db import connection
+
+from blog.models import Post, plain_text
+
+from . import trigram
+from .base import START, STOP, SearchBackend, highlight
+
+# FTS5 shadow table created by migration blog.0008_search_index
+TABLE = "blog_post_fts"
+# bm25() column weights: title matches weigh more than content matches
+WEIGHTS = (10.0, 1.0)
+
+
+def match_expression(query):
+    """Turn user input into an FTS5 query matching all of its words."""
+    words = re.findall(r"\w+", query)
+    return " ".join(f'"{word}"' for word in words)
+
+
+class SqliteSearchBackend(SearchBackend):
+    """
+    Search an FTS5 table holding the title and plain text of published
+    posts, kept in sync by the post_save/post_delete signals.
+    """
+
+    def search_ids(self, query):
+        expression = match_expression(query)
+        if not expression:
+            return []
+        # Only published posts are indexed; bm25() is lower for better matches
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid FROM {TABLE} WHERE {TABLE} MATCH %s "
+                f"ORDER BY bm25({TABLE}, %s, %s) LIMIT %s",
+                [expression, *WEIGHTS, self.max_results],
+            )
+            return [row[0] for row in cursor.fetchall()]
+
+    def snippets(self, ids, query):
+        expression = match_expression(query)
+        if not ids or not expression:
+            return {}
+        placeholders = ", ".join(["%s"] * len(ids))
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT rowid, snippet({TABLE}, 1, %s, %s, '…', 24) FROM {TABLE} "
+                f"WHERE {TABLE} MATCH %s AND rowid IN ({placeholders})",
+                [START, STOP, expression, *ids],
+            )
+            return {pk: highlight(text) for pk, text in cursor.fetchall()}
+
+    def fuzzy_search(self, query):
+        return trigram.get_index().lookup(query, self.max_results)
+
+    def index(self, post):
+        self.index_many([post])
+
+    def index_many(self, posts):
+        self._delete([post.pk for post in posts])
+        rows = [
+            (post.pk, post.title, plain_text(post.content))
+            for post in posts
+            if post.status == 1
+        ]
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"INSERT INTO {TABLE} (rowid, title, content) VALUES (%s, %s, %s)",
+                rows,
+            )
+
+    def remove(self, post):
+        self._delete([post.pk])
+
+    def clear(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"DELETE FROM {TABLE}")
+
+    def _delete(self, ids):
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f"DELETE FROM {TABLE} WHERE rowid = %s", [(pk,) for pk in ids]
+            )
@@ -0,0 +1,142 @@
+"""
+In-process trigram index for typo-tolerant search where pg_trgm is not
+available.
+
+Labels (post titles, category and author names) are split into trigrams
+the way pg_trgm does it, and an inverted index maps every trigram to the
+labels containing it. A lookup only visits the postings of the query's
+rarest trigrams, so its cost follows the number of similar labels rather
+than the size of the corpus. The index is built at boot and kept in sync
+with the changes of every process like the autocomplete one (see
+blog.autocomplete.ProcessIndex).
+"""
+
+import math
+import re
+import threading
+from collections import OrderedDict, defaultdict
+
+from blog import autocomplete
+
+# Below pg_trgm's default word_similarity threshold (0.6) so that a swap
+# of two letters ("djnago") still matches
+THRESHOLD = 0.4
+MAX_ENTRIES = autocomplete.MAX_ENTRIES
+
+WORD_RE = re.compile(r"[^\W_]+")
+
+
+def trigrams(text):
+    """Return the set of trigrams of text, as computed by pg_trgm."""
+    grams = set()
+    for word in WORD_RE.findall(text.lower()):
+        padded = f"  {word} "
+        grams.update(padded[i : i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def similarity(a, b):
+    """Return the pg_trgm similarity of two trigram sets."""
+    shared = len(a & b)
+    return shared / (len(a) + len(b) - shared) if shared else 0.0
+
+
+def word_similarity(query, label):
+    """
+    Return the share of the query trigrams found in the label, which like
+    pg_trgm's word_similarity() does not penalize the rest of a long label.
+    """
+    return len(query & label) / len(query) if query else 0.0
+
+
+class TrigramIndex:
+    """A bounded, thread-safe inverted index of labelled links by trigram."""
+
+    def __init__(self, max_entries=MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.postings = defaultdict(set)
+        # (kind, id) -> (label, url, trigrams), oldest first
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def __len__(self):
+        return len(self.entries)
+
+    def _discard(self, ref):
+        label, url, grams = self.entries.pop(ref)
+        for gram in grams:
+            posting = self.postings[gram]
+            posting.discard(ref)
+            if not posting:
+                del self.postings[gram]
+
+    def add(self, kind, object_id, label, url):
+        """Add or replace the entry for (kind, object_id)."""
+        ref = (kind, object_id)
+        grams = trigrams(label)
+        with self.lock:
+            if ref in self.entries:
+                self._discard(ref)
+            while len(self.entries) >= self.max_entries:
+                self._discard(next(iter(self.entries)))
+            self.entries[ref] = (label, url, grams)
+            for gram in grams:
+                self.postings[gram].add(ref)
+
+    def remove(self, kind, object_id):
+        """Drop the entry for (kind, object_id) if it is indexed."""
+        with self.lock:
+            if (kind, object_id) in self.entries:
+                self._discard((kind, object_id))
+
+    def lookup(self, query, limit, threshold=THRESHOLD):
+        """Return up to limit entries similar to query, most similar first."""
+        grams = trigrams(query)
+        if not grams:
+            return []
+        # A label reaching the threshold holds at least `needed` of the query
+        # trigrams, hence one of its rarest len(grams) - needed + 1 trigrams:
+        # only their postings are scanned.
+        needed = math.ceil(threshold * len(grams))
+        with self.lock:
+            rarest = sorted(grams, key=lambda gram: len(self.postings.get(gram, ())))
+            candidates = set()
+            for gram in rarest[: len(grams) - needed + 1]:
+                candidates.update(self.postings.get(gram, ()))
+            matches = []
+            for ref in candidates:
+                label, url, entry_grams = self.entries[ref]
+                score = word_similarity(grams, entry_grams)
+                if score >= threshold:
+                    # Closer (usually shorter) labels first among equals
+                    closeness = similarity(grams, entry_grams)
+                    matches.append((score, closeness, label, ref[0], url))
+        matches.sort(key=lambda match: (-match[0], -match[1], match[2]))
+        return [
+            {"kind": kind, "label": label, "url": url, "score": score}
+            for score, closeness, label, kind, url in matches[:limit]
+        ]
+
+
+def in_use():
+    """Return whether the search backend answers fuzzy searches from here."""
+    from . import get_backend
+    from .sqlite import SqliteSearchBackend
+
+    return isinstance(get_backend(), SqliteSearchBackend)
+
+
+trigram_index = autocomplete.ProcessIndex(TrigramIndex, eager=in_use)
+
+
+def get_index():
+    """Return this process' index, up to date with the shared generation."""
+    return trigram_index.get()
+
+
+def update(kind, instance):
+    trigram_index.update(kind, instance)
+
+
+def remove(kind, object_id):
+    trigram_index.remove(kind, object_id)
@@ -0,0 +1,100 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import autocomplete, caching, search, timeline
+from .models import Category, Comment, Post
+from .search import get_backend, invalidate_cache, trigram
+
+# Changes to any of these fields make the search index stale
+SEARCHABLE_FIELDS = {"title", "content", "status"}
+# Changes to any of these fields make an author suggestion stale
+AUTHOR_FIELDS = {"first_name", "last_name", "uid", "is_active"}
+
+
+def update_label(kind, instance):
+    """Refresh the in-process label indexes and cached searches."""
+    autocomplete.update(kind, instance)
+    trigram.update(kind, instance)
+    # The indexes of the other processes are stale now
+    autocomplete.changed(autocomplete.label_change(kind, instance))
+    invalidate_cache()
+
+
+def remove_label(kind, instance):
+    autocomplete.remove(kind, instance.pk)
+    trigram.remove(kind, instance.pk)
+    autocomplete.changed(autocomplete.removal(kind, instance.pk))
+    invalidate_cache()
+
+
+def expire_related_posts():
+    """Cached posts embed their author and category."""
+    caching.post_details.invalidate()
+    caching.featured_posts.invalidate()
+
+
+@receiver(post_save, sender=Post)
+def index_post(sender, instance, update_fields=None, **kwargs):
+    """Keep the search index in sync with the saved post."""
+    if update_fields is None or SEARCHABLE_FIELDS & set(update_fields):
+        search.index_post.enqueue(instance.pk)
+        update_label("post", instance)
+        caching.bump(f"post:{instance.pk}", "listing")
+        caching.post_details.delete(instance.slug)
+        caching.featured_posts.invalidate()
+
+
+@receiver(post_save, sender=Post)
+def fan_out_post(sender, instance, **kwargs):
+    """Add a post to the following feeds when (un)published."""
+    was_published = getattr(instance, "_loaded_status", None) == 1
+    if instance.status == 1 and not was_published:
+        timeline.publish(instance)
+    elif was_published and instance.status != 1:
+        timeline.withdraw(instance)
+
+
+@receiver(post_delete, sender=Post)
+def unindex_post(sender, instance, **kwargs):
+    """Drop a deleted post from the search index."""
+    get_backend().remove(instance)
+    remove_label("post", instance)
+    caching.bump(f"post:{instance.pk}", "listing")
+    caching.post_details.delete(instance.slug)
+    caching.featured_posts.invalidate()
+
+
+@receiver(post_save, sender=Category)
+def index_category(sender, instance, **kwargs):
+    update_label("category", instance)
+    caching.bump(f"category:{instance.pk}", "categories")
+    expire_related_posts()
+
+
+@receiver(post_delete, sender=Category)
+def unindex_category(sender, instance, **kwargs):
+    remove_label("category", instance)
+    caching.bump(f"category:{instance.pk}", "categories")
+    expire_related_posts()
+
+
+@receiver(post_save, sender="accounts.Account")
+def index_author(sender, instance, update_fields=None, **kwargs):
+    if update_fields is None or AUTHOR_FIELDS & set(update_fields):
+        update_label("author", instance)
+        caching.bump(f"author:{instance.pk}", "authors")
+        expire_related_posts()
+
+
+@receiver(post_delete, sender="accounts.Account")
+def unindex_author(sender, instance, **kwargs):
+    remove_label("author", instance)
+    caching.bump(f"author:{instance.pk}", "authors")
+    expire_related_posts()
+
+
+@receiver(post_save, sender=Comment)
+@receiver(post_delete, sender=Comment)
+def expire_commented_post(sender, instance, **kwargs):
+    """The post page shows the comment count."""
+    caching.bump(f"post:{instance.post_id}")
@@ -0,0 +1,20 @@
+"""Periodic maintenance of the blog, run by the task workers."""
+
+from datetime import timedelta
+from io import StringIO
+
+from django.core.management import call_command
+
+from common.tasks import task
+
+from . import leaderboard
+
+
+@task(every=timedelta(hours=1))
+def refresh_leaderboards():
+    leaderboard.refresh()
+
+
+@task(every=timedelta(days=1))
+def reconcile_counters():
+    call_command("reconcile_counters", stdout=StringIO())
@@ -2,9 +2,19 @@ import readtime
 from django import template
 
 
-def estimated_read_time(content):
-    """Calculate the estimated time in minutes to read the post."""
-    return readtime.of_html(content)
+def estimated_read_time(post):
+    """
+    Return the estimated time to read the post, e.g. "3 min read".
+
+    Uses the read time stored on the post and only parses the content
+    when it hasn't been computed yet (or when given raw HTML).
+    """
+    if isinstance(post, str):
+        return str(readtime.of_html(post))
+    minutes = post.read_time
+    if minutes is None:
+        minutes = readtime.of_html(post.content).minutes
+    return f"{minutes} min read"
 
 
 register = template.Library()
@@ -1,3 +1,1158 @@
-from django.test import TestCase
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+import readtime
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.db.models.signals import post_delete
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from accounts.models import Account, Bookmark, Like, Profile, UserFollowing
+from common import cache as common_cache
+from common import tasks, utils
+from common.cache import LocalCache, TwoTierCache
+from common.middleware import QueryCountMiddleware
+from common.models import Task
+from common.pagination import CursorPaginator
+from common.testing import QueryBudgetMixin, clear_caches, url_names
+
+from . import autocomplete, leaderboard, search, timeline, views
+from . import tasks as blog_tasks
+from .models import Category, Comment, Post, Ranking, TimelineEntry
+from .search import trigram
+from .templatetags import post_cards
+from .templatetags.post_read_time import estimated_read_time
+
+
+def create_user(email="author@example.com"):
+    return Account.objects.create_user(email, "First", "Last", "password")
+
+
+def create_posts(author, count, **kwargs):
+    if "category" not in kwargs:
+        kwargs["category"], _ = Category.objects.get_or_create(
+            name="Django", slug="django"
+        )
+    kwargs.setdefault("status", 1)
+    kwargs.setdefault("content", "<p>x</p>")
+    title = kwargs.pop("title", "Post")
+    return [
+        Post.objects.create(author=author, title=f"{title} {i}", **kwargs)
+        for i in range(count)
+    ]
+
+
+class SlugAllocationTests(TestCase):
+    def setUp(self):
+        self.author = create_user()
+        self.post = create_posts(self.author, 1)[0]
+
+    def test_generate_slug_runs_one_query(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(utils.generate_slug(Post, "Fresh title"), "fresh-title")
+        with self.assertNumQueries(1):
+            slug = utils.generate_slug(Post, "Post 0")
+        self.assertRegex(slug, r"^post-0-[a-z0-9]{6}$")
+
+    def test_allocate_slugs_for_a_batch(self):
+        with self.assertNumQueries(1):
+            slugs = utils.allocate_slugs(Post, ["Post 0", "New", "New"])
+        self.assertNotEqual(slugs[0], "post-0")
+        self.assertEqual(slugs[1], "new")
+        self.assertEqual(len(set(slugs)), 3)
+
+    def test_concurrently_taken_slug_is_reallocated(self):
+        # Another post took the slug between the allocation and the insert
+        with mock.patch("common.utils.generate_slug", return_value=self.post.slug):
+            post = create_posts(self.author, 1)[0]
+        self.assertNotEqual(post.slug, self.post.slug)
+        self.assertTrue(post.slug.startswith(f"{self.post.slug}-"))
+
+
+class QueryCountMiddlewareTests(TestCase):
+    @override_settings(QUERY_SAMPLE_RATE=1)
+    def test_logs_repeated_statements(self):
+        create_posts(create_user(), 3)
+
+        def view(request):
+            authors = [post.author.email for post in Post.objects.all()]
+            Post.objects.filter(pk__in=[1, 2]).exists()
+            Post.objects.filter(pk__in=[1, 2, 3]).exists()
+            return HttpResponse(authors)
+
+        with self.assertLogs("common.middleware", "WARNING") as logs:
+            QueryCountMiddleware(view)(RequestFactory().get("/p/"))
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn("N+1 queries on /p/: 3 of 6 statements", logs.output[0])
+        self.assertIn('FROM "accounts_account"', logs.output[0])
+
+
+class QueryBudgetTests(QueryBudgetMixin, TestCase):
+    urls_module = "blog.urls"
+    query_budgets = {
+        "blog:home": 3,
+        "blog:post-list": 5,
+        "blog:following": 4,
+        "blog:search": 5,
+        "blog:search-suggest": 3,
+        "blog:post-create": 3,
+        "blog:post-detail": 4,
+        "blog:post-update": 6,
+        "blog:post-delete": 5,
+        "blog:comment-list": 5,
+        "blog:comment-update": 6,
+        "blog:comment-delete": 6,
+        "blog:category": 4,
+    }
+
+    def setUp(self):
+        self.author = create_user()
+        posts = create_posts(self.author, 12)
+        self.post = posts[0]
+        readers = [create_user(f"reader{i}@example.com") for i in range(4)]
+        for reader in readers:
+            UserFollowing.objects.follow(reader, self.author)
+            Like.objects.add(reader, self.post)
+            Bookmark.objects.add(reader, self.post)
+            self.comment = Comment.objects.create(
+                post=self.post, author=reader, content="x"
+            )
+        self.reader = readers[-1]
+        # Index the posts, so searches are measured with their hits
+        tasks.work(once=True)
+        super().setUp()
+
+    def get(self, name, *args, user=None, **data):
+        if user:
+            self.client.force_login(user)
+        else:
+            self.client.logout()
+        url = reverse(name, args=args)
+        response = self.assertQueryBudget(name, lambda: self.client.get(url, data))
+        self.assertEqual(response.status_code, 200, name)
+        return response
+
+    def test_pages_stay_within_budget(self):
+        slug, reader = self.post.slug, self.reader
+        self.get("blog:home")
+        self.get("blog:post-list", user=reader)
+        self.get("blog:following", user=reader)
+        response = self.get("blog:search", user=reader, q="post")
+        self.assertEqual(len(response.context["page_obj"]), 10)
+        self.get("blog:search-suggest", user=reader, q="po")
+        self.get("blog:post-create", user=reader)
+        self.get("blog:post-detail", slug, user=reader)
+        self.get("blog:post-update", slug, user=self.author)
+        self.get("blog:post-delete", slug, user=self.author)
+        self.get("blog:comment-list", slug, user=reader)
+        self.get("blog:comment-update", slug, self.comment.pk, user=reader)
+        self.get("blog:comment-delete", slug, self.comment.pk, user=reader)
+        self.get("blog:category", "django", user=reader)
+
+
+class BenchmarkCommandTests(TestCase):
+    def test_replays_every_url_over_seeded_data(self):
+        options = dict(users=6, categories=2, posts=12, comments=20, likes=20)
+        call_command(
+            "seed_benchmark_data", bookmarks=5, follows=10, stdout=StringIO(), **options
+        )
+        output = StringIO()
+        call_command("run_benchmarks", requests=2, warmup=0, stdout=output)
+        report = json.loads(output.getvalue())
+
+        self.assertEqual(report["data"]["Post"], 12)
+        names = url_names("blog.urls") | url_names("accounts.urls")
+        self.assertEqual(set(report["routes"]), names)
+        for name, result in report["routes"].items():
+            self.assertLessEqual(result["p50_ms"], result["p99_ms"])
+            self.assertTrue(all(int(status) < 400 for status in result["status"]), name)
+        # The replay is rolled back
+        self.assertEqual(Like.objects.count(), report["data"]["Like"])
+
+    def test_micro_benchmarks_compared_with_a_baseline(self):
+        output = StringIO()
+        options = dict(only="generate_", repeat=2, min_time=0.001, stderr=StringIO())
+        call_command("bench_micro", stdout=output, **options)
+        report = json.loads(output.getvalue())
+        self.assertEqual(
+            set(report["benchmarks"]),
+            {"generate_slug:free", "generate_slug:taken", "generate_uid"},
+        )
+
+        with tempfile.TemporaryDirectory() as directory:
+            baseline, current = f"{directory}/baseline.json", f"{directory}/now.json"
+            with open(baseline, "w") as file:
+                json.dump(report, file)
+            report["benchmarks"]["generate_uid"]["min_us"] *= 1.5
+            with open(current, "w") as file:
+                json.dump(report, file)
+
+            output = StringIO()
+            call_command("compare_benchmarks", baseline, baseline, stdout=output)
+            self.assertIn("No regressions", output.getvalue())
+            with self.assertRaisesMessage(CommandError, "generate_uid min_us"):
+                call_command("compare_benchmarks", baseline, current, stdout=StringIO())
+            call_command(
+                "compare_benchmarks", baseline, current, threshold=60, stdout=output
+            )
+
+
+class ContentTransferTests(TestCase):
+    def setUp(self):
+        self.author = create_user()
+        self.reader = create_user("reader@example.com")
+        self.post = create_posts(self.author, 1)[0]
+        self.comment = Comment.objects.create(
+            post=self.post, author=self.reader, content="Nice"
+        )
+        Like.objects.add(self.reader, self.post)
+        UserFollowing.objects.follow(self.reader, self.author)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = f"{directory.name}/content.jsonl"
+        call_command("export_content", output=self.path, stderr=StringIO())
+
+    def load(self, **options):
+        output = StringIO()
+        options.setdefault("skip_rebuild", True)
+        call_command("import_content", self.path, stdout=output, **options)
+        return output.getvalue()
+
+    def test_import_skips_existing_records(self):
+        output = self.load(batch_size=2)
+        self.assertIn("post: 0 imported, 1 skipped", output)
+        self.assertIn("comment: 0 imported, 1 skipped", output)
+        self.assertEqual(Comment.objects.count(), 1)
+
+    def test_import_restores_deleted_records(self):
+        commented_on = self.comment.commented_on
+        uid = self.author.uid
+        Account.objects.filter(pk=self.author.pk).delete()
+
+        output = self.load(batch_size=2)
+
+        self.assertIn("user: 1 imported, 1 skipped", output)
+        author = Account.objects.get(email="author@example.com")
+        self.assertEqual(author.uid, uid)
+        self.assertTrue(author.check_password("password"))
+        post = Post.objects.get(slug=self.post.slug)
+        self.assertEqual(post.last_update, self.post.last_update)
+        self.assertEqual(post.read_time, self.post.read_time)
+        comment = Comment.objects.get()
+        self.assertEqual(comment.commented_on, commented_on)
+        self.assertTrue(UserFollowing.objects.filter(user_following=author).exists())
+
+    def test_import_restores_dates_without_returned_pks(self):
+        Bookmark.objects.add(self.reader, self.post)
+        saved_at = Bookmark.objects.get().saved_at
+        call_command("export_content", output=self.path, stderr=StringIO())
+        Account.objects.filter(pk=self.reader.pk).delete()
+        features = type(connection.features)
+        with mock.patch.object(features, "can_return_rows_from_bulk_insert", False):
+            self.load()
+        self.assertEqual(Comment.objects.get().commented_on, self.comment.commented_on)
+        self.assertEqual(Bookmark.objects.get().saved_at, saved_at)
+
+    def test_interrupted_import_resumes(self):
+        Like.objects.all().delete()
+        with open(self.path, "rb") as file:
+            lines = file.readlines()
+        # The import stopped before the like, the last but one record
+        with open(f"{self.path}.progress", "w") as file:
+            file.write(str(sum(map(len, lines[:-2]))))
+
+        output = self.load()
+
+        self.assertIn("Resuming", output)
+        self.assertIn("like: 1 imported, 0 skipped", output)
+        self.assertIn("post: 0 imported, 0 skipped", output)
+        self.assertTrue(Like.objects.filter(user=self.reader).exists())
+        self.assertFalse(os.path.exists(f"{self.path}.progress"))
+
+
+class CursorPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        author = create_user()
+        cls.posts = create_posts(author, 25)
+        # Give half of the posts the same timestamp to exercise the tie-break
+        Post.objects.filter(pk__lte=12).update(last_update=timezone.now())
+        Post.objects.filter(pk__gt=12).update(
+            last_update=timezone.now() - timedelta(days=1)
+        )
+
+    def test_pages_cover_every_post_once(self):
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        seen, cursor = [], None
+        while True:
+            page = paginator.page(cursor)
+            seen.extend(post.pk for post in page)
+            if not page.has_next():
+                break
+            cursor = page.next_cursor
+        expected = list(Post.objects.values_list("pk", flat=True))
+        self.assertEqual(seen, expected)
+
+    def test_previous_cursor_returns_previous_page(self):
+        paginator = CursorPaginator(Post.objects.all(), 10)
+        first = paginator.page()
+        second = paginator.page(first.next_cursor)
+        self.assertFalse(first.has_previous())
+        back = paginator.page(second.previous_cursor)
+        self.assertEqual(list(back), list(first))
+
+    def test_listing_runs_no_count_query(self):
+        url = reverse("blog:post-list")
+        page = self.client.get(url).context["page_obj"]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url, {"cursor": page.next_cursor})
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(any("COUNT(" in q["sql"] for q in queries))
+
+    def test_invalid_cursor_is_not_found(self):
+        response = self.client.get(reverse("blog:post-list"), {"cursor": "bogus"})
+        self.assertEqual(response.status_code, 404)
+
+
+def plan_problems(sql):
+    """Return the steps of the query plan of sql that scan or sort a table."""
+    with connection.cursor() as cursor:
+        if connection.vendor == "postgresql":
+            # Tiny test tables make sequential scans and sorts the cheapest
+            cursor.execute("SET LOCAL enable_seqscan = off")
+            cursor.execute("SET LOCAL enable_sort = off")
+        cursor.execute(f"{connection.ops.explain_query_prefix()} {sql}")
+        steps = [row[-1] if connection.vendor == "sqlite" else row[0] for row in cursor]
+    if connection.vendor == "sqlite":
+        bad = re.compile(r"^SCAN \S+$|TEMP B-TREE")
+    else:
+        bad = re.compile(r"Seq Scan|\bSort\b")
+    return [step for step in steps if bad.search(step)]
+
+
+class QueryPlanTests(TestCase):
+    """Every query of the listing pages must be answered from an index."""
+
+    def setUp(self):
+        self.author = create_user()
+        self.reader = create_user("reader@example.com")
+        posts = create_posts(self.author, 12)
+        create_posts(self.author, 2, status=0)
+        UserFollowing.objects.follow(self.reader, self.author)
+        Like.objects.add(self.reader, posts[0])
+        Bookmark.objects.add(self.reader, posts[0])
+        Comment.objects.create(post=posts[0], author=self.reader, content="x")
+        leaderboard.refresh()
+        self.post = posts[0]
+
+    def assertIndexedPlans(self, url, user=None):
+        if user:
+            self.client.force_login(user)
+        else:
+            self.client.logout()
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(url)
+            next_cursor = getattr(response.context.get("page_obj"), "next_cursor", None)
+            if next_cursor:
+                self.client.get(url, {"cursor": next_cursor})
+        self.assertEqual(response.status_code, 200)
+        for query in queries:
+            if query["sql"].startswith("SELECT"):
+                with self.subTest(url=url, sql=query["sql"]):
+                    self.assertEqual(plan_problems(query["sql"]), [])
+
+    def test_blog_listings(self):
+        slug = self.post.slug
+        for user in (None, self.reader):
+            self.assertIndexedPlans(reverse("blog:post-list"), user)
+            self.assertIndexedPlans(reverse("blog:category", args=["django"]), user)
+            self.assertIndexedPlans(reverse("blog:post-detail", args=[slug]), user)
+            self.assertIndexedPlans(reverse("blog:comment-list", args=[slug]), user)
+        self.assertIndexedPlans(reverse("blog:home"))
+        self.assertIndexedPlans(reverse("blog:following"), self.reader)
+
+    def test_account_listings(self):
+        uid = self.author.uid
+        self.assertIndexedPlans(reverse("accounts:profile", args=[uid]), self.reader)
+        self.assertIndexedPlans(reverse("accounts:draft", args=[uid]), self.author)
+        saved = reverse("accounts:saved", args=[self.reader.uid])
+        self.assertIndexedPlans(saved, self.reader)
+
+
+class TimelineTests(TestCase):
+    def setUp(self):
+        self.author = create_user()
+        self.reader = create_user("reader@example.com")
+        UserFollowing.objects.follow(self.reader, self.author)
+        self.client.force_login(self.reader)
+        self.url = reverse("blog:following")
+
+    def publish(self, author, count):
+        posts = create_posts(author, count)
+        # Run the queued fan-outs
+        tasks.work(once=True)
+        return posts
+
+    def titles(self, response):
+        return [post.title for post in response.context["posts"]]
+
+    def test_publishing_fans_out_in_batches(self):
+        followers = [create_user(f"f{i}@example.com") for i in range(4)]
+        for follower in followers:
+            UserFollowing.objects.follow(follower, self.author)
+        post = create_posts(self.author, 1)[0]
+        self.assertEqual(timeline.fan_out(post.pk, batch_size=2), 5)
+        self.assertEqual(TimelineEntry.objects.filter(post=post).count(), 5)
+        post.status = 0
+        post.save()
+        self.assertFalse(TimelineEntry.objects.exists())
+
+    def test_feed_shows_followed_authors_only(self):
+        self.publish(self.author, 3)
+        self.publish(create_user("other@example.com"), 2)
+        response = self.client.get(self.url)
+        self.assertEqual(self.titles(response), ["Post 2", "Post 1", "Post 0"])
+        UserFollowing.objects.unfollow(self.reader, self.author)
+        self.assertEqual(self.titles(self.client.get(self.url)), [])
+
+    def test_follow_backfills_latest_posts(self):
+        other = create_user("other@example.com")
+        self.publish(other, 2)
+        UserFollowing.objects.follow(self.reader, other)
+        self.assertEqual(self.titles(self.client.get(self.url)), ["Post 1", "Post 0"])
+
+    @mock.patch("blog.timeline.CELEBRITY_FOLLOWERS", 2)
+    def test_celebrity_posts_are_merged_on_read(self):
+        celebrity = create_user("celebrity@example.com")
+        UserFollowing.objects.follow(self.reader, celebrity)
+        UserFollowing.objects.follow(self.author, celebrity)
+        posts = self.publish(self.author, 3) + self.publish(celebrity, 3)
+        self.assertEqual(
+            TimelineEntry.objects.filter(post__author=celebrity).count(), 0
+        )
+        expected = [post.pk for post in reversed(posts)]
+        with mock.patch.object(views.FollowingFeed, "paginate_by", 4):
+            first = self.client.get(self.url).context["page_obj"]
+            cursor = first.next_cursor
+            second = self.client.get(self.url, {"cursor": cursor}).context["page_obj"]
+        self.assertEqual(
+            [post.pk for post in first] + [post.pk for post in second], expected
+        )
+        self.assertFalse(second.has_next())
+
+    @mock.patch("blog.timeline.CELEBRITY_FOLLOWERS", 2)
+    def test_former_celebrity_posts_stay_in_feeds(self):
+        celebrity = create_user("celebrity@example.com")
+        UserFollowing.objects.follow(self.reader, celebrity)
+        UserFollowing.objects.follow(self.author, celebrity)
+        self.publish(celebrity, 2)
+        UserFollowing.objects.unfollow(self.author, celebrity)
+        tasks.work(once=True)
+        self.assertEqual(TimelineEntry.objects.filter(user=self.reader).count(), 2)
+        self.assertEqual(self.titles(self.client.get(self.url)), ["Post 1", "Post 0"])
+
+
+class PrefixIndexTests(TestCase):
+    def test_matches_any_word_prefix(self):
+        index = autocomplete.PrefixIndex()
+        index.add("post", 1, "Python Tips", "/p/python-tips/")
+        index.add("category", 1, "Typing", "/category/typing/")
+        labels = [s["label"] for s in index.lookup(" TI ")]
+        self.assertEqual(labels, ["Python Tips"])
+        self.assertEqual(len(index.lookup("py")), 1)
+
+    def test_replace_remove_and_evict(self):
+        index = autocomplete.PrefixIndex(max_entries=2)
+        index.add("post", 1, "First", "/1/")
+        index.add("post", 1, "Renamed", "/1/")
+        self.assertEqual(index.lookup("first"), [])
+        index.add("post", 2, "Second", "/2/")
+        index.add("post", 3, "Third", "/3/")
+        self.assertEqual(len(index), 2)
+        self.assertEqual(index.lookup("renamed"), [])
+        index.remove("post", 2)
+        self.assertEqual(index.lookup("second"), [])
+        self.assertEqual(len(index.keys), 1)
+
+    def test_suggest_endpoint_follows_signals(self):
+        clear_caches()
+        author = create_user()
+        post = create_posts(author, 1)[0]
+        url = reverse("blog:search-suggest")
+        # Build the index, then change the data behind it
+        autocomplete.get_index()
+        post.title = "Renamed post"
+        with self.captureOnCommitCallbacks(execute=True):
+            post.save()
+        # Changed by this process: no rebuild
+        with self.assertNumQueries(0):
+            response = self.client.get(url, {"q": "renamed"})
+        self.assertEqual(
+            response.json()["suggestions"],
+            [{"label": "Renamed post", "kind": "post", "url": post.get_absolute_url()}],
+        )
+        post.delete()
+        self.assertEqual(
+            self.client.get(url, {"q": "renamed"}).json(), {"suggestions": []}
+        )
+
+    def test_changes_of_other_processes_are_replayed(self):
+        clear_caches()
+        post = create_posts(create_user(), 1, title="Original")[0]
+        self.assertEqual(len(autocomplete.suggest("original")), 1)
+        # Another process renamed the post and published the change
+        post.title = "Renamed 0"
+        Post.objects.filter(pk=post.pk).update(title=post.title)
+        autocomplete.publish(autocomplete.label_change("post", post))
+        with self.assertNumQueries(0):
+            self.assertEqual(autocomplete.suggest("original"), [])
+            self.assertEqual(autocomplete.suggest("renamed")[0]["label"], "Renamed 0")
+        autocomplete.publish(autocomplete.removal("post", post.pk))
+        self.assertEqual(autocomplete.suggest("renamed"), [])
+
+    def test_lost_changes_rebuild_the_index(self):
+        clear_caches()
+        post = create_posts(create_user(), 1, title="Original")[0]
+        self.assertEqual(len(autocomplete.suggest("original")), 1)
+        # Another process renamed the post, its change was evicted
+        Post.objects.filter(pk=post.pk).update(title="Renamed 0")
+        cache.incr(autocomplete.GENERATION_KEY)
+        self.assertEqual(autocomplete.suggest("original"), [])
+        self.assertEqual(autocomplete.suggest("renamed")[0]["label"], "Renamed 0")
+        with self.assertNumQueries(0):
+            autocomplete.suggest("renamed")
+
+    def test_warm_up_builds_the_index(self):
+        clear_caches()
+        create_posts(create_user(), 1, title="Warm")
+        with mock.patch("threading.Thread") as thread:
+            autocomplete.warm_up()
+        build_all = thread.call_args.kwargs["target"]
+        with mock.patch.object(connection, "close"):
+            build_all()
+        with self.assertNumQueries(0):
+            self.assertEqual(len(autocomplete.suggest("warm")), 1)
+
+
+class TrigramIndexTests(TestCase):
+    def test_trigrams_match_pg_trgm(self):
+        grams = trigram.trigrams("Cat!")
+        self.assertEqual(grams, {"  c", " ca", "cat", "at "})
+        self.assertEqual(trigram.similarity(grams, trigram.trigrams("cat")), 1)
+
+    def test_lookup_tolerates_typos(self):
+        index = trigram.TrigramIndex()
+        index.add("post", 1, "Getting started with Django", "/p/1/")
+        index.add("category", 1, "Django", "/category/django/")
+        index.add("author", 1, "Jane Doe", "/ac/jane/")
+        results = index.lookup("djnago", 10)
+        self.assertEqual([r["label"] for r in results][0], "Django")
+        self.assertEqual([r["kind"] for r in results], ["category", "post"])
+        self.assertEqual(index.lookup("jane deo", 10)[0]["kind"], "author")
+        index.remove("author", 1)
+        self.assertEqual(index.lookup("jane deo", 10), [])
+
+    def test_changes_of_other_processes_rebuild_the_index(self):
+        clear_caches()
+        Category.objects.create(name="Django", slug="django")
+        self.assertEqual(trigram.get_index().lookup("flaks", 10), [])
+        # Another process added a category and counted the change
+        Category.objects.bulk_create([Category(name="Flask", slug="flask")])
+        cache.incr(autocomplete.GENERATION_KEY)
+        results = search.get_backend().fuzzy_search("flaks")
+        self.assertEqual([r["label"] for r in results], ["Flask"])
+
+    def test_warm_up_builds_the_index_of_the_backend(self):
+        self.assertTrue(trigram.in_use())
+        with mock.patch.object(trigram.trigram_index, "get") as get:
+            with mock.patch("threading.Thread") as thread:
+                autocomplete.warm_up()
+            with mock.patch.object(connection, "close"):
+                thread.call_args.kwargs["target"]()
+        get.assert_called_once_with()
+
+
+class PageCacheTests(TestCase):
+    def setUp(self):
+        self.post = create_posts(create_user(), 1)[0]
+        self.url = self.post.get_absolute_url()
+
+    def test_anonymous_hit_runs_no_query(self):
+        self.assertEqual(self.client.get(self.url)["X-Page-Cache"], "miss")
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url)
+        self.assertEqual(response["X-Page-Cache"], "hit")
+        self.assertNotContains(response, "csrfmiddlewaretoken")
+
+    def test_edit_and_comment_invalidate(self):
+        self.client.get(self.url)
+        self.post.title = "Edited"
+        self.post.save()
+        self.assertContains(self.client.get(self.url), "Edited")
+        Comment.objects.create(post=self.post, author=self.post.author, content="x")
+        self.assertEqual(self.client.get(self.url)["X-Page-Cache"], "miss")
+
+    def test_authenticated_requests_bypass_cache(self):
+        self.client.force_login(self.post.author)
+        self.assertFalse(self.client.get(self.url).has_header("X-Page-Cache"))
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.author = create_user()
+        self.post = create_posts(self.author, 1)[0]
+        self.reader = create_user("reader@example.com")
+        self.client.force_login(self.reader)
+
+    def assertNotModified(self, url):
+        etag = self.client.get(url)["ETag"]
+        with mock.patch("django.template.backends.django.Template.render") as render:
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        render.assert_not_called()
+        return etag
+
+    def test_unchanged_pages_are_not_rendered(self):
+        self.assertNotModified(self.post.get_absolute_url())
+        self.assertNotModified(reverse("blog:comment-list", args=[self.post.slug]))
+        self.assertNotModified(reverse("blog:category", args=["django"]))
+
+    def test_interactions_change_the_etag(self):
+        url = self.post.get_absolute_url()
+        etag = self.assertNotModified(url)
+        self.client.post(reverse("accounts:bookmark"), {"post_id": self.post.pk})
+        self.assertNotEqual(self.client.get(url)["ETag"], etag)
+        etag = self.client.get(url)["ETag"]
+        Comment.objects.create(post=self.post, author=self.author, content="x")
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_likes_and_renames_change_the_listing_etags(self):
+        category = reverse("blog:category", args=["django"])
+        profile = reverse("accounts:profile", args=[self.author.uid])
+        etags = [self.assertNotModified(url) for url in (category, profile)]
+        # Counters are updated without touching last_update
+        self.client.post(reverse("accounts:like"), {"post_id": self.post.pk})
+        for url, etag in zip((category, profile), etags):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 200)
+        etag = self.client.get(category)["ETag"]
+        self.author.first_name = "Renamed"
+        self.author.save()
+        response = self.client.get(category, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_category_renames_change_the_profile_etag(self):
+        url = reverse("accounts:profile", args=[self.author.uid])
+        etag = self.assertNotModified(url)
+        category = Category.objects.get(slug="django")
+        category.name = "Web"
+        category.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_renames_and_edits_change_the_comments_etag(self):
+        url = reverse("blog:comment-list", args=[self.post.slug])
+        Comment.objects.create(post=self.post, author=self.reader, content="x")
+        etag = self.assertNotModified(url)
+        self.reader.first_name = "Renamed"
+        self.reader.save()
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        etag = self.assertNotModified(url)
+        Post.objects.filter(pk=self.post.pk).update(
+            title="Edited", last_update=timezone.now() + timedelta(seconds=1)
+        )
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_viewers_get_different_etags(self):
+        url = reverse("blog:category", args=["django"])
+        etag = self.client.get(url)["ETag"]
+        self.client.force_login(self.author)
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+
+    def test_cached_anonymous_page_answers_304(self):
+        self.client.logout()
+        url = self.post.get_absolute_url()
+        etag = self.client.get(url)["ETag"]
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+
+class PostCardCacheTests(TestCase):
+    def setUp(self):
+        self.author = create_user()
+        create_posts(self.author, 3)
+        self.client.force_login(self.author)
+        self.url = reverse("blog:post-list")
+
+    def test_backfilled_fields_show_on_cached_cards(self):
+        # A post saved before its derived fields existed
+        Post.objects.filter(title="Post 1").update(
+            content="<p>Backfilled excerpt</p>", excerpt=None, read_time=None
+        )
+        self.assertNotContains(self.client.get(self.url), "Backfilled excerpt")
+        call_command("backfill_posts", stdout=StringIO())
+        self.assertContains(self.client.get(self.url), "Backfilled excerpt")
+
+    def test_warm_page_renders_no_card(self):
+        self.client.get(self.url)
+        with mock.patch(
+            "blog.templatetags.post_cards.render_to_string"
+        ) as render_to_string:
+            response = self.client.get(self.url)
+        render_to_string.assert_not_called()
+        self.assertContains(response, "Post 2")
+
+    def test_changes_rerender_only_affected_cards(self):
+        self.client.get(self.url)
+        post = Post.objects.get(title="Post 1")
+        post.title = "Renamed"
+        post.save()
+        with mock.patch(
+            "blog.templatetags.post_cards.render_to_string",
+            wraps=post_cards.render_to_string,
+        ) as render_to_string:
+            response = self.client.get(self.url)
+        self.assertEqual(render_to_string.call_count, 1)
+        self.assertContains(response, "Renamed")
+        Category.objects.update(name="Renamed category")
+        self.author.first_name = "Renamed author"
+        self.author.save()
+        response = self.client.get(self.url)
+        self.assertContains(response, "Renamed category", count=3)
+        self.assertContains(response, "Renamed author", count=3)
+
+
+# Arguments of the calls to record_call, with failures when fail is set
+calls = []
+
+
+@tasks.task(max_attempts=2)
+def record_call(value, fail=False):
+    calls.append(value)
+    if fail:
+        raise ValueError(value)
+
+
+@tasks.task(unique=True)
+def refresh_once(value):
+    calls.append(value)
+
+
+class TaskQueueTests(TestCase):
+    def setUp(self):
+        calls.clear()
+        clear_caches()
+
+    def make_due(self):
+        Task.objects.update(run_at=timezone.now())
+
+    def test_enqueued_tasks_run_and_are_deleted(self):
+        record_call.enqueue(1)
+        record_call.enqueue_at(timezone.now() + timedelta(hours=1), 2)
+        self.assertEqual(tasks.work(once=True), 1)
+        self.assertEqual(calls, [1])
+        self.assertEqual(Task.objects.get().args, [2])
+        stats = tasks.stats()
+        self.assertEqual(stats["runs"], 1)
+        self.assertEqual(stats["depth"], {record_call.task_name: {"pending": 1}})
+        self.assertEqual(stats["due"], 0)
+
+    def test_claimed_tasks_are_not_claimed_again_until_the_lease_ends(self):
+        record_call.enqueue(1)
+        self.assertEqual(len(tasks.claim()), 1)
+        self.assertEqual(tasks.claim(), [])
+        Task.objects.update(started_at=timezone.now() - tasks.LEASE * 2)
+        reclaimed = tasks.claim()
+        self.assertEqual([task.attempts for task in reclaimed], [2])
+
+    def test_failing_task_is_retried_then_dead(self):
+        record_call.enqueue(1, fail=True)
+        with self.assertLogs("common.tasks", "WARNING"):
+            tasks.work(once=True)
+        task = Task.objects.get()
+        self.assertEqual((task.status, task.attempts), (Task.PENDING, 1))
+        self.assertGreater(task.run_at, timezone.now())
+        self.make_due()
+        with self.assertLogs("common.tasks", "ERROR"):
+            tasks.work(once=True)
+        task = Task.objects.get()
+        self.assertEqual((task.status, task.attempts), (Task.DEAD, 2))
+        self.assertIn("ValueError: 1", task.last_error)
+        self.assertEqual(calls, [1, 1])
+        self.assertEqual(tasks.stats()["failures"], 2)
+
+        self.assertEqual(tasks.requeue_dead(), 1)
+        self.assertEqual(Task.objects.get().status, Task.PENDING)
+
+    def test_unknown_task_is_dead(self):
+        Task.objects.create(name="blog.tests.missing")
+        with self.assertLogs("common.tasks", "ERROR"):
+            tasks.work(once=True)
+        self.assertEqual(Task.objects.get().status, Task.DEAD)
+
+    def test_unique_task_is_queued_once(self):
+        later = timezone.now() + timedelta(hours=1)
+        refresh_once.enqueue_at(later, 1)
+        refresh_once.enqueue_at(later + timedelta(hours=1), 1)
+        refresh_once.enqueue_at(later, 2)
+        self.assertEqual(Task.objects.count(), 2)
+        refresh_once.enqueue(1)
+        tasks.work(once=True)
+        self.assertEqual(calls, [1])
+
+    def test_periodic_task_is_queued_again_after_running(self):
+        tasks.schedule_periodic()
+        tasks.schedule_periodic()
+        name = blog_tasks.refresh_leaderboards.task_name
+        self.assertEqual(Task.objects.filter(name=name).count(), 1)
+        Task.objects.filter(name=name).update(run_at=timezone.now())
+        with mock.patch.object(leaderboard, "refresh") as refresh:
+            tasks.work(once=True)
+        refresh.assert_called_once_with()
+        task = Task.objects.get(name=name)
+        self.assertGreater(task.run_at, timezone.now() + timedelta(minutes=59))
+
+    def test_saving_a_post_queues_its_indexing(self):
+        post = create_posts(create_user(), 1)[0]
+        post.title = "Renamed"
+        post.save()
+        self.assertEqual(Task.objects.filter(key__isnull=False).count(), 1)
+
+    def test_task_stats_command(self):
+        record_call.enqueue(1)
+        output = StringIO()
+        call_command("task_stats", stdout=output)
+        self.assertIn(f"{record_call.task_name}: 1 pending", output.getvalue())
+        self.assertIn("1 due", output.getvalue())
+
+
+class TwoTierCacheTests(TestCase):
+    def setUp(self):
+        self.cache = TwoTierCache(f"test-{self.id()}", timeout=60)
+
+    def test_concurrent_misses_compute_once(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            time.sleep(0.05)
+            return "value"
+
+        results = []
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(self.cache.get_or_set("k", compute))
+            )
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ["value"] * 8)
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(self.cache.metrics["coalesced"], 7)
+
+    def test_stale_value_served_while_another_worker_recomputes(self):
+        self.cache.get_or_set("k", lambda: "old")
+        key = self.cache.make_key("k")
+        value, _ = self.cache.shared.get(key)
+        self.cache.shared.set(key, (value, 0))  # expired
+        self.cache.local.clear()
+        self.cache.shared.add(f"{key}:lock", 1)  # held by another worker
+        self.assertEqual(self.cache.get_or_set("k", lambda: "new"), "old")
+
+    def test_invalidate_and_delete(self):
+        self.cache.get_or_set("k", lambda: 1)
+        self.cache.invalidate()
+        self.assertEqual(self.cache.get_or_set("k", lambda: 2), 2)
+        self.cache.delete("k")
+        self.assertEqual(self.cache.get_or_set("k", lambda: 3), 3)
+        self.assertEqual(self.cache.metrics["misses"], 3)
+
+    def test_local_tier_is_bounded_lru(self):
+        local = LocalCache(max_entries=2)
+        local.set("a", 1, 60)
+        local.set("b", 2, 60)
+        local.get("a")
+        local.set("c", 3, 60)
+        self.assertEqual(local.get("a"), 1)
+        self.assertIs(local.get("b"), common_cache.MISSING)
+        local.set("d", 4, -1)
+        self.assertIs(local.get("d"), common_cache.MISSING)
+
+
+class ReadTimeTests(TestCase):
+    content = "<p>%s</p>" % ("word " * 600)
+
+    def test_stored_read_time_is_used_without_parsing(self):
+        post = Post(content=self.content, read_time=7)
+        with mock.patch("readtime.of_html") as of_html:
+            self.assertEqual(estimated_read_time(post), "7 min read")
+        of_html.assert_not_called()
+
+    def test_unsaved_post_is_parsed(self):
+        minutes = readtime.of_html(self.content).minutes
+        post = Post(content=self.content)
+        self.assertEqual(estimated_read_time(post), f"{minutes} min read")
+
+    def test_saving_stores_read_time(self):
+        post = create_posts(create_user(), 1, content=self.content)[0]
+        post.refresh_from_db()
+        self.assertEqual(post.read_time, readtime.of_html(self.content).minutes)
+
+    def test_backfill_fills_only_missing_rows(self):
+        missing, stale = create_posts(create_user(), 2)
+        Post.objects.filter(pk=missing.pk).update(read_time=None, excerpt=None)
+        Post.objects.filter(pk=stale.pk).update(read_time=99)
+        call_command("backfill_posts", stdout=StringIO())
+        missing.refresh_from_db()
+        stale.refresh_from_db()
+        self.assertEqual((missing.read_time, missing.excerpt), (1, "x"))
+        self.assertEqual(stale.read_time, 99)
+
+        call_command("backfill_posts", "--all", stdout=StringIO())
+        stale.refresh_from_db()
+        self.assertEqual(stale.read_time, 1)
+
+
+class DerivedFieldsTests(TestCase):
+    def test_excerpt_separates_blocks(self):
+        content = (
+            "<h2>Start quickly</h2><p>Learn &amp; build</p>"
+            "<ul><li>one</li><li>two</li></ul>line<br>break"
+        )
+        post = create_posts(create_user(), 1, content=content)[0]
+        self.assertEqual(post.excerpt, "Start quickly Learn & build one two line break")
+        self.assertEqual(post.excerpt_html, content)
+
+    def test_long_content_is_truncated(self):
+        content = "<p>%s</p>" % ("word " * 100)
+        post = create_posts(create_user(), 1, content=content)[0]
+        self.assertLessEqual(len(post.excerpt), Post.EXCERPT_LENGTH)
+        self.assertTrue(post.excerpt.endswith("…"))
+        self.assertTrue(post.excerpt_html.startswith("<p>word"))
+        self.assertTrue(post.excerpt_html.endswith("…</p>"))
+
+    def test_listing_defers_content(self):
+        create_posts(create_user(), 2)
+        with self.assertNumQueries(1):
+            posts = list(Post.objects.for_listing())
+            for post in posts:
+                self.assertEqual(post.excerpt, "x")
+                self.assertEqual(post.author.first_name, "First")
+                self.assertEqual(post.category.slug, "django")
+        self.assertIn("content", posts[0].get_deferred_fields())
+
+
+class ReconcileCountersTests(TestCase):
+    def test_repairs_drifted_posts_only(self):
+        author, reader = create_user(), create_user("reader@example.com")
+        drifted, correct = create_posts(author, 2)
+        Like.objects.add(reader, drifted)
+        Like.objects.add(reader, correct)
+        Post.objects.filter(pk=drifted.pk).update(like_count=5, comment_count=2)
+        output = StringIO()
+        call_command("reconcile_counters", "--dry-run", stdout=output)
+        self.assertIn("Found 1 drifted of 2 posts", output.getvalue())
+        self.assertEqual(Post.objects.get(pk=drifted.pk).like_count, 5)
+
+        with CaptureQueriesContext(connection) as queries:
+            call_command("reconcile_counters", "--chunk-size", 1, stdout=output)
+        self.assertIn("Repaired 1 drifted of 2 posts", output.getvalue())
+        counts = Post.objects.values_list("pk", "like_count", "comment_count")
+        self.assertEqual(set(counts), {(drifted.pk, 1, 0), (correct.pk, 1, 0)})
+        updates = [q["sql"] for q in queries if q["sql"].startswith("UPDATE")]
+        self.assertEqual(len(updates), 1)
+
+
+class CommentCountTests(TestCase):
+    def test_count_and_delete_are_rolled_back_together(self):
+        author = create_user()
+        post = create_posts(author, 1)[0]
+        comment = Comment.objects.create(post=post, author=author, content="x")
+        self.client.force_login(author)
+
+        def fail(**kwargs):
+            raise RuntimeError("after the count")
+
+        # Runs after the receiver decrementing the count
+        post_delete.connect(fail, sender=Comment, dispatch_uid="fail")
+        self.addCleanup(post_delete.disconnect, sender=Comment, dispatch_uid="fail")
+        url = reverse("blog:comment-delete", args=[post.slug, comment.pk])
+        with self.assertRaises(RuntimeError):
+            self.client.post(url)
+        self.assertTrue(Comment.objects.filter(pk=comment.pk).exists())
+        self.assertEqual(Post.objects.get(pk=post.pk).comment_count, 1)
+
+
+class ViewerStateTests(TestCase):
+    def setUp(self):
+        self.author = create_user()
+        self.reader = create_user("reader@example.com")
+        self.liked, self.bookmarked = create_posts(self.author, 2)
+        self.other = create_posts(create_user("other@example.com"), 1)[0]
+        Like.objects.add(self.reader, self.liked)
+        Bookmark.objects.add(self.reader, self.bookmarked)
+        UserFollowing.objects.follow(self.reader, self.author)
+
+    def states(self, user):
+        with self.assertNumQueries(1):
+            posts = Post.objects.for_listing().with_viewer_state(user)
+            return {
+                post.pk: (
+                    post.is_liked,
+                    post.is_bookmarked,
+                    post.is_following_author,
+                    post.author.uid,
+                )
+                for post in posts
+            }
+
+    def test_anonymous_viewer_state_is_false(self):
+        states = self.states(AnonymousUser())
+        self.assertEqual(
+            {pk: state[:3] for pk, state in states.items()},
+            dict.fromkeys(states, (False, False, False)),
+        )
+
+    def test_member_viewer_state(self):
+        states = self.states(self.reader)
+        self.assertEqual(states[self.liked.pk][:3], (True, False, True))
+        self.assertEqual(states[self.bookmarked.pk][:3], (False, True, True))
+        self.assertEqual(states[self.other.pk][:3], (False, False, False))
+
+
+class LeaderboardTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.authors = [create_user(f"a{i}@example.com") for i in range(4)]
+
+    def set_counters(self, author, followers, likes):
+        Profile.objects.filter(user=author).update(
+            followers_count=followers, likes_received=likes
+        )
+
+    def test_authors_ranked_by_score_ties_by_id(self):
+        first, tied_a, tied_b, unranked = self.authors
+        self.set_counters(first, 3, 1)  # 7
+        self.set_counters(tied_b, 2, 0)  # 4
+        self.set_counters(tied_a, 1, 2)  # 4
+        leaderboard.refresh([Ranking.AUTHOR])
+        rows = Ranking.objects.filter(kind=Ranking.AUTHOR)
+        self.assertEqual(
+            list(rows.values_list("position", "object_id", "score")),
+            [(1, first.pk, 7), (2, tied_a.pk, 4), (3, tied_b.pk, 4)],
+        )
+        self.assertEqual(leaderboard.popular_authors(), [first, tied_a, tied_b])
+
+    def test_categories_ranked_by_recent_posts(self):
+        busy, quiet = (
+            Category.objects.create(name=name, slug=name) for name in ("busy", "quiet")
+        )
+        create_posts(self.authors[0], 2, category=busy)
+        create_posts(self.authors[0], 1, category=quiet)
+        old = create_posts(self.authors[0], 3, category=quiet)
+        Post.objects.filter(pk__in=[post.pk for post in old]).update(
+            last_update=timezone.now() - leaderboard.CATEGORY_WINDOW * 2
+        )
+        leaderboard.refresh([Ranking.CATEGORY])
+        self.assertEqual(leaderboard.popular_categories(), [busy, quiet])
+
+    def test_cache_reloads_after_refresh(self):
+        first, second = self.authors[:2]
+        self.set_counters(first, 2, 0)
+        self.set_counters(second, 1, 0)
+        leaderboard.refresh([Ranking.AUTHOR])
+        self.assertEqual(leaderboard.popular_authors(), [first, second])
+        self.set_counters(second, 5, 0)
+        # Cached until the next refresh
+        with self.assertNumQueries(0):
+            self.assertEqual(leaderboard.popular_authors(), [first, second])
+        leaderboard.refresh([Ranking.AUTHOR])
+        self.assertEqual(leaderboard.popular_authors(), [second, first])
+
+
+class SearchTests(TestCase):
+    def setUp(self):
+        clear_caches()
+        self.author = create_user()
+
+    def publish(self, count=1, **kwargs):
+        posts = create_posts(self.author, count, **kwargs)
+        # Run the queued indexing
+        tasks.work(once=True)
+        return posts
+
+    def test_posts_are_searchable_once_indexed_by_a_worker(self):
+        post = create_posts(self.author, 1, title="Queued")[0]
+        self.assertEqual(search.cached_search_ids("queued"), [])
+        tasks.work(once=True)
+        # Indexing invalidated the cached empty result
+        self.assertEqual(search.cached_search_ids("queued"), [post.pk])
+
+    @override_settings(SEARCH_BACKEND=None)
+    def test_unsupported_database_is_a_configuration_error(self):
+        with mock.patch.object(search, "_backend", None), mock.patch.object(
+            connection, "vendor", "oracle"
+        ):
+            with self.assertRaisesMessage(ImproperlyConfigured, "oracle"):
+                search.get_backend()
+
+    def test_words_of_adjacent_blocks_are_indexed_apart(self):
+        post = self.publish(content="<h2>Alpha</h2><p>Beta</p>")[0]
+        self.assertEqual(search.cached_search_ids("beta"), [post.pk])
+
+    def test_title_matches_rank_first_and_drafts_are_excluded(self):
+        in_content = self.publish(content="<p>Notes on django and more</p>")[0]
+        in_title = self.publish(title="Django tips")[0]
+        self.publish(content="<p>django draft</p>", status=0)
+        self.assertEqual(
+            search.cached_search_ids("DJANGO "), [in_title.pk, in_content.pk]
+        )
+
+    def test_snippets_highlight_matches_and_escape_html(self):
+        content = "<p>Why &lt;b&gt; tags &amp; Django templates matter</p>"
+        post = self.publish(content=content)[0]
+        (result,) = search.get_backend().search("django")
+        self.assertEqual(result.pk, post.pk)
+        self.assertIn("<mark>Django</mark>", result.snippet)
+        self.assertIn("&lt;b&gt; tags &amp;", result.snippet)
+        self.assertNotIn("<b>", result.snippet)
+
+    def test_only_the_page_of_results_is_loaded(self):
+        posts = self.publish(12, content="<p>django</p>")
+        backend = search.get_backend()
+        with mock.patch.object(backend, "results", wraps=backend.results) as results:
+            response = self.client.get(reverse("blog:search"), {"q": "django"})
+        self.assertEqual(response.context["paginator"].count, 12)
+        ids = results.call_args.args[0]
+        self.assertEqual(len(ids), 10)
+        self.assertLessEqual(set(ids), {post.pk for post in posts})
+
+    def test_cached_results_are_invalidated_on_reindex(self):
+        self.assertEqual(search.cached_search_ids("python"), [])
+        with self.assertNumQueries(0):
+            self.assertEqual(search.cached_search_ids("python"), [])
+        post = self.publish(title="Python")[0]
+        self.assertEqual(search.cached_search_ids("python"), [post.pk])
+        post.delete()
+        self.assertEqual(search.cached_search_ids("python"), [])
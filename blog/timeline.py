@@ -0,0 +1,196 @@
+"""
+Following feed: the posts of the authors a user follows.
+
+Publishing a post fans it out on write: a task queued with the post (see
+common.tasks) adds a TimelineEntry for every follower of the author,
+FANOUT_BATCH_SIZE rows per statement. Reading a page of a feed is then a
+range scan of the (user, published_at, post) index of the timeline table,
+however many authors the user follows.
+
+Authors with CELEBRITY_FOLLOWERS followers or more are not fanned out, a
+post of theirs would write too many rows. Their posts are read from the
+post table when a feed is read and merged in (fan-out on read), which
+costs one more small query per page to the users following any of them.
+An author falling back below CELEBRITY_FOLLOWERS has their latest posts
+fanned out then, as a follow would, so feeds don't lose them.
+"""
+
+from django.apps import apps
+from django.db.models import Q
+
+from common.pagination import CursorPaginator
+from common.tasks import task
+
+from .models import Post, TimelineEntry
+
+# Rows written per statement while fanning out
+FANOUT_BATCH_SIZE = 1000
+# Authors with this many followers are merged into feeds on read
+CELEBRITY_FOLLOWERS = 10000
+# Latest posts of an author added to a timeline on follow
+BACKFILL_SIZE = 20
+
+
+def is_celebrity(author_id):
+    Profile = apps.get_model("accounts", "Profile")
+    return Profile.objects.filter(
+        user_id=author_id, followers_count__gte=CELEBRITY_FOLLOWERS
+    ).exists()
+
+
+def followed_celebrities(user):
+    """Return the ids of the celebrity authors followed by user."""
+    UserFollowing = apps.get_model("accounts", "UserFollowing")
+    return list(
+        UserFollowing.objects.filter(
+            user=user,
+            user_following__profile__followers_count__gte=CELEBRITY_FOLLOWERS,
+        ).values_list("user_following_id", flat=True)
+    )
+
+
+def _write(author_id, posts, batch_size=FANOUT_BATCH_SIZE):
+    """
+    Add posts, (pk, published_at) pairs of author_id, to the timeline of
+    each of their followers. Return the number of followers reached.
+    """
+    UserFollowing = apps.get_model("accounts", "UserFollowing")
+    followers = UserFollowing.objects.filter(user_following=author_id)
+    followers = followers.order_by("user_id").values_list("user_id", flat=True)
+    per_batch = max(batch_size // max(len(posts), 1), 1)
+    reached, last = 0, 0
+    while posts:
+        # Seek past the previous batch rather than holding a cursor open
+        batch = list(followers.filter(user_id__gt=last)[:per_batch])
+        if not batch:
+            break
+        TimelineEntry.objects.bulk_create(
+            [
+                TimelineEntry(user_id=user_id, post_id=pk, published_at=published_at)
+                for user_id in batch
+                for pk, published_at in posts
+            ],
+            ignore_conflicts=True,
+        )
+        reached += len(batch)
+        last = batch[-1]
+    return reached
+
+
+@task
+def fan_out(post_id, batch_size=FANOUT_BATCH_SIZE):
+    """
+    Add a published post to the timeline of every follower of its author.
+    Return the number of followers reached.
+    """
+    post = Post.objects.filter(pk=post_id, status=1)
+    post = post.values_list("author_id", "published_at").first()
+    if post is None or is_celebrity(post[0]):
+        return 0
+    author_id, published_at = post
+    return _write(author_id, [(post_id, published_at)], batch_size)
+
+
+def publish(post):
+    """Queue the fan-out of post, which runs once the transaction commits."""
+    fan_out.enqueue(post.pk)
+
+
+def withdraw(post):
+    """Take an unpublished post out of every timeline."""
+    TimelineEntry.objects.filter(post=post).delete()
+
+
+def latest_posts(author_id, size=BACKFILL_SIZE):
+    """Return (pk, published_at) of the latest published posts of author_id."""
+    posts = Post.objects.filter(author_id=author_id, status=1)
+    posts = posts.order_by("-published_at", "-id").values_list("pk", "published_at")
+    return list(posts[:size])
+
+
+def follow(user, author, size=BACKFILL_SIZE):
+    """Add the latest posts of a newly followed author to user's timeline."""
+    if is_celebrity(author.pk):
+        return
+    TimelineEntry.objects.bulk_create(
+        [
+            TimelineEntry(user=user, post_id=pk, published_at=published_at)
+            for pk, published_at in latest_posts(author.pk, size)
+        ],
+        ignore_conflicts=True,
+    )
+
+
+@task(unique=True)
+def fan_out_latest(author_id, size=BACKFILL_SIZE):
+    """
+    Add the latest posts of an author who is no celebrity anymore to the
+    timelines of their followers. Return the number of followers reached.
+    """
+    if is_celebrity(author_id):
+        return 0
+    return _write(author_id, latest_posts(author_id, size))
+
+
+def unfollow(user, author):
+    """
+    Drop the posts of an unfollowed author from user's timeline, and fan
+    out their latest posts if they just fell below CELEBRITY_FOLLOWERS.
+    """
+    TimelineEntry.objects.filter(user=user, post__author=author).delete()
+    Profile = apps.get_model("accounts", "Profile")
+    demoted = Profile.objects.filter(
+        user_id=author.pk, followers_count=CELEBRITY_FOLLOWERS - 1
+    )
+    if demoted.exists():
+        fan_out_latest.enqueue(author.pk)
+
+
+def rebuild(size=BACKFILL_SIZE):
+    """
+    Recreate every timeline from the follow relations, with the latest size
+    posts of each followed author. Return the number of entries written.
+    """
+    UserFollowing = apps.get_model("accounts", "UserFollowing")
+    TimelineEntry.objects.all().delete()
+    authors = UserFollowing.objects.order_by("user_following_id").distinct()
+    for author_id in authors.values_list("user_following_id", flat=True):
+        if not is_celebrity(author_id):
+            _write(author_id, latest_posts(author_id, size))
+    return TimelineEntry.objects.count()
+
+
+class TimelinePaginator(CursorPaginator):
+    """
+    Paginate the following feed of user: posts of queryset found in the
+    user's timeline, merged with those of the celebrities they follow.
+    """
+
+    # The (published_at, id) key of posts, as stored in the timeline
+    timeline_fields = ("timeline_entries__published_at", "timeline_entries__post_id")
+
+    def __init__(self, queryset, per_page, user):
+        super().__init__(queryset, per_page, ordering=("-published_at", "-id"))
+        self.user = user
+
+    def rows(self, values, backwards):
+        rows = self.fetch(
+            self.queryset,
+            values,
+            backwards,
+            fields=self.timeline_fields,
+            condition=Q(timeline_entries__user=self.user),
+        )
+        celebrities = followed_celebrities(self.user)
+        if celebrities:
+            queryset = self.queryset.filter(author__in=celebrities)
+            extra = self.fetch(queryset, values, backwards)
+            # Posts fanned out before their author became a celebrity are
+            # found both ways
+            merged = {post.pk: post for post in rows + extra}
+            rows = sorted(
+                merged.values(),
+                key=lambda post: (post.published_at, post.pk),
+                reverse=not backwards,
+            )[: self.per_page + 1]
+        return rows
@@ -1,34 +1,47 @@
+import copy
+
 from django.contrib import messages
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
-from django.contrib.postgres.search import (SearchQuery, SearchRank,
-                                            SearchVector)
+from django.db import transaction
+from django.db.models import Count, Max, OuterRef, Subquery
+from django.http import Http404, JsonResponse
 from django.shortcuts import get_object_or_404, redirect, render
+from django.template.response import TemplateResponse
 from django.urls import reverse, reverse_lazy
 from django.views.generic import DetailView, ListView, View
 from django.views.generic.edit import CreateView, DeleteView, UpdateView
 
-from accounts.models import Account
+from accounts.models import Bookmark, Like
+from common import utils
+from common.conditional import ConditionalGetMixin, conditional_page
+from common.pagination import CursorPaginationMixin
 
+from . import autocomplete, caching, leaderboard, search, timeline
 from .forms import CommentForm
 from .models import Category, Comment, Post
 
 
-class HomePage(View):
+class HomePage(caching.AnonymousPageCacheMixin, View):
     """Show landing page of the website."""
 
+    cache_scopes = ("listing", "leaderboard")
+
     def get(self, request):
         # if the user is authenticated, redirect to stories
         if request.user.is_authenticated:
             return redirect(to=reverse("blog:post-list"))
 
         # Show popular posts on the home page (guest users)
-        featured_posts = (
-            Post.objects.select_related("category")
-            .select_related("author")
-            .filter(status=1)[:10]
+        featured_posts = caching.featured_posts.get_or_set(
+            "home",
+            lambda: list(
+                Post.objects.for_listing()
+                .with_viewer_state(request.user)
+                .filter(status=1)[:10]
+            ),
         )
-        popular_categories = Category.objects.all()[:6]
-        return render(
+        popular_categories = leaderboard.popular_categories()
+        return TemplateResponse(
             request,
             "blog/landing_page.html",
             context={
@@ -37,18 +50,22 @@ class HomePage(View):
             },
         )
 
+    def get_cache_scopes(self, context):
+        return set().union(*map(caching.post_scopes, context["featured_posts"]))
+
 
-class PostList(ListView):
+class PostList(caching.AnonymousPageCacheMixin, CursorPaginationMixin, ListView):
     """Show the list of posts."""
 
     template_name = "blog/index.html"
     context_object_name = "posts"
     paginate_by = 10
+    cache_scopes = ("listing", "leaderboard")
 
     def get_queryset(self):
         return (
-            Post.objects.select_related("category")
-            .select_related("author")
+            Post.objects.for_listing()
+            .with_viewer_state(self.request.user)
             .filter(status=1)
         )
 
@@ -63,27 +80,100 @@ class PostList(ListView):
 
     def get_popular_categories(self):
         """Return most popular categories."""
-        return Category.objects.all()[:6]
+        return leaderboard.popular_categories()
 
     def get_popular_authors(self):
         """Return the top 5 popular authors."""
-        return Account.objects.select_related("profile").all()[:5]
+        return leaderboard.popular_authors()
+
+    def get_cache_scopes(self, context):
+        return set().union(*map(caching.post_scopes, context["posts"]))
+
+
+class FollowingFeed(LoginRequiredMixin, PostList):
+    """Show the posts of the authors the user follows, newest first."""
+
+    def get_cursor_paginator(self, queryset, page_size):
+        return timeline.TimelinePaginator(queryset, page_size, self.request.user)
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["following_feed"] = True
+        return context
 
 
-class PostDetail(DetailView):
+class PostDetail(caching.AnonymousPageCacheMixin, ConditionalGetMixin, DetailView):
     """Show the detail of a single post."""
 
     model = Post
     context_object_name = "post"
     template_name = "blog/post_detail.html"
+    state_fields = (
+        "like_count",
+        "comment_count",
+        "bookmark_count",
+        "is_liked",
+        "is_bookmarked",
+        "is_following_author",
+    )
 
-    def get_queryset(self):
-        return (
-            Post.objects.select_related("category")
-            .select_related("author")
-            .filter(slug=self.kwargs["slug"])
+    def get_state(self):
+        """
+        Return the counters and viewer flags of the post, which change too
+        often to be cached, along with the other values its page shows.
+        """
+        if not hasattr(self, "state"):
+            self.state = (
+                Post.objects.filter(slug=self.kwargs["slug"])
+                .with_viewer_state(self.request.user)
+                .values(
+                    *self.state_fields,
+                    "last_update",
+                    "author__first_name",
+                    "author__last_name",
+                    "author__profile__title",
+                    "author__profile__about",
+                    "category__name",
+                )
+                .first()
+            )
+        return self.state
+
+    def get_validators(self):
+        state = self.get_state()
+        if state is None:
+            return None
+        return tuple(state.values()), state["last_update"]
+
+    def get_object(self):
+        state = self.get_state()
+        if state is None:
+            raise Http404("No post found matching the query")
+        slug = self.kwargs["slug"]
+        post = self.get_cached_post(slug)
+        profile = post.author.profile
+        if (profile.title, profile.about) != (
+            state["author__profile__title"],
+            state["author__profile__about"],
+        ):
+            # Saving a profile leaves the cached posts of its user alone
+            caching.post_details.delete(slug)
+            post = self.get_cached_post(slug)
+        post = copy.copy(post)
+        post.__dict__.update({field: state[field] for field in self.state_fields})
+        return post
+
+    def get_cached_post(self, slug):
+        return caching.post_details.get_or_set(
+            slug,
+            lambda: get_object_or_404(
+                Post.objects.select_related("category", "author__profile"), slug=slug
+            ),
         )
 
+    def get_cache_scopes(self, context):
+        return caching.post_scopes(context["post"])
+
 
 class PostCreate(LoginRequiredMixin, CreateView):
     """Display post creation form and handle the process."""
@@ -144,28 +234,61 @@ class PostDelete(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
         return self.get_object().author == self.request.user
 
 
-class CategoryView(ListView):
+class CategoryView(
+    caching.AnonymousPageCacheMixin,
+    ConditionalGetMixin,
+    CursorPaginationMixin,
+    ListView,
+):
     """Show all post in a certain category."""
 
     model = Post
     template_name = "blog/category.html"
     context_object_name = "category_posts"
     paginate_by = 10
+    cache_scopes = ("listing", "leaderboard")
 
     def get_queryset(self):
         return (
-            Post.objects.select_related("category")
-            .select_related("author")
+            Post.objects.for_listing()
+            .with_viewer_state(self.request.user)
             .filter(category__slug=self.kwargs.get("slug"))
             .filter(status=1)
         )
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        popular_categories = Category.objects.all()[:6]
+        popular_categories = leaderboard.popular_categories()
         context["popular_categories"] = popular_categories
         return context
 
+    def get_cache_scopes(self, context):
+        return set().union(*map(caching.post_scopes, context["category_posts"]))
+
+    def get_validators(self):
+        # Subqueries rather than a grouped join, each reads one index range
+        posts = Post.objects.filter(category=OuterRef("pk"), status=1)
+        stats = (
+            Category.objects.filter(slug=self.kwargs.get("slug"))
+            .annotate(
+                latest=Subquery(posts.values("last_update")[:1]),
+                total=utils.count_subquery(posts, "category"),
+                **{
+                    f"total_{counter}": utils.sum_subquery(posts, "category", counter)
+                    for counter in Post.COUNTERS
+                },
+                **Bookmark.objects.summary(self.request.user),
+                **Like.objects.summary(self.request.user),
+            )
+            .values()
+            .first()
+        )
+        if stats is None:
+            return None
+        # The sidebar shows the leaderboard, the cards their authors' names
+        versions = caching.versions(["leaderboard", "authors"])
+        return (tuple(stats.values()), versions), stats["latest"]
+
 
 class CommentUpdate(LoginRequiredMixin, UserPassesTestMixin, UpdateView):
     """Display comment update form and handle the process."""
@@ -195,6 +318,11 @@ class CommentDelete(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
     model = Comment
     template_name = "blog/comment_delete.html"
 
+    def form_valid(self, form):
+        with transaction.atomic():
+            # the post's comment counter is updated on delete
+            return super().form_valid(form)
+
     def get_success_url(self):
         # After deleting the comment, redirect back to comments page
         messages.info(self.request, "Your comment has been deleted.")
@@ -206,6 +334,27 @@ class CommentDelete(LoginRequiredMixin, UserPassesTestMixin, DeleteView):
         return self.get_object().author == self.request.user
 
 
+def comment_validators(request, slug):
+    stats = (
+        Post.objects.filter(slug=slug)
+        .values("pk")
+        .annotate(
+            # Aggregated rather than grouped by, which would sort the rows
+            updated=Max("last_update"),
+            latest=Max("comments__commented_on"),
+            total=Count("comments"),
+        )
+        .first()
+    )
+    if stats is None:
+        return None
+    # The page shows the names of the commenters
+    versions = caching.versions(["authors"])
+    latest = max(filter(None, [stats["latest"], stats["updated"]]))
+    return (tuple(stats.values()), versions), latest
+
+
+@conditional_page(comment_validators)
 def comments(request, slug):
     """Enable user to add comments on posts."""
     comments = (
@@ -221,7 +370,9 @@ def comments(request, slug):
             if comment_form.is_valid():
                 comment_form.instance.author = request.user
                 comment_form.instance.post = post
-                comment_form.save()
+                with transaction.atomic():
+                    # the post's comment counter is updated on save
+                    comment_form.save()
                 messages.info(request, "Your response has been saved.")
     else:
         # Inform users to authenticate in order to add comments
@@ -239,19 +390,36 @@ def comments(request, slug):
 class SearchResultsList(ListView):
     """Show the list of search results."""
 
-    model = Post
     context_object_name = "search_results"
     template_name = "blog/search_result_page.html"
+    paginate_by = 10
 
     def get_queryset(self):
         # query entered by the user
-        query = self.request.GET["q"]
-        search_vector = SearchVector("title", "content")
-        search_query = SearchQuery(query)
-        return (
-            Post.objects.annotate(
-                search=search_vector, rank=SearchRank(search_vector, search_query)
-            )
-            .filter(search=search_query)
-            .order_by("-rank")
+        self.query = self.request.GET.get("q", "")
+        # typo-tolerant matching of titles, categories and authors
+        self.fuzzy = self.request.GET.get("mode") == "fuzzy"
+        if self.fuzzy:
+            return search.cached_fuzzy_search(self.query)
+        # ranked ids of all matches, paginated before loading any post
+        return search.cached_search_ids(self.query)
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator, page, object_list, is_paginated = super().paginate_queryset(
+            queryset, page_size
         )
+        if not self.fuzzy:
+            page.object_list = search.get_backend().results(object_list, self.query)
+        return paginator, page, page.object_list, is_paginated
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        context["query"] = self.query
+        context["fuzzy"] = self.fuzzy
+        return context
+
+
+def search_suggestions(request):
+    """Return autocomplete suggestions for a partially typed search query."""
+    query = request.GET.get("q", "")
+    return JsonResponse({"suggestions": autocomplete.suggest(query)})
@@ -0,0 +1,183 @@
+"""
+Two-tier cache for hot reads shared by every request.
+
+A value is looked up in a small per-process LRU first and then in the
+shared Django cache (settings.CACHES), so most hits cost no round-trip at
+all. Recomputation is single-flight: within a process a per-key lock lets
+one thread compute while the others wait for its result, and across
+processes a lock key in the shared cache lets one worker recompute an
+expired entry while the others keep serving the stale copy.
+
+Every namespace has a generation stored in the shared cache and part of
+all its keys; invalidate() replaces it, which reaches every worker within
+GENERATION_TTL seconds. delete() drops a single key, although
+other processes may keep serving their local copy for up to local_timeout
+seconds.
+"""
+
+import threading
+import time
+import uuid
+from collections import Counter, OrderedDict
+
+from django.core.cache import caches
+
+# Seconds a process trusts its copy of a namespace generation
+GENERATION_TTL = 1
+# Shared entries outlive their freshness by this factor, to be served stale
+STALE_FACTOR = 10
+# Seconds between polls while another worker computes a missing value
+POLL_INTERVAL = 0.05
+
+MISSING = object()
+
+_registry = []
+
+
+def new_generation():
+    # Random rather than a counter, so an evicted generation never comes
+    # back with a value whose entries are stale
+    return uuid.uuid4().hex[:12]
+
+
+class LocalCache:
+    """A bounded, thread-safe LRU mapping with per-entry expiry."""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        """Return the value of key, or MISSING if absent or expired."""
+        with self.lock:
+            value, expires_at = self.entries.get(key, (MISSING, 0))
+            if value is MISSING:
+                return MISSING
+            if expires_at < time.monotonic():
+                del self.entries[key]
+                return MISSING
+            self.entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, timeout):
+        with self.lock:
+            self.entries[key] = (value, time.monotonic() + timeout)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+class TwoTierCache:
+    """
+    Cache the values of a namespace for timeout seconds (local_timeout in
+    the per-process tier). Values handed out are shared between threads
+    and must not be mutated.
+    """
+
+    def __init__(
+        self,
+        namespace,
+        timeout=60,
+        local_timeout=5,
+        max_entries=1000,
+        lock_timeout=10,
+        alias="default",
+    ):
+        self.namespace = namespace
+        self.timeout = timeout
+        self.local_timeout = min(local_timeout, timeout)
+        self.lock_timeout = lock_timeout
+        self.alias = alias
+        self.local = LocalCache(max_entries)
+        self.metrics = Counter()
+        # Striped locks for the in-process single-flight
+        self.locks = [threading.Lock() for _ in range(64)]
+        self._generation = (None, 0)
+        _registry.append(self)
+
+    @property
+    def shared(self):
+        return caches[self.alias]
+
+    def generation(self):
+        generation, checked_at = self._generation
+        if generation is None or time.monotonic() - checked_at > GENERATION_TTL:
+            key = f"{self.namespace}:generation"
+            generation = self.shared.get_or_set(key, new_generation, timeout=None)
+            self._generation = (generation, time.monotonic())
+        return generation
+
+    def make_key(self, key):
+        return f"{self.namespace}:{self.generation()}:{key}"
+
+    def get_or_set(self, key, compute):
+        """Return the cached value of key, calling compute() to fill it."""
+        key = self.make_key(key)
+        value = self.local.get(key)
+        if value is not MISSING:
+            self.metrics["local_hits"] += 1
+            return value
+        with self.locks[hash(key) % len(self.locks)]:
+            # Another thread may have filled it while this one waited
+            value = self.local.get(key)
+            if value is not MISSING:
+                self.metrics["coalesced"] += 1
+                return value
+            return self._get_shared(key, compute)
+
+    def _get_shared(self, key, compute):
+        entry = self.shared.get(key)
+        if entry is not None and entry[1] > time.time():
+            self.metrics["shared_hits"] += 1
+            self.local.set(key, entry[0], self.local_timeout)
+            return entry[0]
+        lock_key = f"{key}:lock"
+        locked = self.shared.add(lock_key, 1, self.lock_timeout)
+        if not locked:
+            # Another worker is recomputing: serve the stale copy meanwhile,
+            # or wait for the fresh one if there is none
+            self.metrics["coalesced"] += 1
+            deadline = time.monotonic() + self.lock_timeout
+            while entry is None and time.monotonic() < deadline:
+                time.sleep(POLL_INTERVAL)
+                entry = self.shared.get(key)
+            if entry is not None:
+                self.local.set(key, entry[0], self.local_timeout)
+                return entry[0]
+        self.metrics["misses"] += 1
+        try:
+            value = compute()
+            fresh_until = time.time() + self.timeout
+            self.shared.set(key, (value, fresh_until), self.timeout * STALE_FACTOR)
+            self.local.set(key, value, self.local_timeout)
+        finally:
+            if locked:
+                self.shared.delete(lock_key)
+        return value
+
+    def delete(self, key):
+        """Drop key from the shared tier and from this process."""
+        key = self.make_key(key)
+        self.shared.delete(key)
+        self.local.delete(key)
+
+    def invalidate(self):
+        """Make every value of the namespace stale, in every process."""
+        generation = new_generation()
+        self.shared.set(f"{self.namespace}:generation", generation, timeout=None)
+        self._generation = (generation, time.monotonic())
+        self.local.clear()
+
+
+def metrics():
+    """Return the per-process hit, miss and coalesce counts by namespace."""
+    return {cache.namespace: dict(cache.metrics) for cache in _registry}
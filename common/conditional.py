@@ -0,0 +1,82 @@
+"""
+Conditional GET: answer 304 Not Modified before any rendering.
+
+A view provides validators, computed with one cheap query: a tuple of
+values that changes whenever the page does (timestamps, counts, viewer
+flags) and the page's modification time. The ETag hashes them together
+with the full path and the viewer, so it is the validator that decides;
+Last-Modified is sent for information only, since likes or follows change
+a page without moving any timestamp.
+"""
+
+import functools
+import hashlib
+
+from django.contrib import messages
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+
+
+def make_etag(request, validators):
+    parts = (request.get_full_path(), request.user.pk, validators)
+    return quote_etag(hashlib.md5(repr(parts).encode()).hexdigest())
+
+
+def conditional_response(request, get_validators, render):
+    """
+    Return 304 if the client's copy matches the validators returned by
+    get_validators(), else the response of render() with the validators
+    attached. get_validators() returns None when the page does not exist.
+    """
+    # Pending flash messages must be rendered, and consumed, by this page
+    if request.method not in ("GET", "HEAD") or len(messages.get_messages(request)):
+        return render()
+    validators = get_validators()
+    if validators is None:
+        return render()
+    values, last_modified = validators
+    etag = make_etag(request, values)
+    response = get_conditional_response(request, etag=etag)
+    if response is not None:
+        return response
+    response = render()
+    if response.status_code == 200:
+        response.headers.setdefault("ETag", etag)
+        if last_modified is not None:
+            response.headers.setdefault(
+                "Last-Modified", http_date(last_modified.timestamp())
+            )
+    return response
+
+
+def conditional_page(get_validators):
+    """Decorate a view with conditional_response(); get_validators receives
+    the view's arguments."""
+
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(request, *args, **kwargs):
+            return conditional_response(
+                request,
+                lambda: get_validators(request, *args, **kwargs),
+                lambda: view(request, *args, **kwargs),
+            )
+
+        return wrapper
+
+    return decorator
+
+
+class ConditionalGetMixin:
+    """Apply conditional_response() to a class-based view."""
+
+    def get_validators(self):
+        """Return (values, last modified datetime), or None."""
+        raise NotImplementedError
+
+    def dispatch(self, request, *args, **kwargs):
+        return conditional_response(
+            request,
+            self.get_validators,
+            lambda: super(ConditionalGetMixin, self).dispatch(request, *args, **kwargs),
+        )
@@ -0,0 +1,82 @@
+import multiprocessing
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from common import tasks
+
+
+def work(stop, options):
+    """Run tasks in a worker thread or process, on its own connection."""
+    try:
+        tasks.work(
+            stop,
+            batch_size=options["batch_size"],
+            interval=options["interval"],
+            once=options["once"],
+        )
+    finally:
+        connections.close_all()
+
+
+class Command(BaseCommand):
+    help = (
+        "Run the queued tasks (see common.tasks) with a pool of worker threads "
+        "or processes, until SIGTERM or SIGINT."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument(
+            "--processes",
+            action="store_true",
+            help="Run the workers in processes rather than threads.",
+        )
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=tasks.BATCH_SIZE,
+            help="Tasks claimed by a worker at a time.",
+        )
+        parser.add_argument(
+            "--interval",
+            type=float,
+            default=tasks.POLL_INTERVAL,
+            help="Seconds an idle worker waits before polling again.",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Stop once no task is due rather than waiting for more.",
+        )
+
+    def handle(self, *args, **options):
+        if not options["once"]:
+            tasks.schedule_periodic()
+        if options["processes"]:
+            stop, Worker = multiprocessing.Event(), multiprocessing.Process
+            # Forked processes must not share the parent's connection
+            connections.close_all()
+        else:
+            stop, Worker = threading.Event(), threading.Thread
+
+        def shut_down(signum, frame):
+            # Workers finish the task at hand, then exit
+            stop.set()
+
+        signal.signal(signal.SIGTERM, shut_down)
+        signal.signal(signal.SIGINT, shut_down)
+        workers = [
+            Worker(target=work, args=(stop, options)) for _ in range(options["workers"])
+        ]
+        for worker in workers:
+            worker.start()
+        self.stdout.write(
+            f"Started {len(workers)} worker "
+            f"{'processes' if options['processes'] else 'threads'}."
+        )
+        for worker in workers:
+            worker.join()
+        self.stdout.write("Workers stopped.")
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from common import tasks
+
+
+class Command(BaseCommand):
+    help = "Show the depth and latency of the task queue."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--requeue-dead",
+            action="store_true",
+            help="Give the dead tasks new attempts first.",
+        )
+        parser.add_argument("--name", help="Requeue the dead tasks of this name only.")
+
+    def handle(self, *args, **options):
+        if options["requeue_dead"]:
+            requeued = tasks.requeue_dead(options["name"])
+            self.stdout.write(f"Requeued {requeued} dead tasks.")
+        stats = tasks.stats()
+        for name, counts in stats["depth"].items():
+            counts = ", ".join(f"{count} {status}" for status, count in counts.items())
+            self.stdout.write(f"{name}: {counts}")
+        runs = stats["runs"]
+        wait = stats["wait_ms"] / runs if runs else 0
+        duration = stats["run_ms"] / runs if runs else 0
+        self.stdout.write(
+            f"{stats['due']} due, oldest waiting {stats['oldest_due_ms']} ms; "
+            f"{runs} runs, {stats['failures']} failures, "
+            f"{wait:.1f} ms average wait, {duration:.1f} ms average run"
+        )
@@ -0,0 +1,88 @@
+"""
+Per-request query recording and N+1 detection.
+
+QueryRecorder collects the SQL statements run on a connection and groups
+them by shape, the parameterized statement with IN lists collapsed, so a
+template reaching for a relation of every row of a page shows up as one
+shape run once per row.
+
+QueryCountMiddleware records a sampled share of the requests
+(settings.QUERY_SAMPLE_RATE, 1 records them all) and logs the shapes a
+request repeated N_PLUS_ONE_THRESHOLD times or more, with its URL name.
+Tests use QueryRecorder to hold each URL to a query budget.
+"""
+
+import logging
+import random
+import re
+from collections import Counter
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+# A statement run this many times in a request is reported as an N+1
+N_PLUS_ONE_THRESHOLD = 3
+
+IN_LIST_RE = re.compile(r"\((?:%s, )+%s\)")
+
+logger = logging.getLogger(__name__)
+
+
+def shape(sql):
+    """Return sql with its IN lists collapsed, to group repeated statements."""
+    return IN_LIST_RE.sub("(%s, ...)", sql)
+
+
+class QueryRecorder:
+    """Record the statements run on a connection while used as a context."""
+
+    def __init__(self, using=DEFAULT_DB_ALIAS):
+        self.connection = connections[using]
+        self.statements = []
+
+    def __call__(self, execute, sql, params, many, context):
+        self.statements.append(sql)
+        return execute(sql, params, many, context)
+
+    def __enter__(self):
+        self.wrapper = self.connection.execute_wrapper(self)
+        self.wrapper.__enter__()
+        return self
+
+    def __exit__(self, *exc_info):
+        return self.wrapper.__exit__(*exc_info)
+
+    def __len__(self):
+        return len(self.statements)
+
+    def repeated(self, threshold=N_PLUS_ONE_THRESHOLD):
+        """Return (shape, count) of the statements run threshold times or more."""
+        counts = Counter(shape(sql) for sql in self.statements)
+        return [
+            (sql, count) for sql, count in counts.most_common() if count >= threshold
+        ]
+
+
+class QueryCountMiddleware:
+    """Log the N+1 query patterns of a sample of requests."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, "QUERY_SAMPLE_RATE", 0)
+
+    def __call__(self, request):
+        if random.random() >= self.sample_rate:
+            return self.get_response(request)
+        with QueryRecorder() as recorder:
+            response = self.get_response(request)
+        match = request.resolver_match
+        name = match.view_name if match else request.path
+        for sql, count in recorder.repeated():
+            logger.warning(
+                "N+1 queries on %s: %d of %d statements were %s",
+                name,
+                count,
+                len(recorder),
+                sql,
+            )
+        return response
@@ -0,0 +1,61 @@
+from django.db import models
+from django.utils import timezone
+
+
+class Task(models.Model):
+    """
+    A call of a registered function, waiting to be run by run_workers (see
+    common.tasks). Rows are deleted once run; those that kept failing stay,
+    marked dead.
+    """
+
+    PENDING = "pending"
+    RUNNING = "running"
+    DEAD = "dead"
+    STATUSES = [(PENDING, "Pending"), (RUNNING, "Running"), (DEAD, "Dead")]
+
+    name = models.CharField(max_length=200)
+    args = models.JSONField(default=list)
+    kwargs = models.JSONField(default=dict)
+    # At most one pending task has a given key (see task(unique=True))
+    key = models.CharField(max_length=200, null=True, blank=True)
+    status = models.CharField(max_length=10, choices=STATUSES, default=PENDING)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=5)
+    run_at = models.DateTimeField(default=timezone.now)
+    started_at = models.DateTimeField(null=True, blank=True)
+    # Token of the worker batch that claimed the task
+    claim = models.CharField(max_length=32, blank=True)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["key"],
+                condition=models.Q(status="pending"),
+                name="unique_pending_task_key",
+            )
+        ]
+        indexes = [
+            # Workers read the pending tasks that are due, and the running
+            # ones whose worker was lost, then the batch they claimed
+            models.Index(
+                fields=["run_at"],
+                condition=models.Q(status="pending"),
+                name="task_due_idx",
+            ),
+            models.Index(
+                fields=["started_at"],
+                condition=models.Q(status="running"),
+                name="task_running_idx",
+            ),
+            models.Index(
+                fields=["claim"],
+                condition=models.Q(status="running"),
+                name="task_claim_idx",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.status})"
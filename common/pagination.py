@@ -0,0 +1,150 @@
+"""Keyset (cursor) pagination for list views."""
+
+import base64
+import json
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q
+from django.http import Http404
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+class CursorPage:
+    """A page of objects and the opaque cursors to its neighbours."""
+
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class CursorPaginator:
+    """
+    Paginate a queryset by seeking past the last row of the previous page
+    instead of using OFFSET, so every page costs the same index range scan
+    and no COUNT(*) is needed.
+
+    ordering must be unique (end with the primary key) and should match an
+    index, e.g. ("-last_update", "-id").
+    """
+
+    def __init__(self, queryset, per_page, ordering=("-last_update", "-id")):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = ordering
+        self.fields = [name.lstrip("-") for name in ordering]
+
+    def encode_cursor(self, obj, backwards=False):
+        opts = self.queryset.model._meta
+        values = [opts.get_field(name).value_to_string(obj) for name in self.fields]
+        data = json.dumps(["p" if backwards else "n", *values])
+        return base64.urlsafe_b64encode(data.encode()).decode().rstrip("=")
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + "=" * (-len(cursor) % 4)
+            direction, *raw = json.loads(base64.urlsafe_b64decode(padded))
+            if direction not in ("n", "p") or len(raw) != len(self.fields):
+                raise InvalidCursor(cursor)
+            opts = self.queryset.model._meta
+            values = [
+                opts.get_field(name).to_python(value)
+                for name, value in zip(self.fields, raw)
+            ]
+        except (ValueError, TypeError, ValidationError) as error:
+            raise InvalidCursor(cursor) from error
+        return direction == "p", values
+
+    def _seek(self, values, backwards, fields=None):
+        """Return Q selecting rows after (or before) the given key values."""
+        fields = fields or self.fields
+        condition = Q()
+        for index, name in enumerate(self.ordering):
+            field = fields[index]
+            descending = name.startswith("-") != backwards
+            lookup = f"{field}__lt" if descending else f"{field}__gt"
+            equal = {f: v for f, v in zip(fields[:index], values[:index])}
+            condition |= Q(**equal, **{lookup: values[index]})
+        return condition
+
+    def _order_by(self, backwards, fields=None):
+        """Return the order_by() arguments of a page in query order."""
+        fields = fields or self.fields
+        return [
+            f"-{field}" if name.startswith("-") != backwards else field
+            for name, field in zip(self.ordering, fields)
+        ]
+
+    def fetch(self, queryset, values, backwards, fields=None, condition=None):
+        """
+        Return up to per_page + 1 rows of queryset past the key values, in
+        query order. fields name the key columns when they are reached
+        through a relation; condition is applied in the same filter() so
+        that it shares the joins of the key.
+        """
+        condition = Q() if condition is None else condition
+        if values is not None:
+            condition &= self._seek(values, backwards, fields)
+        queryset = queryset.filter(condition)
+        queryset = queryset.order_by(*self._order_by(backwards, fields))
+        return list(queryset[: self.per_page + 1])
+
+    def rows(self, values, backwards):
+        """Return the rows of a page and one extra row, in query order."""
+        return self.fetch(self.queryset, values, backwards)
+
+    def page(self, cursor=None):
+        """Return the page starting after cursor (the first page if None)."""
+        backwards, values = self.decode_cursor(cursor) if cursor else (False, None)
+        # One extra row tells whether there is another page in this direction
+        rows = self.rows(values, backwards)
+        has_more = len(rows) > self.per_page
+        rows = rows[: self.per_page]
+        if backwards:
+            rows.reverse()
+
+        if not rows:
+            return CursorPage([], None, None)
+        more_after = has_more if not backwards else True
+        more_before = has_more if backwards else values is not None
+        next_cursor = self.encode_cursor(rows[-1]) if more_after else None
+        previous_cursor = (
+            self.encode_cursor(rows[0], backwards=True) if more_before else None
+        )
+        return CursorPage(rows, next_cursor, previous_cursor)
+
+
+class CursorPaginationMixin:
+    """Use CursorPaginator in a ListView instead of the OFFSET paginator."""
+
+    cursor_kwarg = "cursor"
+    cursor_ordering = ("-last_update", "-id")
+
+    def get_cursor_paginator(self, queryset, page_size):
+        return CursorPaginator(queryset, page_size, self.cursor_ordering)
+
+    def paginate_queryset(self, queryset, page_size):
+        paginator = self.get_cursor_paginator(queryset, page_size)
+        try:
+            page = paginator.page(self.request.GET.get(self.cursor_kwarg))
+        except InvalidCursor:
+            raise Http404("Invalid page.")
+        return (paginator, page, page.object_list, page.has_other_pages())
@@ -0,0 +1,281 @@
+"""
+A task queue stored in the database.
+
+Functions decorated with @task are run by the run_workers command: a
+request calls function.enqueue(*args, **kwargs), which costs a single
+INSERT in the request's transaction, so the task is queued if and only if
+the request's writes are committed. Arguments must be JSON serializable.
+
+Workers claim due tasks BATCH_SIZE at a time in one UPDATE whose subquery
+selects them FOR UPDATE SKIP LOCKED on PostgreSQL, so concurrent workers
+never wait for nor run each other's tasks. SQLite has no row locks but
+runs each statement under its database write lock, which the UPDATE takes
+before reading the due rows: the claim is just as exclusive there.
+
+A task that raises is retried after RETRY_DELAY, doubling with every
+attempt up to MAX_RETRY_DELAY; once out of attempts it is marked dead and
+kept with its traceback until requeued (see task_stats --requeue-dead).
+A worker that dies loses its claim after LEASE, and the task runs again:
+tasks run at least once, and must be safe to run twice.
+
+Periodic tasks (@task(every=...)) are scheduled when the workers start and
+again every time they have run.
+"""
+
+import hashlib
+import json
+import logging
+import time
+import traceback
+import uuid
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Min, Q, Subquery
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import utils
+from .models import Task
+
+MAX_ATTEMPTS = 5
+# Delay before the first retry, doubled for each further one
+RETRY_DELAY = timedelta(seconds=10)
+MAX_RETRY_DELAY = timedelta(hours=1)
+# A running task not finished after this long is claimed again
+LEASE = timedelta(hours=1)
+# Tasks claimed by a worker at a time
+BATCH_SIZE = 10
+# Seconds an idle worker waits before looking for due tasks again
+POLL_INTERVAL = 1
+STATS_KEYS = {
+    "runs": "tasks:stats:runs",
+    "failures": "tasks:stats:failures",
+    # Total time tasks waited past their run_at, and ran for
+    "wait_ms": "tasks:stats:wait_ms",
+    "run_ms": "tasks:stats:run_ms",
+}
+
+logger = logging.getLogger(__name__)
+
+# Task name -> decorated function
+_registry = {}
+
+
+def task(function=None, *, max_attempts=MAX_ATTEMPTS, unique=False, every=None):
+    """
+    Register function as a task, with enqueue(*args, **kwargs) and
+    enqueue_at(run_at, *args, **kwargs) methods queueing a call to it.
+
+    A unique task is queued at most once per arguments: enqueueing it while
+    it is pending only brings its run_at forward. A task with every (a
+    timedelta) runs periodically, it is unique and takes no arguments.
+    """
+
+    def register(function):
+        function.task_name = f"{function.__module__}.{function.__qualname__}"
+        function.max_attempts = max_attempts
+        function.unique = unique or every is not None
+        function.every = every
+        function.enqueue = lambda *args, **kwargs: enqueue(function, args, kwargs)
+        function.enqueue_at = lambda run_at, *args, **kwargs: enqueue(
+            function, args, kwargs, run_at
+        )
+        _registry[function.task_name] = function
+        return function
+
+    return register(function) if function else register
+
+
+def lookup(name):
+    """Return the task called name, importing its module, or None."""
+    if name not in _registry:
+        try:
+            import_string(name)
+        except ImportError:
+            return None
+    return _registry.get(name)
+
+
+def task_key(name, args, kwargs):
+    arguments = json.dumps([list(args), kwargs], sort_keys=True)
+    return f"{name}:{hashlib.md5(arguments.encode()).hexdigest()}"
+
+
+def enqueue(function, args=(), kwargs=None, run_at=None):
+    """Queue a call to the task function, to run at run_at (now by default)."""
+    kwargs = kwargs or {}
+    queued = Task(
+        name=function.task_name,
+        args=list(args),
+        kwargs=kwargs,
+        max_attempts=function.max_attempts,
+        run_at=run_at or timezone.now(),
+    )
+    if not function.unique:
+        queued.save()
+        return
+    queued.key = task_key(function.task_name, args, kwargs)
+    # The pending task of the key may run later than asked
+    if not utils.insert_ignore(queued):
+        Task.objects.filter(
+            key=queued.key, status=Task.PENDING, run_at__gt=queued.run_at
+        ).update(run_at=queued.run_at)
+
+
+def schedule_periodic():
+    """Queue the periodic tasks not pending yet, for one period from now."""
+    now = timezone.now()
+    for function in list(_registry.values()):
+        if function.every:
+            function.enqueue_at(now + function.every)
+
+
+def retry_delay(attempts):
+    """Return how long to wait after the given number of failed attempts."""
+    return min(RETRY_DELAY * 2 ** (attempts - 1), MAX_RETRY_DELAY)
+
+
+def record(name, amount=1):
+    key = STATS_KEYS[name]
+    cache.add(key, 0, timeout=None)
+    try:
+        cache.incr(key, amount)
+    except ValueError:
+        # Evicted in between, the count restarts
+        cache.set(key, amount, timeout=None)
+
+
+def milliseconds(delta):
+    return max(round(delta.total_seconds() * 1000), 0)
+
+
+def claim(limit=BATCH_SIZE):
+    """Claim up to limit due tasks for this worker and return them."""
+    now, token = timezone.now(), uuid.uuid4().hex
+    due = Task.objects.filter(
+        Q(status=Task.PENDING, run_at__lte=now)
+        | Q(status=Task.RUNNING, started_at__lt=now - LEASE)
+    )
+    with transaction.atomic():
+        claimed = Task.objects.filter(
+            pk__in=Subquery(
+                due.select_for_update(skip_locked=True)
+                .order_by("run_at")
+                .values("pk")[:limit]
+            )
+        ).update(
+            status=Task.RUNNING,
+            claim=token,
+            started_at=now,
+            attempts=F("attempts") + 1,
+        )
+    if not claimed:
+        return []
+    return list(
+        Task.objects.filter(status=Task.RUNNING, claim=token).order_by("run_at")
+    )
+
+
+def run(claimed):
+    """Run a claimed task, then delete it or schedule its retry."""
+    started = timezone.now()
+    record("wait_ms", milliseconds(started - claimed.run_at))
+    function = lookup(claimed.name)
+    mine = Task.objects.filter(pk=claimed.pk, claim=claimed.claim)
+    try:
+        if function is None:
+            raise LookupError(f"No task is registered as {claimed.name}.")
+        function(*claimed.args, **claimed.kwargs)
+    except Exception as error:
+        record("failures")
+        claimed.last_error = traceback.format_exc()
+        if function is None or claimed.attempts >= claimed.max_attempts:
+            logger.error("Task %s is dead: %r", claimed, error)
+            claimed.status = Task.DEAD
+        else:
+            logger.warning("Task %s will be retried: %r", claimed, error)
+            claimed.status = Task.PENDING
+            claimed.run_at = timezone.now() + retry_delay(claimed.attempts)
+        try:
+            with transaction.atomic():
+                mine.update(
+                    status=claimed.status,
+                    run_at=claimed.run_at,
+                    last_error=claimed.last_error,
+                    claim="",
+                )
+        except IntegrityError:
+            # The same call was queued again meanwhile, it will run then
+            mine.delete()
+        succeeded = False
+    else:
+        mine.delete()
+        succeeded = True
+    record("runs")
+    record("run_ms", milliseconds(timezone.now() - started))
+    if function and function.every and (succeeded or claimed.status == Task.DEAD):
+        function.enqueue_at(timezone.now() + function.every)
+    return succeeded
+
+
+def work(stop=None, batch_size=BATCH_SIZE, interval=POLL_INTERVAL, once=False):
+    """
+    Run due tasks until stop (an Event) is set, or with once until none is
+    due. Return the number of tasks run.
+    """
+    done = 0
+    while not (stop and stop.is_set()):
+        batch = claim(batch_size)
+        for claimed in batch:
+            run(claimed)
+            done += 1
+        if not batch:
+            if once:
+                break
+            if stop:
+                stop.wait(interval)
+            else:
+                time.sleep(interval)
+    return done
+
+
+def requeue_dead(name=None):
+    """Give the dead tasks (of name) new attempts; return how many."""
+    dead = Task.objects.filter(status=Task.DEAD)
+    if name:
+        dead = dead.filter(name=name)
+    requeued = 0
+    for pk in dead.values_list("pk", flat=True):
+        try:
+            with transaction.atomic():
+                requeued += Task.objects.filter(pk=pk, status=Task.DEAD).update(
+                    status=Task.PENDING, attempts=0, run_at=timezone.now()
+                )
+        except IntegrityError:
+            # The same call is already pending
+            Task.objects.filter(pk=pk).delete()
+    return requeued
+
+
+def stats():
+    """
+    Return the queue depth (per task name and status), the number of due
+    tasks and the age of the oldest one, and the run and failure counts
+    and total wait and run times since the counters were last reset.
+    """
+    now = timezone.now()
+    depth = {}
+    rows = Task.objects.values_list("name", "status").annotate(count=Count("pk"))
+    for name, status, count in rows.order_by("name", "status"):
+        depth.setdefault(name, {})[status] = count
+    due = Task.objects.filter(status=Task.PENDING, run_at__lte=now)
+    oldest = due.aggregate(oldest=Min("run_at"))["oldest"]
+    counts = cache.get_many(STATS_KEYS.values())
+    return {
+        "depth": depth,
+        "due": due.count(),
+        "oldest_due_ms": milliseconds(now - oldest) if oldest else 0,
+        **{name: counts.get(key, 0) for name, key in STATS_KEYS.items()},
+    }
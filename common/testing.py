@@ -0,0 +1,59 @@
+"""Test helpers holding the URLs of an app to query budgets."""
+
+from importlib import import_module
+
+from django.core.cache import cache
+
+from . import cache as two_tier_cache
+from .middleware import QueryRecorder
+
+
+def url_names(urls_module):
+    """Return the namespaced names of the URL patterns of a urls module."""
+    module = import_module(urls_module)
+    return {
+        f"{module.app_name}:{pattern.name}"
+        for pattern in module.urlpatterns
+        if pattern.name
+    }
+
+
+def clear_caches():
+    """Empty the shared cache and the local tier of every two-tier cache."""
+    cache.clear()
+    for namespace in two_tier_cache._registry:
+        namespace.local.clear()
+        namespace._generation = (None, 0)
+
+
+class QueryBudgetMixin:
+    """
+    TestCase mixin holding each URL of urls_module to its query budget.
+
+    query_budgets maps every URL name of the module to the most queries a
+    request to it may run with cold caches; a request must not run any
+    statement N+1 style either (see common.middleware).
+    """
+
+    urls_module = None
+    query_budgets = {}
+
+    def setUp(self):
+        super().setUp()
+        clear_caches()
+
+    def assertQueryBudget(self, name, request):
+        """Call request(), a request to URL name, and check its queries."""
+        with QueryRecorder() as recorder:
+            response = request()
+        queries = "\n".join(recorder.statements)
+        self.assertLessEqual(
+            len(recorder),
+            self.query_budgets[name],
+            f"{name} ran {len(recorder)} queries:\n{queries}",
+        )
+        self.assertEqual(recorder.repeated(), [], f"N+1 queries on {name}")
+        return response
+
+    def test_every_url_has_a_budget(self):
+        self.assertEqual(set(self.query_budgets), url_names(self.urls_module))
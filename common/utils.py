@@ -1,32 +1,172 @@
 """Helper functions used across all apps."""
 
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import Count, Subquery, Sum
+from django.db.models.constants import OnConflict
+from django.db.models.functions import Coalesce
+from django.db.models.sql import InsertQuery
 from django.utils.crypto import get_random_string
 from django.utils.text import slugify
 
 
+# Random characters appended to a slug that is already taken
+SLUG_SUFFIX_LENGTH = 6
+UID_LENGTH = 12
+# Saves retried when a concurrent insert took the allocated value
+ALLOCATION_ATTEMPTS = 3
+
+
+def random_slug(base_word):
+    """Return a slug of base_word with a random suffix."""
+    suffix = get_random_string(length=SLUG_SUFFIX_LENGTH)
+    return slugify(f"{base_word} {suffix}")
+
+
 def generate_slug(Klass, base_word):
     """
-    Return unique slug generated from the given base_word that is
-    unique in the Klass.
+    Return a slug of base_word that is free in Klass, with at most one
+    query: the plain slug if it is free, else one with a random suffix,
+    which is not checked as a collision is vanishingly unlikely. Saving
+    through save_unique() resolves the rare conflicts that remain.
+    """
+    slug = slugify(base_word)
+    if Klass.objects.filter(slug=slug).exists():
+        return random_slug(base_word)
+    return slug
+
+
+def allocate_slugs(Klass, base_words):
+    """
+    Return a slug for each of base_words, free in Klass and distinct from
+    each other, with a single query (for bulk inserts).
+    """
+    slugs = [slugify(base_word) for base_word in base_words]
+    taken = set(Klass.objects.filter(slug__in=slugs).values_list("slug", flat=True))
+    allocated = []
+    for base_word, slug in zip(base_words, slugs):
+        if slug in taken:
+            slug = random_slug(base_word)
+        taken.add(slug)
+        allocated.append(slug)
+    return allocated
+
+
+def generate_uid():
+    """
+    Return a random 12 character uid. With 62 possible characters a
+    collision is vanishingly unlikely, so none is checked for: the unique
+    constraint, through save_unique(), catches it.
+    """
+    return get_random_string(length=UID_LENGTH)
+
+
+def allocate_uids(count):
+    """Return count distinct uids (for bulk inserts)."""
+    uids = set()
+    while len(uids) < count:
+        uids.add(generate_uid())
+    return list(uids)
+
+
+def save_unique(instance, field, allocate, save):
+    """
+    Call save() to insert instance, whose unique field holds a freshly
+    allocated value. If a concurrent insert took that value, store a new
+    one from allocate() and try again rather than checking beforehand.
+
+    The retries are deliberate: no portable statement both draws a random
+    value and inserts it. They run only on an actual collision, so the
+    common case is still the single INSERT, with no lookup before it.
+    """
+    model = instance.__class__
+    using = router.db_for_write(model, instance=instance)
+    for attempt in range(ALLOCATION_ATTEMPTS):
+        try:
+            # A savepoint, so the failed insert can be retried in the
+            # caller's transaction
+            with transaction.atomic(using=using):
+                return save()
+        except IntegrityError:
+            value = getattr(instance, field)
+            conflict = model._default_manager.using(using).filter(**{field: value})
+            if attempt == ALLOCATION_ATTEMPTS - 1 or not conflict.exists():
+                raise
+            setattr(instance, field, allocate())
+
+
+def count_subquery(queryset, group_by):
+    """
+    Return a subquery expression counting the rows of queryset grouped by
+    the group_by field, to be correlated to an outer query via OuterRef.
     """
-    unique_slug = slugify(base_word)
-    is_taken = Klass.objects.filter(slug=unique_slug).exists()
+    rows = (
+        queryset.order_by().values(group_by).annotate(total=Count("*")).values("total")
+    )
+    return Coalesce(Subquery(rows), 0)
 
-    while is_taken:
-        random_string = get_random_string(length=6)
-        unique_slug = slugify(f"{base_word} {random_string}")
-        is_taken = Klass.objects.filter(slug=unique_slug).exists()
-    else:
-        return unique_slug
 
+def sum_subquery(queryset, group_by, field):
+    """Like count_subquery, summing the field of the rows instead."""
+    rows = (
+        queryset.order_by().values(group_by).annotate(total=Sum(field)).values("total")
+    )
+    return Coalesce(Subquery(rows), 0)
 
-def generate_uid(Klass):
-    """Generate 12 character random string that is unique in the Klass."""
-    uid = get_random_string(length=12)
-    is_taken = Klass.objects.filter(uid=uid).exists()
 
-    while is_taken:
-        uid = get_random_string(length=12)
-        is_taken = Klass.objects.filter(uid=uid).exists()
-    else:
-        return uid
+def reconcile(queryset, counters, chunk_size, dry_run=False):
+    """
+    Compare the counter fields of the rows of queryset with counters, a
+    {field: expression counting it} dict (see count_subquery), chunk_size
+    rows at a time, and unless dry_run recount the drifted rows. Return the
+    number of rows checked and of rows that had drifted.
+    """
+    rows = (
+        queryset.only("pk", *counters)
+        .annotate(**{f"actual_{field}": count for field, count in counters.items()})
+        .order_by("pk")
+    )
+    last_pk, checked, drifted = 0, 0, 0
+    while True:
+        # Walk by primary key so each batch is a cheap range scan
+        batch = list(rows.filter(pk__gt=last_pk)[:chunk_size])
+        if not batch:
+            break
+        stale = [
+            row.pk
+            for row in batch
+            if any(
+                getattr(row, field) != getattr(row, f"actual_{field}")
+                for field in counters
+            )
+        ]
+        if stale and not dry_run:
+            # Recount in the UPDATE itself so writes that happened since
+            # the check above are not overwritten with stale numbers.
+            with transaction.atomic():
+                queryset.model.objects.filter(pk__in=stale).update(**counters)
+        last_pk = batch[-1].pk
+        checked += len(batch)
+        drifted += len(stale)
+    return checked, drifted
+
+
+def insert_ignore(obj):
+    """
+    Insert obj in a single statement, silently skipping it if it conflicts
+    with a unique constraint. Return True if a row was actually inserted.
+
+    Unlike bulk_create(ignore_conflicts=True) this reports whether the row
+    was new, so callers can rely on the database constraint instead of
+    checking for an existing row first.
+    """
+    model = obj.__class__
+    using = router.db_for_write(model, instance=obj)
+    fields = [f for f in model._meta.concrete_fields if not f.primary_key]
+    query = InsertQuery(model, on_conflict=OnConflict.IGNORE)
+    query.insert_values(fields, [obj])
+    inserted = 0
+    with connections[using].cursor() as cursor:
+        for sql, params in query.get_compiler(using=using).as_sql():
+            cursor.execute(sql, params)
+            inserted += max(cursor.rowcount, 0)
+    return inserted > 0
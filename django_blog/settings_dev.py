@@ -49,9 +49,11 @@ INSTALLED_APPS = [
     "ckeditor",
     "blog.apps.BlogConfig",
     "accounts.apps.AccountsConfig",
+    "common.apps.CommonConfig",
 ]
 
 MIDDLEWARE = [
+    "common.middleware.QueryCountMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -100,9 +102,26 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        # A file, not an in-memory database, so that tests running threads
+        # share it between connections
+        "TEST": {"NAME": BASE_DIR / "test_db.sqlite3"},
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    }
+}
+
+# Share of requests whose queries are checked for N+1 patterns (see
+# common.middleware)
+QUERY_SAMPLE_RATE = 1
+
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
 
@@ -155,8 +174,10 @@ LOGOUT_REDIRECT_URL = "blog:post-list"
 LOGIN_REDIRECT_URL = "blog:post-list"
 LOGIN_URL = "accounts:login"
 
-# for sending emails
-EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
+# for sending emails: queued in the outbox, delivered by send_outbox over
+# OUTBOX_EMAIL_BACKEND (see accounts.outbox)
+EMAIL_BACKEND = "accounts.outbox.OutboxBackend"
+OUTBOX_EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
 EMAIL_HOST = "smtp.gmail.com"
 EMAIL_PORT = "587"
 EMAIL_USE_TLS = True
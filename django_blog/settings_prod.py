@@ -44,9 +44,11 @@ INSTALLED_APPS = [
     "crispy_bootstrap5",
     "blog.apps.BlogConfig",
     "accounts.apps.AccountsConfig",
+    "common.apps.CommonConfig",
 ]
 
 MIDDLEWARE = [
+    "common.middleware.QueryCountMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "whitenoise.middleware.WhiteNoiseMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
@@ -90,6 +92,22 @@ DATABASES = {
     }
 }
 
+# Cache
+# https://docs.djangoproject.com/en/4.1/topics/cache/
+
+# Shared by all the worker processes of a host
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": os.environ.get("DJANGO_CACHE_DIR", "/var/tmp/django_blog_cache"),
+        "OPTIONS": {"MAX_ENTRIES": 10000},
+    }
+}
+
+# Share of requests whose queries are checked for N+1 patterns (see
+# common.middleware)
+QUERY_SAMPLE_RATE = float(os.environ.get("DJANGO_QUERY_SAMPLE_RATE", "0.01"))
+
 
 # Password validation
 # https://docs.djangoproject.com/en/3.2/ref/settings/#auth-password-validators
@@ -150,8 +168,10 @@ LOGOUT_REDIRECT_URL = "blog:post-list"
 LOGIN_REDIRECT_URL = "blog:post-list"
 LOGIN_URL = "accounts:login"
 
-# for sending emails
-EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
+# for sending emails: queued in the outbox, delivered by send_outbox over
+# OUTBOX_EMAIL_BACKEND (see accounts.outbox)
+EMAIL_BACKEND = "accounts.outbox.OutboxBackend"
+OUTBOX_EMAIL_BACKEND = "django.core.mail.backends.smtp.EmailBackend"
 EMAIL_HOST = "smtp.gmail.com"
 EMAIL_PORT = "587"
 EMAIL_USE_TLS = True
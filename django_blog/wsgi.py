@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'django_blog.settings')
 
 application = get_wsgi_application()
+
+# Build the in-process search indexes before the first requests need them
+from blog import autocomplete  # noqa: E402
+
+autocomplete.warm_up()
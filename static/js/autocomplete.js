@@ -0,0 +1,47 @@
+// Search-as-you-type suggestions for the navbar search box
+(function () {
+  const input = document.getElementById("search-input");
+  const list = document.getElementById("search-suggestions");
+  if (!input || !list) return;
+
+  let urls = {};
+  let timer = null;
+  let controller = null;
+
+  function render(suggestions) {
+    urls = {};
+    list.innerHTML = "";
+    suggestions.forEach(function (suggestion) {
+      const option = document.createElement("option");
+      option.value = suggestion.label;
+      option.label = suggestion.kind;
+      urls[suggestion.label] = suggestion.url;
+      list.appendChild(option);
+    });
+  }
+
+  input.addEventListener("input", function (event) {
+    // A picked suggestion goes straight to its page
+    if (!(event instanceof InputEvent) && urls[input.value]) {
+      window.location = urls[input.value];
+      return;
+    }
+    clearTimeout(timer);
+    timer = setTimeout(function () {
+      const query = input.value.trim();
+      if (!query) return render([]);
+      if (controller) controller.abort();
+      controller = new AbortController();
+      fetch(input.dataset.suggestUrl + "?q=" + encodeURIComponent(query), {
+        signal: controller.signal,
+      })
+        .then(function (response) {
+          return response.json();
+        })
+        .then(function (data) {
+          render(data.suggestions);
+        })
+        .catch(function () {});
+    }, 100);
+  });
+})();